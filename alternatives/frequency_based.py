@@ -43,6 +43,10 @@ def frequency_based_clustering(input_variant_log, num_clus, version='k-means++',
 
     Returns:
     - list: A list of dictionaries representing the clusters. Each dictionary contains the variant names as keys and the corresponding traces as values.
+    - or
+    - pandas.Series: The cluster index of every case, indexed by case id (see 'utils.get_case_labels').
+    - or
+    - generator: The log of every cluster, as a slice of one sorted copy of the log (see 'utils.get_cluster_views').
     """
     variant_log = copy.deepcopy(input_variant_log)
     keys = list(variant_log.keys())
@@ -71,7 +75,8 @@ def cluster(log, num_clus, outputshape='log', version='k-means++', distance='nor
     Parameters:
     - log (list): The log to perform clustering on.
     - num_clus (int): The number of clusters to create.
-    - outputshape (str, optional): The shape of the output. Can be 'log' or 'variant_log'. Defaults to 'log'.
+    - outputshape (str, optional): The shape of the output. Can be 'log', 'variant_log', 'labels' (the cluster of every case) or 'views'
+      (a generator of slices of the log sorted once by cluster). Defaults to 'log'.
     - version (str, optional): The initialization method for K-means clustering. Defaults to 'k-means++'.
     - distance (str, optional): The distance metric to use for clustering. Can be 'euclidian' or 'normalized'. Defaults to 'normalized'.
 
@@ -79,15 +84,23 @@ def cluster(log, num_clus, outputshape='log', version='k-means++', distance='nor
     - list: A list of logs representing the clusters. Each log contains the traces belonging to a cluster.
     - or
     - list: A list of dictionaries representing the clusters. Each dictionary contains the variant names as keys and the corresponding traces as values.
+    - or
+    - pandas.Series: The cluster index of every case, indexed by case id (see 'utils.get_case_labels').
+    - or
+    - generator: The log of every cluster, as a slice of one sorted copy of the log (see 'utils.get_cluster_views').
 
     Raises:
-    - ValueError: If the outputshape parameter is not 'log' or 'variant_log'.
+    - ValueError: If the outputshape parameter is not 'log', 'variant_log', 'labels' or 'views'.
     """
     variant_log_input = utils.get_variant_log(log)
     clusters_vl = frequency_based_clustering(variant_log_input, num_clus, version=version, distance=distance)
     if outputshape == 'log':
         return [utils.filter_log_with_vl(log, cluster_vl) for cluster_vl in clusters_vl]
+    elif outputshape == 'labels':
+        return utils.get_case_labels(log, clusters_vl)
+    elif outputshape == 'views':
+        return utils.get_cluster_views(log, utils.get_case_labels(log, clusters_vl), len(clusters_vl))
     elif outputshape == 'variant_log':
         return clusters_vl
     else:
-        raise ValueError("Output has to be 'log' or 'variant_log'.")
\ No newline at end of file
+        raise ValueError("Output has to be 'log', 'variant_log', 'labels' or 'views'.")
\ No newline at end of file
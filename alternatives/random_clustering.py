@@ -57,13 +57,14 @@ def cluster(log, num_clus, variant='equisized', outputshape='log'):
     - log (list): A list of log data.
     - num_clus (int): The number of clusters to create.
     - variant (str, optional): The variant of clustering to use. Default is 'equisized'.
-    - outputshape (str, optional): The shape of the output. Default is 'log'.
+    - outputshape (str, optional): The shape of the output, 'log', 'variant_log', 'labels' (the cluster of every case) or 'views'
+      (a generator of slices of the log sorted once by cluster). Default is 'log'.
 
     Returns:
     - clustered_data (list): A list of clustered log data. The shape of the output depends on the value of 'outputshape' parameter.
 
     Raises:
-    - ValueError: If the value of 'outputshape' parameter is not 'log' or 'variant_log'.
+    - ValueError: If the value of 'outputshape' parameter is not 'log', 'variant_log', 'labels' or 'views'.
 
     """
     variant_log_input = utils.get_variant_log(log)
@@ -73,7 +74,11 @@ def cluster(log, num_clus, variant='equisized', outputshape='log'):
         clusters_vl = get_random_clusters(variant_log_input, num_clus)
     if outputshape == 'log':
         return [utils.filter_log_with_vl(log, cluster_vl) for cluster_vl in clusters_vl]
+    elif outputshape == 'labels':
+        return utils.get_case_labels(log, clusters_vl)
+    elif outputshape == 'views':
+        return utils.get_cluster_views(log, utils.get_case_labels(log, clusters_vl), len(clusters_vl))
     elif outputshape == 'variant_log':
         return clusters_vl
     else:
-        raise ValueError("Output has to be 'log' or 'variant_log'.")
\ No newline at end of file
+        raise ValueError("Output has to be 'log', 'variant_log', 'labels' or 'views'.")
\ No newline at end of file
@@ -11,20 +11,25 @@ from gensim.models.doc2vec import TaggedDocument
 
 from entroclus import utils as utils
 
-import pm4py.stats
 
 
+def clean_variant(variant):
+    """
+    Remove the spaces from the activities of a variant, as done for the variants that are clustered.
+    """
+    return tuple(str(act).replace(" ", "") for act in variant)
+
 
 def get_variant_log(log, order=True):
     """
     Get the variants of a given event log, together with the occurences,
     with consistent whitespace removal.
     """
-    variants_tuples = pm4py.stats.get_variants_as_tuples(log)
+    variants_tuples = utils.get_variant_log(log, order=False)
     cleaned_variants = {}
     for variant_tuple, count in variants_tuples.items():
         # Remove space only if the model was trained without spaces
-        cleaned_variant = tuple(str(act).replace(" ", "") for act in variant_tuple)  # Adjust space handling as needed
+        cleaned_variant = clean_variant(variant_tuple)  # Adjust space handling as needed
         cleaned_variants[cleaned_variant] = count
     
     if order:
@@ -223,10 +228,12 @@ def cluster(log, num_clus, cluster_version='k-means++', distance='normalized', v
     - min_count (int): Ignores all words with total frequency lower than this for training the Doc2Vec model. Default is 0.
     - dm (int): The training algorithm for the Doc2Vec model. Set to 1 for distributed memory (PV-DM), 0 for distributed bag of words (PV-DBOW). Default is 0.
     - epochs (int): Number of iterations (epochs) over the corpus for training the Doc2Vec model. Default is 150.
-    - outputshape (str): The shape of the output. Can be 'log' or 'variant_log'. Default is 'log'.
+    - outputshape (str): The shape of the output. Can be 'log', 'variant_log', 'labels' (the cluster of every case) or 'views' (a generator
+      of slices of the log sorted once by cluster). Default is 'log'.
 
     Returns:
-    - clusters (list): A list of logs or dictionaries representing the clusters.
+    - clusters (list): A list of logs or dictionaries representing the clusters, or the labels or views (see 'utils.get_case_labels' and
+      'utils.get_cluster_views').
 
     Note:
     - If vector_size is not provided, it will be automatically calculated based on the size of the alphabet in the input log.
@@ -237,7 +244,11 @@ def cluster(log, num_clus, cluster_version='k-means++', distance='normalized', v
     clusters_vl = cluster_t2v(variant_log_input, log, num_clus, cluster_version, distance, vector_size, window_size, min_count,dm,epochs)
     if outputshape == 'log':
         return [utils.filter_log_with_vl(log, cluster_vl) for cluster_vl in clusters_vl]
+    elif outputshape == 'labels':
+        return utils.get_case_labels(log, clusters_vl, variant_key=clean_variant)
+    elif outputshape == 'views':
+        return utils.get_cluster_views(log, utils.get_case_labels(log, clusters_vl, variant_key=clean_variant), len(clusters_vl))
     elif outputshape == 'variant_log':
         return clusters_vl
     else:
-        raise ValueError("Output has to be 'log' or 'variant_log'.")
\ No newline at end of file
+        raise ValueError("Output has to be 'log', 'variant_log', 'labels' or 'views'.")
\ No newline at end of file
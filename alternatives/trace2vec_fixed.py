@@ -96,7 +96,11 @@ def cluster(log, num_clus, cluster_version='k-means++', distance='normalized', v
 
     if outputshape == 'log':
         return [utils.filter_log_with_vl(original_log, cluster_vl) for cluster_vl in clusters_vl]
+    elif outputshape == 'labels':
+        return utils.get_case_labels(original_log, clusters_vl)
+    elif outputshape == 'views':
+        return utils.get_cluster_views(original_log, utils.get_case_labels(original_log, clusters_vl), len(clusters_vl))
     elif outputshape == 'variant_log':
         return clusters_vl
     else:
-        raise ValueError("Output must be 'log' or 'variant_log'.")
+        raise ValueError("Output must be 'log', 'variant_log', 'labels' or 'views'.")
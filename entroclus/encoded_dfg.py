@@ -0,0 +1,836 @@
+import numpy as np
+
+from entroclus.encoding import Vocabulary, EncodedVariantLog
+
+#alphabets up to this size (BOS and EOS included) store their edge counts in a dense matrix, larger ones in sorted sparse arrays
+DENSE_MAX_ACTIVITIES = 512
+#margin (in log2) on the lower bound of the trace probabilities, so rounding in the bounds can not hide a trace at the bound
+BOUND_MARGIN = 1e-9
+
+
+def edge_keys(src, dst):
+    """
+    Combine source and target ids into a single int64 key per edge, used by the sparse edge storage.
+
+    Parameters:
+    - src (numpy.ndarray): The source activity ids.
+    - dst (numpy.ndarray): The target activity ids.
+
+    Returns:
+    - numpy.ndarray: The edge keys.
+    """
+    return (np.asarray(src, dtype=np.int64) << 32) | np.asarray(dst, dtype=np.int64)
+
+
+def find_keys(sorted_keys, keys):
+    """
+    Find a batch of edge keys in a sorted key array.
+
+    Parameters:
+    - sorted_keys (numpy.ndarray): The sorted edge keys of a sparse storage.
+    - keys (numpy.ndarray): The edge keys to look up.
+
+    Returns:
+    - positions (numpy.ndarray): The position of every key in sorted_keys, or the position where it would be inserted.
+    - found (numpy.ndarray): Whether every key is present.
+    """
+    positions = np.searchsorted(sorted_keys, keys)
+    found = np.zeros(len(keys), dtype=bool)
+    inside = positions < len(sorted_keys)
+    found[inside] = sorted_keys[positions[inside]] == keys[inside]
+    return positions, found
+
+
+def xlog2x(x):
+    """
+    Compute x * log2(x) elementwise, with 0 * log2(0) = 0.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    return np.where(x > 0, x * np.log2(np.where(x > 0, x, 1.0)), 0.0)
+
+
+def get_trace_multisets(trace_ids):
+    """
+    Get the distinct edges and source activities of an encoded trace, with how often they occur in it.
+
+    Parameters:
+    - trace_ids (numpy.ndarray): The encoded trace, with start and end markers.
+
+    Returns:
+    - edge_src (numpy.ndarray): The source of every distinct edge (sorted by edge key).
+    - edge_dst (numpy.ndarray): The target of every distinct edge.
+    - edge_multiplicity (numpy.ndarray): How often every distinct edge occurs in the trace.
+    - sources (numpy.ndarray): The distinct activities that are followed by another activity in the trace.
+    - source_multiplicity (numpy.ndarray): How often every such activity is followed by another activity.
+    """
+    src, dst = trace_ids[:-1], trace_ids[1:]
+    keys, edge_multiplicity = np.unique(edge_keys(src, dst), return_counts=True)
+    sources, source_multiplicity = np.unique(src, return_counts=True)
+    return keys >> 32, keys & 0xFFFFFFFF, edge_multiplicity, sources, source_multiplicity
+
+
+def get_step_multiplicities(trace_ids):
+    """
+    Count, for every step of an encoded trace, how often its edge and its source activity occur in the trace. This is the amount by which
+    the edge and outgoing counts used at that step grow when the trace is added to a DFG once.
+
+    Parameters:
+    - trace_ids (numpy.ndarray): The encoded trace, with start and end markers.
+
+    Returns:
+    - edge_multiplicity (numpy.ndarray): For every step, the number of times its edge occurs in the trace.
+    - source_multiplicity (numpy.ndarray): For every step, the number of times its source activity is followed by another activity in the trace.
+    """
+    src, dst = trace_ids[:-1], trace_ids[1:]
+    _, edge_inverse, edge_multiplicity = np.unique(edge_keys(src, dst), return_inverse=True, return_counts=True)
+    _, source_inverse, source_multiplicity = np.unique(src, return_inverse=True, return_counts=True)
+    return edge_multiplicity[edge_inverse], source_multiplicity[source_inverse]
+
+
+def get_transition_multiplicities(src, dst, variant_index, num_activities):
+    """
+    Count, for every transition of an encoded log, how often its edge and its source activity occur in its own trace: the batch version 
+    of 'get_step_multiplicities'. Every (variant, edge) and (variant, source) pair is combined into a single int64 key, which is much
+    faster to group than the stacked rows.
+
+    Parameters:
+    - src (numpy.ndarray): The source activity id of every transition (-1 for unknown activities).
+    - dst (numpy.ndarray): The target activity id of every transition (-1 for unknown activities).
+    - variant_index (numpy.ndarray): The index of the variant every transition belongs to.
+    - num_activities (int): The size of the vocabulary.
+
+    Returns:
+    - edge_multiplicity (numpy.ndarray): For every transition, the number of times its edge occurs in its trace.
+    - source_multiplicity (numpy.ndarray): For every transition, the number of times its source activity is followed by another activity in its trace.
+    """
+    #ids are shifted by one so unknown activities (-1) get their own key
+    base = num_activities + 1
+    source_keys = np.asarray(variant_index, dtype=np.int64) * base + (np.asarray(src, dtype=np.int64) + 1)
+    edge_keys = source_keys * base + (np.asarray(dst, dtype=np.int64) + 1)
+    _, edge_inverse, edge_multiplicity = np.unique(edge_keys, return_inverse=True, return_counts=True)
+    _, source_inverse, source_multiplicity = np.unique(source_keys, return_inverse=True, return_counts=True)
+    return edge_multiplicity[edge_inverse.ravel()], source_multiplicity[source_inverse.ravel()]
+
+
+class EncodedDFG:
+    """
+    Array-backed Directly-Follows Graph over an integer-encoded vocabulary. It holds the same information as the
+    (activity_counts, edge_counts) dictionaries returned by utils.get_dfg, but activity counts are a NumPy vector and edge counts
+    are either a dense (n x n) matrix or, for large alphabets, sorted arrays of edge keys and counts. The total count of the outgoing
+    edges of every activity is kept as a separate vector, so transition probabilities can be looked up in constant time.
+
+    Parameters:
+    - vocabulary (Vocabulary): The vocabulary the DFG is defined on. It may grow after the DFG is created.
+    - dense (bool, optional): Whether to store the edge counts densely. If None, it is decided based on DENSE_MAX_ACTIVITIES.
+    """
+    def __init__(self, vocabulary, dense=None):
+        self.vocabulary = vocabulary
+        if dense is None:
+            dense = len(vocabulary) <= DENSE_MAX_ACTIVITIES
+        self.dense = dense
+        self.num_activities = len(vocabulary)
+        self.activity_counts = np.zeros(self.num_activities, dtype=np.int64)
+        self.outgoing_counts = np.zeros(self.num_activities, dtype=np.int64)
+        if self.dense:
+            self.edge_counts = np.zeros((self.num_activities, self.num_activities), dtype=np.int64)
+        else:
+            self.edge_keys = np.zeros(0, dtype=np.int64)
+            self.edge_values = np.zeros(0, dtype=np.int64)
+
+    @classmethod
+    def from_encoded_log(cls, encoded_log, indices=None, dense=None):
+        """
+        Create a DFG from (part of) an encoded variant log.
+
+        Parameters:
+        - encoded_log (EncodedVariantLog): The encoded variant log.
+        - indices (iterable, optional): The indices of the variants to include. All variants are used if None.
+        - dense (bool, optional): Whether to store the edge counts densely. Decided on alphabet size if None.
+
+        Returns:
+        - EncodedDFG: The DFG of the selected variants.
+        """
+        dfg = cls(encoded_log.vocabulary, dense=dense)
+        if indices is None:
+            indices = range(len(encoded_log))
+        for i in indices:
+            dfg.update(encoded_log.trace_ids(i), int(encoded_log.counts[i]))
+        return dfg
+
+    @classmethod
+    def from_variant_log(cls, variant_log, vocabulary=None, dense=None):
+        """
+        Create a DFG from a variant log dictionary, the array-backed equivalent of utils.get_dfg.
+
+        Parameters:
+        - variant_log (dict): A dictionary where the keys are variants (tuples of activities) and the values are their occurrences.
+        - vocabulary (Vocabulary, optional): The vocabulary to use and extend. A new one is created if None.
+        - dense (bool, optional): Whether to store the edge counts densely. Decided on alphabet size if None.
+
+        Returns:
+        - EncodedDFG: The DFG of the variant log.
+        """
+        if vocabulary is None:
+            vocabulary = Vocabulary()
+        encoded_log = EncodedVariantLog.from_variant_log(variant_log, vocabulary)
+        return cls.from_encoded_log(encoded_log, dense=dense)
+
+    def copy(self):
+        """
+        Return an independent copy of the DFG (sharing the vocabulary).
+        """
+        new = EncodedDFG.__new__(EncodedDFG)
+        new.vocabulary = self.vocabulary
+        new.dense = self.dense
+        new.num_activities = self.num_activities
+        new.activity_counts = self.activity_counts.copy()
+        new.outgoing_counts = self.outgoing_counts.copy()
+        if self.dense:
+            new.edge_counts = self.edge_counts.copy()
+        else:
+            new.edge_keys = self.edge_keys.copy()
+            new.edge_values = self.edge_values.copy()
+        return new
+
+    def _resize(self):
+        #the vocabulary grew since the arrays were allocated
+        n = len(self.vocabulary)
+        if n <= self.num_activities:
+            return
+        self.activity_counts = np.concatenate([self.activity_counts, np.zeros(n - self.num_activities, dtype=np.int64)])
+        self.outgoing_counts = np.concatenate([self.outgoing_counts, np.zeros(n - self.num_activities, dtype=np.int64)])
+        if self.dense:
+            edge_counts = np.zeros((n, n), dtype=np.int64)
+            edge_counts[:self.num_activities, :self.num_activities] = self.edge_counts
+            self.edge_counts = edge_counts
+        self.num_activities = n
+
+    def _encode(self, trace):
+        if isinstance(trace, np.ndarray):
+            return trace
+        return self.vocabulary.encode(trace)
+
+    def get_edge_counts(self, src, dst):
+        """
+        Look up the counts of a batch of edges. Unknown ids (-1 or outside the DFG) have count 0.
+
+        Parameters:
+        - src (numpy.ndarray): The source activity ids.
+        - dst (numpy.ndarray): The target activity ids.
+
+        Returns:
+        - numpy.ndarray: The count of every edge (src[i], dst[i]).
+        """
+        src = np.asarray(src, dtype=np.int64)
+        dst = np.asarray(dst, dtype=np.int64)
+        known = (src >= 0) & (dst >= 0) & (src < self.num_activities) & (dst < self.num_activities)
+        counts = np.zeros(len(src), dtype=np.int64)
+        if self.dense:
+            counts[known] = self.edge_counts[src[known], dst[known]]
+        else:
+            positions, found = find_keys(self.edge_keys, edge_keys(src[known], dst[known]))
+            values = np.zeros(len(positions), dtype=np.int64)
+            values[found] = self.edge_values[positions[found]]
+            counts[known] = values
+        return counts
+
+    def get_outgoing_counts(self, src):
+        """
+        Get the total count of the outgoing edges of a batch of activities.
+
+        Parameters:
+        - src (numpy.ndarray): The source activity ids.
+
+        Returns:
+        - numpy.ndarray: The sum of the counts of all outgoing edges of every src[i].
+        """
+        src = np.asarray(src, dtype=np.int64)
+        known = (src >= 0) & (src < self.num_activities)
+        totals = np.zeros(len(src), dtype=np.int64)
+        totals[known] = self.outgoing_counts[src[known]]
+        return totals
+
+    def update(self, trace_ids, occurrence):
+        """
+        Update the DFG with a new trace, the array-backed equivalent of utils.update_dfg.
+
+        Parameters:
+        - trace_ids (numpy.ndarray or tuple): The new trace, encoded (with start and end markers) or as a tuple of activities.
+        - occurrence (int): The number of times the new trace occurred.
+
+        Returns:
+        - EncodedDFG: The updated DFG (updated in place).
+        """
+        if not isinstance(trace_ids, np.ndarray):
+            trace_ids = self.vocabulary.encode(trace_ids, add=True)
+        self._resize()
+        np.add.at(self.activity_counts, trace_ids, occurrence)
+        src, dst = trace_ids[:-1], trace_ids[1:]
+        np.add.at(self.outgoing_counts, src, occurrence)
+        if self.dense:
+            np.add.at(self.edge_counts, (src, dst), occurrence)
+        else:
+            keys, multiplicity = np.unique(edge_keys(src, dst), return_counts=True)
+            positions, found = find_keys(self.edge_keys, keys)
+            self.edge_values[positions[found]] += multiplicity[found] * occurrence
+            if not found.all():
+                #insert the new edges while keeping the keys sorted
+                self.edge_keys = np.insert(self.edge_keys, positions[~found], keys[~found])
+                self.edge_values = np.insert(self.edge_values, positions[~found], multiplicity[~found] * occurrence)
+        return self
+
+    def get_probability(self, trace):
+        """
+        Calculate the probability of a given trace to be replayed by the graph, the array-backed equivalent of utils.get_probability.
+
+        Parameters:
+        - trace (numpy.ndarray or tuple): The trace, encoded (with start and end markers) or as a tuple of activities.
+
+        Returns:
+        - float: The probability of the given trace in the graph.
+        """
+        trace_ids = self._encode(trace)
+        src, dst = trace_ids[:-1], trace_ids[1:]
+        outgoing = self.get_outgoing_counts(src)
+        if (outgoing == 0).any():
+            return 0.0
+        return float(np.prod(self.get_edge_counts(src, dst) / outgoing))
+
+    def to_dicts(self):
+        """
+        Convert the DFG to the dictionary format of utils.get_dfg.
+
+        Returns:
+        - activity_counts (dict): The counts of every activity that occurs in the DFG.
+        - edge_counts (dict): The counts of every edge that occurs in the DFG.
+        """
+        activities = self.vocabulary.activities
+        activity_counts = {activities[i]: int(self.activity_counts[i]) for i in np.flatnonzero(self.activity_counts)}
+        if self.dense:
+            src, dst = np.nonzero(self.edge_counts)
+            values = self.edge_counts[src, dst]
+        else:
+            nonzero = self.edge_values != 0
+            src, dst = self.edge_keys[nonzero] >> 32, self.edge_keys[nonzero] & 0xFFFFFFFF
+            values = self.edge_values[nonzero]
+        edge_counts = {(activities[s], activities[d]): int(v) for s, d, v in zip(src, dst, values)}
+        return activity_counts, edge_counts
+
+
+class StackedDFGs:
+    """
+    The DFGs of k clusters over one shared vocabulary, stacked in single arrays: activity and outgoing counts are (k x n) matrices and
+    edge counts either a dense (k x n x n) array or one sorted array of edge keys shared by all clusters with a (k x E) count matrix.
+    This lets one trace be scored against all clusters with a single gather.
+
+    Next to the counts, every cluster keeps its total ER over the traces it was built from (ER_sum, without the 1e-10 bound of 
+    'entropic_relevance.get_ER') and the breakdown of that total per source activity: node_terms[k, s] = o*log2(o) - sum_d e_sd*log2(e_sd), 
+    with o the outgoing total of s. Adding a trace only changes the terms of its own source activities, so the change of the ER_sum 
+    is known exactly in time proportional to the length of the trace.
+    The exact ER_sum equals the one with the bound as long as no trace of the cluster has a probability below the bound. For that, 
+    every cluster keeps a lower bound on the log2 probability of its traces (min_log_probs) and the highest number of times every 
+    activity is a source within one of its traces (source_multiplicities), see 'get_insertion_log_prob_drops'.
+
+    Parameters:
+    - vocabulary (Vocabulary): The vocabulary the DFGs are defined on. It may grow after the DFGs are created.
+    - num_clusters (int): The number of clusters.
+    - dense (bool, optional): Whether to store the edge counts densely. If None, it is decided based on DENSE_MAX_ACTIVITIES.
+    """
+    def __init__(self, vocabulary, num_clusters, dense=None):
+        self.vocabulary = vocabulary
+        if dense is None:
+            dense = len(vocabulary) <= DENSE_MAX_ACTIVITIES
+        self.dense = dense
+        self.num_clusters = num_clusters
+        self.num_activities = len(vocabulary)
+        self.activity_counts = np.zeros((num_clusters, self.num_activities), dtype=np.int64)
+        self.outgoing_counts = np.zeros((num_clusters, self.num_activities), dtype=np.int64)
+        self.node_terms = np.zeros((num_clusters, self.num_activities), dtype=np.float64)
+        self.ER_sums = np.zeros(num_clusters, dtype=np.float64)
+        self.occurrences = np.zeros(num_clusters, dtype=np.int64)
+        self.min_log_probs = np.full(num_clusters, np.inf)
+        self.source_multiplicities = np.zeros((num_clusters, self.num_activities), dtype=np.int64)
+        #the lower bounds computed by the last 'get_insertion_cluster_ERs', used by 'update' when that trace is added
+        self._insertion = None
+        if self.dense:
+            self.edge_counts = np.zeros((num_clusters, self.num_activities, self.num_activities), dtype=np.int64)
+        else:
+            self.edge_keys = np.zeros(0, dtype=np.int64)
+            self.edge_values = np.zeros((num_clusters, 0), dtype=np.int64)
+
+    @classmethod
+    def from_encoded_log(cls, encoded_log, clusters, dense=None):
+        """
+        Create the stacked DFGs of a clustering of an encoded variant log.
+
+        Parameters:
+        - encoded_log (EncodedVariantLog): The encoded variant log.
+        - clusters (list): For every cluster, the indices of its variants in the encoded log.
+        - dense (bool, optional): Whether to store the edge counts densely. Decided on alphabet size if None.
+
+        Returns:
+        - StackedDFGs: The DFGs of all clusters.
+        """
+        stacked = cls(encoded_log.vocabulary, len(clusters), dense=dense)
+        for k, indices in enumerate(clusters):
+            for i in indices:
+                stacked.update(k, encoded_log.trace_ids(i), int(encoded_log.counts[i]))
+        return stacked
+
+    def _resize(self):
+        #the vocabulary grew since the arrays were allocated
+        n = len(self.vocabulary)
+        if n <= self.num_activities:
+            return
+        extra = np.zeros((self.num_clusters, n - self.num_activities), dtype=np.int64)
+        self.activity_counts = np.concatenate([self.activity_counts, extra], axis=1)
+        self.outgoing_counts = np.concatenate([self.outgoing_counts, extra], axis=1)
+        self.node_terms = np.concatenate([self.node_terms, extra.astype(np.float64)], axis=1)
+        self.source_multiplicities = np.concatenate([self.source_multiplicities, extra], axis=1)
+        if self.dense:
+            edge_counts = np.zeros((self.num_clusters, n, n), dtype=np.int64)
+            edge_counts[:, :self.num_activities, :self.num_activities] = self.edge_counts
+            self.edge_counts = edge_counts
+        self.num_activities = n
+
+    def update(self, cluster_index, trace_ids, occurrence):
+        """
+        Update the DFG of one cluster with a new trace. A negative occurrence removes the trace again.
+
+        Parameters:
+        - cluster_index (int): The index of the cluster.
+        - trace_ids (numpy.ndarray): The encoded trace, with start and end markers.
+        - occurrence (int): The number of times the new trace occurred.
+
+        Returns:
+        - StackedDFGs: The updated DFGs (updated in place).
+        """
+        self._resize()
+        edge_src, edge_dst, edge_multiplicity, sources, source_multiplicity = get_trace_multisets(trace_ids)
+        #update the lower bound on the log2 probability of the traces of the cluster
+        if occurrence < 0:
+            #removing a trace can lower the probability of the other traces by any amount
+            self.min_log_probs[cluster_index] = -np.inf
+        elif self._insertion is not None and self._insertion[0] == trace_ids.tobytes() and self._insertion[1] == occurrence:
+            self.min_log_probs[cluster_index] = self._insertion[2][cluster_index]
+        else:
+            drop = self.get_insertion_log_prob_drops(sources, source_multiplicity, occurrence)[cluster_index]
+            log_prob = -self.get_insertion_ERs(trace_ids, occurrence)[cluster_index]
+            self.min_log_probs[cluster_index] = min(self.min_log_probs[cluster_index] - drop, log_prob)
+        self._insertion = None
+        self.source_multiplicities[cluster_index, sources] = np.maximum(self.source_multiplicities[cluster_index, sources], source_multiplicity)
+        #update the ER breakdown of the touched source activities before changing the counts
+        old_edges = self.get_edge_counts(edge_src, edge_dst, cluster_index)
+        old_outgoing = self.outgoing_counts[cluster_index, sources]
+        source_deltas = xlog2x(old_outgoing + occurrence * source_multiplicity) - xlog2x(old_outgoing)
+        edge_deltas = xlog2x(old_edges + occurrence * edge_multiplicity) - xlog2x(old_edges)
+        self.node_terms[cluster_index, sources] += source_deltas
+        np.subtract.at(self.node_terms[cluster_index], edge_src, edge_deltas)
+        self.ER_sums[cluster_index] += source_deltas.sum() - edge_deltas.sum()
+        self.occurrences[cluster_index] += occurrence
+
+        np.add.at(self.activity_counts[cluster_index], trace_ids, occurrence)
+        self.outgoing_counts[cluster_index, sources] += occurrence * source_multiplicity
+        if self.dense:
+            self.edge_counts[cluster_index, edge_src, edge_dst] += occurrence * edge_multiplicity
+        else:
+            keys = edge_keys(edge_src, edge_dst)
+            positions, found = find_keys(self.edge_keys, keys)
+            if not found.all():
+                #add the new edges (with count 0 in every cluster) while keeping the keys sorted
+                self.edge_keys = np.insert(self.edge_keys, positions[~found], keys[~found])
+                self.edge_values = np.insert(self.edge_values, positions[~found], 0, axis=1)
+                positions, found = find_keys(self.edge_keys, keys)
+            self.edge_values[cluster_index, positions] += occurrence * edge_multiplicity
+        return self
+
+    def get_edge_counts(self, src, dst, cluster_index=None):
+        """
+        Look up the counts of a batch of edges in every cluster. Unknown ids have count 0.
+
+        Parameters:
+        - src (numpy.ndarray): The source activity ids.
+        - dst (numpy.ndarray): The target activity ids.
+        - cluster_index (int, optional): Only look up the counts in this cluster. Defaults to None (all clusters).
+
+        Returns:
+        - numpy.ndarray: A (k x len(src)) matrix with the count of every edge in every cluster, or a vector for a single cluster.
+        """
+        src = np.asarray(src, dtype=np.int64)
+        dst = np.asarray(dst, dtype=np.int64)
+        known = (src >= 0) & (dst >= 0) & (src < self.num_activities) & (dst < self.num_activities)
+        rows = slice(None) if cluster_index is None else cluster_index
+        counts = np.zeros((self.num_clusters, len(src)), dtype=np.int64)[rows]
+        if self.dense:
+            counts[..., known] = self.edge_counts[rows, src[known], dst[known]]
+        else:
+            positions, found = find_keys(self.edge_keys, edge_keys(src[known], dst[known]))
+            values = np.zeros((self.num_clusters, len(positions)), dtype=np.int64)[rows]
+            values[..., found] = self.edge_values[rows][..., positions[found]]
+            counts[..., known] = values
+        return counts
+
+    def get_outgoing_counts(self, src):
+        """
+        Get the total count of the outgoing edges of a batch of activities in every cluster.
+
+        Parameters:
+        - src (numpy.ndarray): The source activity ids.
+
+        Returns:
+        - numpy.ndarray: A (k x len(src)) matrix with the outgoing total of every activity in every cluster.
+        """
+        src = np.asarray(src, dtype=np.int64)
+        known = (src >= 0) & (src < self.num_activities)
+        totals = np.zeros((self.num_clusters, len(src)), dtype=np.int64)
+        totals[:, known] = self.outgoing_counts[:, src[known]]
+        return totals
+
+    def get_dfg(self, cluster_index):
+        """
+        Get the DFG of one cluster as an EncodedDFG. Its arrays are views on the stacked arrays, so it reflects later updates of the 
+        cluster but should not be updated itself.
+
+        Parameters:
+        - cluster_index (int): The index of the cluster.
+
+        Returns:
+        - EncodedDFG: The DFG of the cluster.
+        """
+        dfg = EncodedDFG.__new__(EncodedDFG)
+        dfg.vocabulary = self.vocabulary
+        dfg.dense = self.dense
+        dfg.num_activities = self.num_activities
+        dfg.activity_counts = self.activity_counts[cluster_index]
+        dfg.outgoing_counts = self.outgoing_counts[cluster_index]
+        if self.dense:
+            dfg.edge_counts = self.edge_counts[cluster_index]
+        else:
+            dfg.edge_keys = self.edge_keys
+            dfg.edge_values = self.edge_values[cluster_index]
+        return dfg
+
+    def get_insertion_ERs(self, trace_ids, occurrence, min_prob=None):
+        """
+        Calculate, for every cluster at once, the ER a trace would get after adding it (with its occurrence) to that cluster's DFG. 
+        The DFGs are not modified: the counts after insertion are the current counts plus the occurrence times the multiplicity of
+        every edge and source activity in the trace.
+
+        Parameters:
+        - trace_ids (numpy.ndarray): The encoded trace, with start and end markers.
+        - occurrence (int): The occurrence of the trace.
+        - min_prob (float, optional): Lower bound on the trace probability, as used by 'entropic_relevance.get_ER' (1e-10). Defaults to None.
+
+        Returns:
+        - numpy.ndarray: The ER of the trace for every cluster.
+        """
+        src, dst = trace_ids[:-1], trace_ids[1:]
+        edge_multiplicity, source_multiplicity = get_step_multiplicities(trace_ids)
+        edge_counts = self.get_edge_counts(src, dst) + occurrence * edge_multiplicity
+        outgoing_counts = self.get_outgoing_counts(src) + occurrence * source_multiplicity
+        ERs = -(np.log2(edge_counts) - np.log2(outgoing_counts)).sum(axis=1)
+        if min_prob is not None:
+            ERs = np.minimum(ERs, -np.log2(min_prob))
+        return ERs
+
+    def get_batch_insertion_ERs(self, encoded_log, min_prob=None):
+        """
+        Calculate 'get_insertion_ERs' for every variant of an encoded log at once: the ER every variant would get after adding it (with 
+        its occurrence) to the DFG of every cluster. Every variant is scored on the current DFGs, independently of the other variants.
+
+        Parameters:
+        - encoded_log (EncodedVariantLog): The variants to score, encoded with the vocabulary of the DFGs.
+        - min_prob (float, optional): Lower bound on the trace probabilities, as used by 'entropic_relevance.get_ER' (1e-10). Defaults to None.
+
+        Returns:
+        - numpy.ndarray: A (k x number of variants) matrix with the ER of every variant for every cluster.
+        """
+        src, dst, variant_index = encoded_log.transitions()
+        #multiplicity of the edge and of the source activity of every transition within its own trace
+        edge_multiplicity, source_multiplicity = get_transition_multiplicities(src, dst, variant_index, len(encoded_log.vocabulary))
+        occurrences = encoded_log.counts[variant_index]
+        edge_counts = self.get_edge_counts(src, dst) + occurrences * edge_multiplicity
+        outgoing_counts = self.get_outgoing_counts(src) + occurrences * source_multiplicity
+        log_probs = np.log2(edge_counts) - np.log2(outgoing_counts)
+        #segment sum of the transition log probabilities per variant, for every cluster
+        ERs = -np.stack([np.bincount(variant_index, weights=row, minlength=len(encoded_log)) for row in log_probs])
+        if min_prob is not None:
+            ERs = np.minimum(ERs, -np.log2(min_prob))
+        return ERs
+
+    def get_counts_at(self, cluster_indices, src, dst):
+        """
+        Look up the counts of single edges in single clusters: edge (src[i], dst[i]) in cluster cluster_indices[i]. Unknown ids have count 0.
+
+        Parameters:
+        - cluster_indices (numpy.ndarray): The cluster of every lookup.
+        - src (numpy.ndarray): The source activity ids.
+        - dst (numpy.ndarray): The target activity ids.
+
+        Returns:
+        - edge_counts (numpy.ndarray): The count of every edge in its cluster.
+        - outgoing_counts (numpy.ndarray): The outgoing total of every source activity in its cluster.
+        """
+        n = self.num_activities
+        src = np.asarray(src, dtype=np.int64)
+        dst = np.asarray(dst, dtype=np.int64)
+        known_source = (src >= 0) & (src < n)
+        known = known_source & (dst >= 0) & (dst < n)
+        #unknown ids are looked up as id 0 and their count is set to 0 afterwards, so every lookup is a single take on the flat array
+        src_or_zero = np.where(known_source, src, 0)
+        dst_or_zero = np.where(known, dst, 0)
+        rows = np.asarray(cluster_indices, dtype=np.int64) * n + src_or_zero
+        outgoing_counts = self.outgoing_counts.ravel().take(rows) * known_source
+        if self.dense:
+            edge_counts = self.edge_counts.ravel().take(rows * n + dst_or_zero) * known
+        else:
+            positions, found = find_keys(self.edge_keys, edge_keys(src_or_zero, dst_or_zero))
+            found &= known
+            edge_counts = np.zeros(len(src), dtype=np.int64)
+            edge_counts[found] = self.edge_values[cluster_indices[found], positions[found]]
+        return edge_counts, outgoing_counts
+
+    def assign_batch(self, encoded_log, min_prob=None, block_size=4):
+        """
+        Find, for every variant of an encoded log, the cluster with the lowest ER after inserting the variant (the argmin over the clusters 
+        of 'get_batch_insertion_ERs', the first cluster in case of ties), with branch-and-bound: every variant is first scored completely 
+        on its most promising cluster (the one with the highest probability of its first step), and the other clusters are then scored 
+        block_size steps at a time for all variants together, dropping a (variant, cluster) pair as soon as its running ER can no longer 
+        beat the best cluster of the variant. The running ER only grows with every step, so the dropped pairs can not change the result.
+
+        Parameters:
+        - encoded_log (EncodedVariantLog): The variants to assign, encoded with the vocabulary of the DFGs.
+        - min_prob (float, optional): Lower bound on the trace probabilities, as used by 'entropic_relevance.get_ER' (1e-10). Defaults to None.
+        - block_size (int, optional): The number of steps scored between two pruning rounds. Defaults to 4.
+
+        Returns:
+        - labels (numpy.ndarray): The best cluster of every variant.
+        - ERs (numpy.ndarray): The ER of every variant in its best cluster.
+        - stats (dict): The number of steps that were scored ('steps') and that a full evaluation would score ('total_steps').
+        """
+        src, dst, variant_index = encoded_log.transitions()
+        num_variants = len(encoded_log)
+        num_steps = encoded_log.lengths() - 1
+        starts = np.zeros(num_variants, dtype=np.int64)
+        np.cumsum(num_steps[:-1], out=starts[1:])
+        bound = -np.log2(min_prob) if min_prob is not None else np.inf
+        #the counts of every transition grow by the occurrence times the multiplicity of its edge and source in its own trace
+        edge_multiplicity, source_multiplicity = get_transition_multiplicities(src, dst, variant_index, len(encoded_log.vocabulary))
+        occurrences = encoded_log.counts[variant_index]
+        added_edges = occurrences * edge_multiplicity
+        added_outgoing = occurrences * source_multiplicity
+
+        def get_step_costs(cluster_indices, transitions):
+            edge_counts, outgoing_counts = self.get_counts_at(cluster_indices, src[transitions], dst[transitions])
+            return -(np.log2(edge_counts + added_edges[transitions]) - np.log2(outgoing_counts + added_outgoing[transitions]))
+
+        #the first step of every variant on every cluster gives the most promising cluster
+        first_edges = self.get_edge_counts(src[starts], dst[starts]) + added_edges[starts]
+        first_outgoing = self.get_outgoing_counts(src[starts]) + added_outgoing[starts]
+        first_costs = -(np.log2(first_edges) - np.log2(first_outgoing))
+        labels = np.argmin(first_costs, axis=0)
+        #complete score on the most promising cluster
+        rest = np.ones(len(src), dtype=bool)
+        rest[starts] = False
+        transitions = np.flatnonzero(rest)
+        ERs = first_costs[labels, np.arange(num_variants)] + np.bincount(variant_index[transitions], weights=get_step_costs(labels[variant_index[transitions]], transitions), minlength=num_variants)
+        ERs = np.minimum(ERs, bound)
+        steps = self.num_clusters * num_variants + len(transitions)
+
+        candidate_variants = np.repeat(np.arange(num_variants), self.num_clusters)
+        candidate_clusters = np.tile(np.arange(self.num_clusters), num_variants)
+        others = candidate_clusters != labels[candidate_variants]
+        candidate_variants, candidate_clusters = candidate_variants[others], candidate_clusters[others]
+        partial = first_costs[candidate_clusters, candidate_variants]
+        position = 1
+        while len(candidate_variants) > 0:
+            lower_bounds = np.minimum(partial, bound)
+            #a pair is finished when all its steps are scored, or when it reached the bound (its ER is then the bound)
+            finished = (position >= num_steps[candidate_variants]) | (partial >= bound)
+            if finished.any():
+                v, k, ER = candidate_variants[finished], candidate_clusters[finished], lower_bounds[finished]
+                #lowest (ER, cluster) per variant among the finished pairs, compared with the best so far
+                order = np.lexsort((k, ER, v))
+                v, k, ER = v[order], k[order], ER[order]
+                _, first = np.unique(v, return_index=True)
+                v, k, ER = v[first], k[first], ER[first]
+                better = (ER < ERs[v]) | ((ER == ERs[v]) & (k < labels[v]))
+                ERs[v[better]] = ER[better]
+                labels[v[better]] = k[better]
+            alive = ~finished & ((lower_bounds < ERs[candidate_variants]) | ((lower_bounds == ERs[candidate_variants]) & (candidate_clusters < labels[candidate_variants])))
+            candidate_variants, candidate_clusters, partial = candidate_variants[alive], candidate_clusters[alive], partial[alive]
+            if len(candidate_variants) == 0:
+                break
+            #score the next block of steps of all remaining pairs
+            positions = position + np.arange(block_size)
+            valid = positions[None, :] < num_steps[candidate_variants][:, None]
+            rows = np.nonzero(valid)[0]
+            transitions = (starts[candidate_variants][:, None] + positions[None, :])[valid]
+            partial = partial + np.bincount(rows, weights=get_step_costs(candidate_clusters[rows], transitions), minlength=len(partial))
+            steps += len(transitions)
+            position += block_size
+        return labels, ERs, {'steps': int(steps), 'total_steps': int(self.num_clusters * len(src))}
+
+    def get_ER_sum_deltas(self, trace_ids, occurrence):
+        """
+        Calculate, for every cluster at once, how much its ER_sum changes when a trace is added to it (with its occurrence). Only the 
+        terms of the source activities of the trace change, so this needs the counts of the trace's own edges and sources only.
+
+        Parameters:
+        - trace_ids (numpy.ndarray): The encoded trace, with start and end markers.
+        - occurrence (int): The occurrence of the trace (negative to remove it).
+
+        Returns:
+        - numpy.ndarray: The change of the ER_sum of every cluster.
+        """
+        edge_src, edge_dst, edge_multiplicity, sources, source_multiplicity = get_trace_multisets(trace_ids)
+        old_edges = self.get_edge_counts(edge_src, edge_dst)
+        old_outgoing = self.get_outgoing_counts(sources)
+        source_deltas = xlog2x(old_outgoing + occurrence * source_multiplicity) - xlog2x(old_outgoing)
+        edge_deltas = xlog2x(old_edges + occurrence * edge_multiplicity) - xlog2x(old_edges)
+        return source_deltas.sum(axis=1) - edge_deltas.sum(axis=1)
+
+    def get_move_deltas(self, trace_ids, occurrence, cluster_index):
+        """
+        Calculate, for every cluster at once, how much the total ER_sum over all clusters changes when a trace (with its occurrence) is 
+        moved from one cluster to that cluster: the change of the ER_sum of the source cluster when removing the trace plus the change 
+        of the ER_sum of the target cluster when adding it. The counts of the trace's edges and sources are gathered only once.
+
+        Parameters:
+        - trace_ids (numpy.ndarray): The encoded trace, with start and end markers.
+        - occurrence (int): The occurrence of the trace.
+        - cluster_index (int): The index of the cluster the trace currently belongs to.
+
+        Returns:
+        - numpy.ndarray: The change of the total ER_sum for every target cluster (0 for the current cluster).
+        """
+        edge_src, edge_dst, edge_multiplicity, sources, source_multiplicity = get_trace_multisets(trace_ids)
+        old_edges = self.get_edge_counts(edge_src, edge_dst)
+        old_outgoing = self.get_outgoing_counts(sources)
+        insertion_deltas = (xlog2x(old_outgoing + occurrence * source_multiplicity) - xlog2x(old_outgoing)).sum(axis=1) \
+            - (xlog2x(old_edges + occurrence * edge_multiplicity) - xlog2x(old_edges)).sum(axis=1)
+        old_edges, old_outgoing = old_edges[cluster_index], old_outgoing[cluster_index]
+        removal_delta = (xlog2x(old_outgoing - occurrence * source_multiplicity) - xlog2x(old_outgoing)).sum() \
+            - (xlog2x(old_edges - occurrence * edge_multiplicity) - xlog2x(old_edges)).sum()
+        deltas = insertion_deltas + removal_delta
+        deltas[cluster_index] = 0.0
+        return deltas
+
+    def get_insertion_log_prob_drops(self, sources, source_multiplicity, occurrence):
+        """
+        Get, for every cluster at once, an upper bound on how much the log2 probability of any trace of the cluster can drop when a trace 
+        is added to it. Adding a trace never lowers an edge count, and raises the outgoing total of each of its source activities s from 
+        o to o + d, so every step from s of another trace loses at most log2((o + d)/o), at most source_multiplicities[k, s] times.
+
+        Parameters:
+        - sources (numpy.ndarray): The distinct source activities of the added trace, as returned by 'get_trace_multisets'.
+        - source_multiplicity (numpy.ndarray): How often every such activity is a source in the added trace.
+        - occurrence (int): The occurrence of the added trace.
+
+        Returns:
+        - numpy.ndarray: The upper bound on the drop for every cluster.
+        """
+        old_outgoing = self.get_outgoing_counts(sources)
+        known = sources < self.num_activities
+        multiplicities = np.zeros(old_outgoing.shape, dtype=np.int64)
+        multiplicities[:, known] = self.source_multiplicities[:, sources[known]]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            drops = np.where(old_outgoing > 0, np.log2((old_outgoing + occurrence * source_multiplicity) / old_outgoing), 0.0)
+        return (multiplicities * drops).sum(axis=1)
+
+    def get_cluster_log_probs_with_insertion(self, cluster_index, cluster_log, trace_ids, occurrence):
+        """
+        Get the log2 probability of every trace of a cluster as if another trace had been added to the cluster's DFG, without modifying it.
+
+        Parameters:
+        - cluster_index (int): The index of the cluster.
+        - cluster_log (EncodedVariantLog): The traces of the cluster, encoded with the vocabulary of the DFGs.
+        - trace_ids (numpy.ndarray): The encoded added trace, with start and end markers.
+        - occurrence (int): The occurrence of the added trace.
+
+        Returns:
+        - numpy.ndarray: The log2 probability of every trace of the cluster (-inf for traces that can not be replayed).
+        """
+        self._resize()
+        src, dst, variant_index = cluster_log.transitions()
+        edge_src, edge_dst, edge_multiplicity, sources, source_multiplicity = get_trace_multisets(trace_ids)
+        #the multiplicity of every transition's edge and source in the added trace (the multisets are sorted)
+        positions, found = find_keys(edge_keys(edge_src, edge_dst), edge_keys(src, dst))
+        added_edges = np.where(found, edge_multiplicity[np.minimum(positions, len(edge_multiplicity) - 1)], 0)
+        positions, found = find_keys(sources, src)
+        added_outgoing = np.where(found, source_multiplicity[np.minimum(positions, len(source_multiplicity) - 1)], 0)
+        edge_counts = self.get_edge_counts(src, dst, cluster_index) + occurrence * added_edges
+        outgoing_counts = self.get_outgoing_counts(src)[cluster_index] + occurrence * added_outgoing
+        with np.errstate(divide='ignore', invalid='ignore'):
+            log_probs = np.log2(edge_counts) - np.log2(outgoing_counts)
+        log_probs[outgoing_counts == 0] = -np.inf
+        return np.bincount(variant_index, weights=log_probs, minlength=len(cluster_log))
+
+    def get_insertion_cluster_ERs(self, trace_ids, occurrence, min_prob=None, get_cluster_log=None):
+        """
+        Calculate, for every cluster at once, the average ER over all traces of the cluster after adding a trace to it (the 'full_cluster'
+        objective), using the maintained ER_sums and the exact change computed by 'get_ER_sum_deltas'.
+        With min_prob, the ER is the one of 'entropic_relevance.get_ER', with that lower bound on every trace probability. The exact
+        ER is used for clusters where no trace can be below the bound after the insertion (see 'get_insertion_log_prob_drops'), the 
+        other clusters are scored trace by trace on the traces given by get_cluster_log.
+
+        Parameters:
+        - trace_ids (numpy.ndarray): The encoded trace, with start and end markers.
+        - occurrence (int): The occurrence of the trace.
+        - min_prob (float, optional): Lower bound on the trace probabilities, as used by 'entropic_relevance.get_ER' (1e-10). Defaults to 
+          None (the exact ER).
+        - get_cluster_log (callable, optional): Returns the traces of a cluster, as an EncodedVariantLog with the vocabulary of the DFGs, 
+          given its index. Needed with min_prob. Defaults to None.
+
+        Returns:
+        - numpy.ndarray: The ER of every cluster after the insertion.
+        """
+        ERs = (self.ER_sums + self.get_ER_sum_deltas(trace_ids, occurrence)) / (self.occurrences + occurrence)
+        if min_prob is None:
+            return ERs
+        _, _, _, sources, source_multiplicity = get_trace_multisets(trace_ids)
+        trace_ERs = self.get_insertion_ERs(trace_ids, occurrence)
+        min_log_probs = np.minimum(self.min_log_probs - self.get_insertion_log_prob_drops(sources, source_multiplicity, occurrence), -trace_ERs)
+        bound = -np.log2(min_prob)
+        for k in np.flatnonzero(min_log_probs < -bound + BOUND_MARGIN).tolist():
+            if get_cluster_log is None:
+                raise ValueError("get_cluster_log is needed to score clusters with traces at the bound.")
+            #a trace may be at the bound, score the cluster trace by trace
+            cluster_log = get_cluster_log(k)
+            log_probs = self.get_cluster_log_probs_with_insertion(k, cluster_log, trace_ids, occurrence)
+            #summed one trace at a time in the order of the cluster, then the added trace, like 'get_cluster_ER_with_insertion' of the dict
+            #backend: clusters with all traces at the bound have equal ERs, and must tie in the same way on both backends
+            terms = np.append(np.minimum(-log_probs, bound) * cluster_log.counts, min(trace_ERs[k], bound) * occurrence)
+            ER_sum = float(np.cumsum(terms)[-1])
+            ERs[k] = ER_sum / (int(cluster_log.counts.sum()) + occurrence)
+            min_log_probs[k] = min(log_probs.min(initial=np.inf), -trace_ERs[k])
+        self._insertion = (trace_ids.tobytes(), occurrence, min_log_probs)
+        return ERs
+
+    def assign(self, trace_ids, occurrence, min_prob=None, opt='trace', get_cluster_log=None):
+        """
+        Find the cluster for which adding a trace gives the lowest ER.
+
+        Parameters:
+        - trace_ids (numpy.ndarray): The encoded trace, with start and end markers.
+        - occurrence (int): The occurrence of the trace.
+        - min_prob (float, optional): Lower bound on the trace probabilities, see 'get_insertion_ERs' and 'get_insertion_cluster_ERs'. 
+          Not used for opt='full_cluster_exact'. Defaults to None.
+        - opt (str, optional): 'trace' to minimize the ER of the trace itself, 'full_cluster' to minimize the ER of the whole cluster, 
+          'full_cluster_exact' to minimize the exact ER of the whole cluster, without the bound. Defaults to 'trace'.
+        - get_cluster_log (callable, optional): Returns the traces of a cluster given its index, see 'get_insertion_cluster_ERs'. Needed 
+          for opt='full_cluster' with min_prob. Defaults to None.
+
+        Returns:
+        - best_cluster_index (int): The index of the best cluster (the first one in case of ties).
+        - ERs (numpy.ndarray): The ER of the trace (or the cluster) for every cluster.
+        """
+        if opt == 'trace':
+            ERs = self.get_insertion_ERs(trace_ids, occurrence, min_prob=min_prob)
+        elif opt == 'full_cluster':
+            ERs = self.get_insertion_cluster_ERs(trace_ids, occurrence, min_prob=min_prob, get_cluster_log=get_cluster_log)
+        elif opt == 'full_cluster_exact':
+            ERs = self.get_insertion_cluster_ERs(trace_ids, occurrence)
+        else:
+            raise ValueError("opt has to be 'full_cluster', 'full_cluster_exact' or 'trace'")
+        return int(np.argmin(ERs)), ERs
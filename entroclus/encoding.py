@@ -0,0 +1,347 @@
+import numpy as np
+import pandas
+
+BOS = 'BOS'
+EOS = 'EOS'
+BOS_ID = 0
+EOS_ID = 1
+#multiplier of the polynomial hash used to group equal traces in 'EncodedVariantLog.from_dataframe' (odd, so it is invertible mod 2**64)
+HASH_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+
+
+class Vocabulary:
+    """
+    Maps activity labels to integer ids. The start and end markers used by the DFG ('BOS' and 'EOS') always get ids 0 and 1,
+    so every encoded trace can be replayed on an array-backed DFG without any string hashing.
+
+    Parameters:
+    - activities (iterable, optional): Activities to add to the vocabulary, in order.
+    """
+    def __init__(self, activities=()):
+        self.activities = [BOS, EOS]
+        self.index = {BOS: BOS_ID, EOS: EOS_ID}
+        for activity in activities:
+            self.add(activity)
+
+    def __len__(self):
+        return len(self.activities)
+
+    def __contains__(self, activity):
+        return activity in self.index
+
+    def add(self, activity):
+        """
+        Add an activity to the vocabulary if it is not present yet.
+
+        Parameters:
+        - activity (str): The activity label.
+
+        Returns:
+        - int: The id of the activity.
+        """
+        if activity not in self.index:
+            self.index[activity] = len(self.activities)
+            self.activities.append(activity)
+        return self.index[activity]
+
+    def encode(self, trace, add=False):
+        """
+        Encode a trace (tuple of activities) to an array of ids, with the start and end markers added.
+
+        Parameters:
+        - trace (tuple): The trace to encode.
+        - add (bool, optional): Whether unknown activities are added to the vocabulary. If False, they are encoded as -1. Defaults to False.
+
+        Returns:
+        - numpy.ndarray: The encoded trace (int32), starting with BOS_ID and ending with EOS_ID.
+        """
+        if add == True:
+            ids = [self.add(activity) for activity in trace]
+        else:
+            ids = [self.index.get(activity, -1) for activity in trace]
+        return np.array([BOS_ID] + ids + [EOS_ID], dtype=np.int32)
+
+    def get_mapping(self, other):
+        """
+        Get the array that maps the ids of this vocabulary to the ids of another vocabulary.
+
+        Parameters:
+        - other (Vocabulary): The target vocabulary.
+
+        Returns:
+        - numpy.ndarray: For every id in this vocabulary, the id of the same activity in the other vocabulary, or -1 if it is unknown there.
+        """
+        return np.array([other.index.get(activity, -1) for activity in self.activities], dtype=np.int32)
+
+    def decode(self, trace_ids):
+        """
+        Decode an encoded trace back to a tuple of activities, dropping the start and end markers.
+
+        Parameters:
+        - trace_ids (numpy.ndarray): The encoded trace, including BOS_ID and EOS_ID.
+
+        Returns:
+        - tuple: The trace as a tuple of activity labels.
+        """
+        return tuple(self.activities[i] for i in trace_ids[1:-1])
+
+
+class EncodedVariantLog:
+    """
+    A variant log stored as integer-encoded traces. All traces (with start and end markers) are concatenated in one int32 buffer,
+    trace i being buffer[offsets[i]:offsets[i+1]], and counts[i] holds its number of occurrences.
+    The arrays are read-only, so one encoded log can be shared by all stages of a clustering, which refer to its variants by index
+    (a cluster is an array of variant indices) instead of copying variant log dictionaries.
+
+    Parameters:
+    - vocabulary (Vocabulary): The vocabulary used to encode the traces.
+    - buffer (numpy.ndarray): The concatenated encoded traces.
+    - offsets (numpy.ndarray): The start position of every trace in the buffer, plus the total length at the end.
+    - counts (numpy.ndarray): The occurrences of every variant.
+    """
+    def __init__(self, vocabulary, buffer, offsets, counts):
+        self.vocabulary = vocabulary
+        #read-only views, the arrays passed in stay writable for their owner
+        self.buffer = np.asarray(buffer, dtype=np.int32).view()
+        self.offsets = np.asarray(offsets, dtype=np.int64).view()
+        self.counts = np.asarray(counts, dtype=np.int64).view()
+        for array in [self.buffer, self.offsets, self.counts]:
+            array.flags.writeable = False
+        self._transitions = None
+        self._self_ERs = None
+
+    @classmethod
+    def from_variant_log(cls, variant_log, vocabulary=None, add=True):
+        """
+        Encode a variant log dictionary.
+
+        Parameters:
+        - variant_log (dict): A dictionary where the keys are variants (tuples of activities) and the values are their occurrences.
+        - vocabulary (Vocabulary, optional): The vocabulary to use and extend. A new one is created if None.
+        - add (bool, optional): Whether unknown activities are added to the vocabulary, see 'Vocabulary.encode'. Defaults to True.
+
+        Returns:
+        - EncodedVariantLog: The encoded variant log, in the same order as the dictionary.
+        """
+        counts = np.fromiter(variant_log.values(), dtype=np.int64, count=len(variant_log))
+        return cls.from_traces(variant_log.keys(), counts, vocabulary=vocabulary, add=add)
+
+    @classmethod
+    def from_traces(cls, traces, counts=None, vocabulary=None, add=True):
+        """
+        Encode a sequence of traces, which do not have to be distinct.
+
+        Parameters:
+        - traces (iterable): The traces (tuples of activities).
+        - counts (numpy.ndarray, optional): The occurrences of every trace. Defaults to None (1 for every trace).
+        - vocabulary (Vocabulary, optional): The vocabulary to use and extend. A new one is created if None.
+        - add (bool, optional): Whether unknown activities are added to the vocabulary, see 'Vocabulary.encode'. Defaults to True.
+
+        Returns:
+        - EncodedVariantLog: The encoded traces, in the given order.
+        """
+        if vocabulary is None:
+            vocabulary = Vocabulary()
+        encoded = [vocabulary.encode(trace, add=add) for trace in traces]
+        lengths = np.array([len(trace_ids) for trace_ids in encoded], dtype=np.int64)
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        buffer = np.concatenate(encoded) if len(encoded) > 0 else np.zeros(0, dtype=np.int32)
+        if counts is None:
+            counts = np.ones(len(encoded), dtype=np.int64)
+        return cls(vocabulary, buffer, offsets, counts)
+
+    @classmethod
+    def from_dataframe(cls, df, vocabulary=None, add=True, order=True, case_id_key='case:concept:name', activity_key='concept:name',
+                       timestamp_key=None):
+        """
+        Extract the encoded variant log of a pandas event log without pm4py, vectorized over all events. The events are sorted stably on
+        case id, so the events of every case keep the order of the dataframe, like in pm4py (and on timestamp within every case, only if
+        a timestamp column is given). Every case is hashed into one integer, and the cases are grouped into variants on those hash codes. Hash collisions are ruled out by comparing every case with the first case of its
+        variant. Variants come in the order of 'utils.get_variant_log': by first appearance over the sorted case ids, and if order is
+        True stably sorted on frequency.
+
+        Parameters:
+        - df (pandas.DataFrame): The event log.
+        - vocabulary (Vocabulary, optional): The vocabulary to use and extend. A new one is created if None.
+        - add (bool, optional): Whether unknown activities are added to the vocabulary, see 'Vocabulary.encode'. Defaults to True.
+        - order (bool, optional): Whether to order the variants by frequency. Defaults to True.
+        - case_id_key (str, optional): The case id column. Defaults to 'case:concept:name'.
+        - activity_key (str, optional): The activity column. Defaults to 'concept:name'.
+        - timestamp_key (str, optional): The timestamp column to sort the events of every case on (stably). Defaults to None (the
+          order of the dataframe, as in 'pm4py.stats.get_variants_as_tuples').
+
+        Returns:
+        - encoded_log (EncodedVariantLog): The encoded variant log.
+        - case_variants (pandas.Series): The index of the variant of every case, indexed by (sorted) case id.
+        """
+        if vocabulary is None:
+            vocabulary = Vocabulary()
+        case_codes, case_ids = pandas.factorize(df[case_id_key], sort=True)
+        activity_codes, activities = pandas.factorize(df[activity_key])
+        if add == True:
+            activity_ids = np.array([vocabulary.add(activity) for activity in activities], dtype=np.int32)
+        else:
+            activity_ids = np.array([vocabulary.index.get(activity, -1) for activity in activities], dtype=np.int32)
+        if timestamp_key is not None:
+            #timestamps as sortable integer codes, np.lexsort is stable
+            timestamp_codes = pandas.factorize(df[timestamp_key], sort=True)[0]
+            event_order = np.lexsort((timestamp_codes, case_codes))
+        else:
+            event_order = np.argsort(case_codes, kind='stable')
+        case_codes = case_codes[event_order]
+        events = activity_ids[activity_codes[event_order]]
+        num_cases = len(case_ids)
+        case_starts = np.flatnonzero(np.diff(case_codes, prepend=-1))
+        case_lengths = np.diff(case_starts, append=len(events))
+        #position of every event within its case
+        positions = np.arange(len(events), dtype=np.int64) - np.repeat(case_starts, case_lengths)
+
+        #polynomial hash of every case, with uint64 arithmetic wrapping around mod 2**64
+        powers = np.cumprod(np.full(int(case_lengths.max()) + 1 if num_cases > 0 else 1, HASH_MULTIPLIER, dtype=np.uint64))
+        terms = (events.astype(np.uint64) + np.uint64(2)) * powers[positions]
+        hashes = np.add.reduceat(terms, case_starts) if num_cases > 0 else np.zeros(0, dtype=np.uint64)
+        hashes += case_lengths.astype(np.uint64)
+        case_variant_codes, _ = pandas.factorize(hashes)
+        num_variants = int(case_variant_codes.max()) + 1 if num_cases > 0 else 0
+        #first case of every variant
+        representatives = np.zeros(num_variants, dtype=np.int64)
+        representatives[case_variant_codes[::-1]] = np.arange(num_cases - 1, -1, -1)
+        event_representatives = np.repeat(representatives[case_variant_codes], case_lengths)
+        if (np.any(case_lengths != case_lengths[representatives[case_variant_codes]])
+                or np.any(events != events[case_starts[event_representatives] + positions])):
+            #a hash collision, group the cases on their full traces instead
+            variant_index = {}
+            for c in range(num_cases):
+                trace = events[case_starts[c]:case_starts[c] + case_lengths[c]].tobytes()
+                case_variant_codes[c] = variant_index.setdefault(trace, len(variant_index))
+            num_variants = len(variant_index)
+            representatives = np.zeros(num_variants, dtype=np.int64)
+            representatives[case_variant_codes[::-1]] = np.arange(num_cases - 1, -1, -1)
+        counts = np.bincount(case_variant_codes, minlength=num_variants).astype(np.int64)
+
+        variant_order = np.argsort(-counts, kind='stable') if order == True else np.arange(num_variants)
+        #encoded traces of the representatives, with the start and end markers added
+        variant_lengths = case_lengths[representatives[variant_order]]
+        offsets = np.zeros(num_variants + 1, dtype=np.int64)
+        np.cumsum(variant_lengths + 2, out=offsets[1:])
+        buffer = np.full(offsets[-1], BOS_ID, dtype=np.int32)
+        buffer[offsets[1:] - 1] = EOS_ID
+        #position of every event within its variant, the events of variant v start at offsets[v] - 2*v without the markers
+        variant_positions = np.arange(offsets[-1] - 2 * num_variants) - np.repeat(offsets[:-1] - 2 * np.arange(num_variants), variant_lengths)
+        source = np.repeat(case_starts[representatives[variant_order]], variant_lengths) + variant_positions
+        buffer[np.repeat(offsets[:-1] + 1, variant_lengths) + variant_positions] = events[source]
+        variant_rank = np.empty(num_variants, dtype=np.int64)
+        variant_rank[variant_order] = np.arange(num_variants)
+        case_variants = pandas.Series(variant_rank[case_variant_codes], index=case_ids, name='variant')
+        return cls(vocabulary, buffer, offsets, counts[variant_order]), case_variants
+
+    def __len__(self):
+        return len(self.counts)
+
+    def trace_ids(self, i):
+        """
+        Return the encoded trace (including start and end markers) of variant i.
+        """
+        return self.buffer[self.offsets[i]:self.offsets[i + 1]]
+
+    def lengths(self):
+        """
+        Return the length of every encoded trace, start and end markers included.
+        """
+        return np.diff(self.offsets)
+
+    def transitions(self):
+        """
+        Return all transitions (directly-follows pairs) in the log, computed once and cached.
+
+        Returns:
+        - src (numpy.ndarray): The source activity id of every transition.
+        - dst (numpy.ndarray): The target activity id of every transition.
+        - variant_index (numpy.ndarray): The index of the variant every transition belongs to.
+        """
+        if self._transitions is None:
+            #pairs that cross the boundary between two traces (EOS of one, BOS of the next) are not transitions
+            within_trace = np.ones(max(len(self.buffer) - 1, 0), dtype=bool)
+            within_trace[self.offsets[1:-1] - 1] = False
+            src = self.buffer[:-1][within_trace]
+            dst = self.buffer[1:][within_trace]
+            variant_index = np.repeat(np.arange(len(self), dtype=np.int64), self.lengths() - 1)
+            self._transitions = (src, dst, variant_index)
+        return self._transitions
+
+    def subset(self, indices):
+        """
+        Create a new encoded variant log with only the given variants (sharing the vocabulary).
+
+        Parameters:
+        - indices (list): The indices of the variants to keep, in the order they should appear.
+
+        Returns:
+        - EncodedVariantLog: The selected variants.
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        lengths = self.lengths()[indices]
+        offsets = np.zeros(len(indices) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        #positions in the buffer of all selected traces, one segment per variant
+        positions = np.repeat(self.offsets[indices] - offsets[:-1], lengths) + np.arange(offsets[-1])
+        return EncodedVariantLog(self.vocabulary, self.buffer[positions], offsets, self.counts[indices])
+
+    def get_self_ERs(self):
+        """
+        Return, for every variant, its ER on the DFG discovered from only that variant: the normalization term of 
+        'entropic_relevance.get_ER_normalized'. In closed form this is sum_s o_s*log2(o_s) - sum_e m_e*log2(m_e), with m_e how often 
+        edge e occurs in the trace and o_s how often activity s is followed by another activity. Computed once for all variants and cached.
+
+        Returns:
+        - numpy.ndarray: The self ER of every variant (0 for traces without repeated activities).
+        """
+        if self._self_ERs is None:
+            src, dst, variant_index = self.transitions()
+            self_ERs = np.zeros(len(self), dtype=np.float64)
+            if len(src) > 0:
+                #number of occurrences of every (variant, edge) and every (variant, source) pair
+                edge_triples, edge_multiplicity = np.unique(np.stack([variant_index, src, dst]), axis=1, return_counts=True)
+                source_pairs, source_multiplicity = np.unique(np.stack([variant_index, src]), axis=1, return_counts=True)
+                np.add.at(self_ERs, source_pairs[0], source_multiplicity * np.log2(source_multiplicity))
+                np.subtract.at(self_ERs, edge_triples[0], edge_multiplicity * np.log2(edge_multiplicity))
+            self._self_ERs = self_ERs
+        return self._self_ERs
+
+    def variant(self, i):
+        """
+        Return variant i as a tuple of activity labels.
+        """
+        return self.vocabulary.decode(self.trace_ids(i))
+
+    def variants(self):
+        """
+        Return all variants as tuples of activity labels, in order.
+        """
+        return [self.variant(i) for i in range(len(self))]
+
+    def to_variant_log(self):
+        """
+        Convert back to a variant log dictionary.
+
+        Returns:
+        - dict: A dictionary where the keys are the variant tuples and the values their occurrences.
+        """
+        return {self.variant(i): int(self.counts[i]) for i in range(len(self))}
+
+    def to_variant_logs(self, clusters, variants=None):
+        """
+        Convert clusters of variant indices to variant log dictionaries.
+
+        Parameters:
+        - clusters (list): For every cluster, the indices of its variants.
+        - variants (list, optional): The variants as tuples of activities, in order, if already available (e.g. the keys of the variant
+          log dictionary that was encoded). Decoded if None.
+
+        Returns:
+        - list: A list of clusters, where each cluster is a dictionary containing variants and their occurrences.
+        """
+        if variants is None:
+            variants = self.variants()
+        return [{variants[i]: int(self.counts[i]) for i in indices} for indices in clusters]
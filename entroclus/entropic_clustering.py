@@ -1,9 +1,12 @@
 import pandas
+import random
 
 from entroclus import entropic_clustering_variants as entropic_clustering_variants
+from entroclus import restarts as restarts
 from entroclus import utils as utils
+from entroclus.encoding import EncodedVariantLog
 
-def cluster(input, num_clusters, outputshape='log', variant='regular', initialization = '++', opt = 'trace'):
+def cluster(input, num_clusters, outputshape='log', variant='regular', initialization = '++', opt = 'trace', backend = 'dict', n_init = 1, n_jobs = None, random_state = None, refine_passes = 0, refine_time_budget = None):
     """
     Cluster the input data using entropic clustering.
 
@@ -13,49 +16,93 @@ def cluster(input, num_clusters, outputshape='log', variant='regular', initializ
     - num_clusters: int
         The number of clusters to create.
     - outputshape: str, optional
-        The shape of the output. Default is 'log'. Possible values are 'log' and 'variant_log'.
+        The shape of the output. Default is 'log'. Possible values are 'log', 'variant_log', 'labels' and 'views' (event log input only).
+        'labels' gives the cluster of every case in one pass, 'views' lazily yields the log of every cluster as a slice of one copy
+        of the log sorted by cluster, instead of a filtered copy of the log per cluster.
     - variant: str, optional
         The variant of entropic clustering to use. Default is 'regular'. Possible values are 'regular' and 'split'.
     - initialization: str, optional
         The initialization method to use. Default is '++'.
     - opt: str, optional
         The optimization method to use. Default is 'trace'.
+    - backend: str, optional
+        The DFG implementation to use. Default is 'dict'. Possible values are 'dict' and 'encoded' (integer-encoded, array-backed DFGs).
+    - n_init: int, optional
+        The number of independent restarts. Default is 1. If larger than 1, the restarts run on a process pool and the clustering 
+        with the lowest total ER is returned.
+    - n_jobs: int, optional
+        The number of worker processes used for the restarts. Default is None (the number of CPUs).
+    - random_state: int, optional
+        Seed for the random initialization(s), for reproducible results. Default is None.
+    - refine_passes: int, optional
+        The maximal number of refinement passes after the greedy assignment, moving variants between clusters while that lowers the 
+        total ER. Default is 0 (no refinement). Only used for the regular variant.
+    - refine_time_budget: float, optional
+        Time budget for the refinement in seconds. Default is None (no budget).
 
     Returns:
     - list or dict
         If outputshape is 'log', a list of filtered logs for each cluster is returned. 
         If outputshape is 'variant_log', a list of dictionaries (variant logs) is returned.
+        If outputshape is 'labels', a pandas Series with the cluster index of every case, indexed by case id, is returned.
+        If outputshape is 'views', a generator of the log of every cluster is returned.
 
     Raises:
     - ValueError
         If variant is not 'regular' or 'split'.
-        If outputshape is not 'log' or 'variant_log'.
+        If outputshape is not 'log', 'variant_log', 'labels' or 'views'.
         If input is not a pandas DataFrame or a variant log dictionary.
         if input is a variant log dictionary and outputshape is not 'variant_log'
     """
+    #validate the arguments before clustering, which can take long
+    if variant not in ['regular', 'split']:
+        raise ValueError("Variant has to be 'regular' or 'split'.")
+    if outputshape not in ['log', 'variant_log', 'labels', 'views']:
+        raise ValueError("Output has to be 'log', 'variant_log', 'labels' or 'views'.")
+    if isinstance(input,dict) == True and outputshape != 'variant_log':
+        raise ValueError("When input is a variant log, output has to be 'variant_log'.")
+    rng = random.Random(random_state) if random_state is not None else None
     if isinstance(input,pandas.core.frame.DataFrame) == True:
-        if variant == 'regular':
-            clusters_vl = entropic_clustering_variants.entropic_clustering(log=input, num_clusters=num_clusters, initialization=initialization, opt=opt)
-        elif variant == 'split':
-            clusters_vl = entropic_clustering_variants.entropic_clustering_split(log=input, num_clusters=num_clusters, initialization=initialization, opt=opt)
+        if n_init > 1:
+            clusters_vl = restarts.entropic_clustering_n_init(utils.get_variant_log(input), num_clusters, n_init=n_init, n_jobs=n_jobs, random_state=random_state,
+                                                              variant=variant, initialization=initialization, opt=opt, backend=backend,
+                                                              refine_passes=refine_passes, refine_time_budget=refine_time_budget)
+        elif backend == 'encoded':
+            #one read-only encoded log for all stages, the clusters are arrays of variant indices into it
+            encoded_log, case_variants = EncodedVariantLog.from_dataframe(input)
+            print("variant_log obtained")
+            if variant == 'regular':
+                clusters = entropic_clustering_variants.entropic_clustering_encoded(encoded_log, num_clusters, initialization=initialization, opt=opt, rng=rng,
+                                                                                    refine_passes=refine_passes, refine_time_budget=refine_time_budget)
+            else:
+                clusters = entropic_clustering_variants.entropic_clustering_split_encoded(encoded_log, num_clusters, initialization=initialization, opt=opt, rng=rng)
+            if outputshape in ['labels', 'views']:
+                case_labels = utils.get_case_labels_encoded(case_variants, clusters, len(encoded_log))
+                return case_labels if outputshape == 'labels' else utils.get_cluster_views(input, case_labels, len(clusters))
+            clusters_vl = encoded_log.to_variant_logs(clusters)
+        elif variant == 'regular':
+            clusters_vl = entropic_clustering_variants.entropic_clustering(log=input, num_clusters=num_clusters, initialization=initialization, opt=opt, backend=backend, rng=rng,
+                                                                           refine_passes=refine_passes, refine_time_budget=refine_time_budget)
         else:
-            raise ValueError("Variant has to be 'regular' or 'split'.")
+            clusters_vl = entropic_clustering_variants.entropic_clustering_split(log=input, num_clusters=num_clusters, initialization=initialization, opt=opt, backend=backend, rng=rng)
         if outputshape == 'variant_log':
             return clusters_vl
         elif outputshape == 'log':
             return [utils.filter_log_with_vl(input, cluster_vl) for cluster_vl in clusters_vl]
+        elif outputshape == 'labels':
+            return utils.get_case_labels(input, clusters_vl)
         else:
-            raise ValueError("Output has to be 'log' or 'variant_log'.")
+            return utils.get_cluster_views(input, utils.get_case_labels(input, clusters_vl), len(clusters_vl))
     elif isinstance(input,dict) == True:
-        if variant == 'regular':
-            clusters_vl = entropic_clustering_variants.entropic_clustering_VL(variant_log_input=input, num_clusters=num_clusters, initialization=initialization, opt=opt)
-        elif variant == 'split':
-            clusters_vl = entropic_clustering_variants.entropic_clustering_split_VL(variant_log_input=input, num_clusters=num_clusters, initialization=initialization, opt=opt)
+        if n_init > 1:
+            clusters_vl = restarts.entropic_clustering_n_init(input, num_clusters, n_init=n_init, n_jobs=n_jobs, random_state=random_state,
+                                                              variant=variant, initialization=initialization, opt=opt, backend=backend,
+                                                              refine_passes=refine_passes, refine_time_budget=refine_time_budget)
+        elif variant == 'regular':
+            clusters_vl = entropic_clustering_variants.entropic_clustering_VL(variant_log_input=input, num_clusters=num_clusters, initialization=initialization, opt=opt, backend=backend, rng=rng,
+                                                                              refine_passes=refine_passes, refine_time_budget=refine_time_budget)
         else:
-            raise ValueError("Variant has to be 'regular' or 'split'.")
-        if outputshape == 'variant_log':
-            return clusters_vl
-        else:
-            raise ValueError("When input is a variant log, output has to be 'variant_log'.")
+            clusters_vl = entropic_clustering_variants.entropic_clustering_split_VL(variant_log_input=input, num_clusters=num_clusters, initialization=initialization, opt=opt, backend=backend, rng=rng)
+        return clusters_vl
     else:
         raise ValueError("Input not a pandas dataframe (pm4py event log) or variant log dictionary")
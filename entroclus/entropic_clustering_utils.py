@@ -1,8 +1,11 @@
 from entroclus import utils as utils
 from entroclus import entropic_relevance as entropic_relevance
+from entroclus.encoding import EncodedVariantLog
+from entroclus.pairwise_ER import PairwiseER
 
 import random
-import copy
+import time
+import numpy as np
 
 
 def pairwise_ER(trace1, trace2, norm=False):
@@ -26,48 +29,81 @@ def pairwise_ER(trace1, trace2, norm=False):
 
 
 
-def get_distances_to_closest_seed(variant_log, seeds, distance_function="ER"):
+def sample_seed_cumulative(distances, rng=None, is_seed=None):
     """
-    Calculate the distances between each variant in the variant_log and the closest seed in the seeds list.
+    Sample an index with probability proportional to the squared distance, using cumulative weights. 
+    Draws the same index as 'random.choices' would with the same weights and random state.
 
-    Args:
-        variant_log (list): A list of variants.
-        seeds (list): A list of seeds.
-        distance_function (str, optional): The distance function to use. Defaults to "ER".
+    Parameters:
+    - distances (numpy.ndarray): The distance of every candidate (0 for candidates that can not be selected).
+    - rng (random.Random, optional): The random number generator to use. Defaults to None (the random module).
+    - is_seed (numpy.ndarray, optional): Whether every candidate is already a seed. Seeds are never selected, also not when all 
+      distances are 0. Defaults to None (no seeds).
 
     Returns:
-        minimal_distances (dictionary): A disctionary that for each variants contains the minimal distances between it and the closest seed.
+    - int: The selected index.
     """
-    minimal_distances = {}
-    #Compare distance for each variant to each seed (cluster), select minimum, add to a dictionary of distances
-    if distance_function == 'ER':
-        for variant in variant_log:
-            min_distance = min(pairwise_ER(variant, seed, norm=False) for seed in seeds)
-            minimal_distances[variant] = min_distance
-    elif distance_function == 'ER_norm':
-        for variant in variant_log:
-            min_distance = min(pairwise_ER(variant, seed, norm=True) for seed in seeds)
-            minimal_distances[variant] = min_distance
-    return minimal_distances
-
-
-def sample_seed_distance_based(distances_dict):
+    if rng is None:
+        rng = random
+    if is_seed is not None:
+        distances = np.where(is_seed, 0.0, distances)
+    cumulative_weights = np.cumsum(distances**2)
+    total = cumulative_weights[-1]
+    if not total > 0:
+        #all remaining candidates are at distance 0 of a seed: sample uniformly among them
+        candidates = np.isfinite(distances)
+        if is_seed is not None:
+            candidates &= ~is_seed
+        if not candidates.any():
+            raise ValueError("There are no candidates left to sample a seed from.")
+        return int(rng.choice(list(np.flatnonzero(candidates))))
+    return int(np.searchsorted(cumulative_weights, rng.random() * total, side='right'))
+
+def get_seed_indices(num_variants, num_clusters, version="++", encoded_log=None, rng=None):
     """
-    Selects a variant based on the distances provided in the distances_dict.
+    Get the indices of the seeds for clustering, see 'get_seeds'.
 
-    Parameters:
-    - distances_dict (dict): A dictionary where the keys represent the variants and the values represent the distances.
+    Args:
+        num_variants (int): The number of variants to choose from.
+        num_clusters (int): The number of clusters/seeds to generate.
+        version (str, optional): The version of seed selection, "++", "++_norm" or "random". Defaults to "++".
+        encoded_log (EncodedVariantLog, optional): The encoded variant log, needed for the kmeans++ versions.
+        rng (random.Random, optional): The random number generator to use. Defaults to None (the random module).
 
     Returns:
-    - selected_variant: The variant selected based on the distances.
-    """
-    keys_variants = list(distances_dict.keys())
-    weights = [distance**2 for distance in distances_dict.values()]
-    selected_variant = random.choices(keys_variants, weights=weights, k=1)[0]
-    return selected_variant
+        list: The indices of the seeds.
 
+    Raises:
+        ValueError: If there are more clusters than variants.
+    """
+    if num_clusters > num_variants:
+        raise ValueError("The number of clusters (" + str(num_clusters) + ") can not be larger than the number of variants (" + str(num_variants) + ").")
+    if rng is None:
+        rng = random
+    seeds = []
+    if version == "++" or version == "++_norm":
+        norm = version == "++_norm"
+        #same 1e-10 bound as 'pairwise_ER'
+        engine = PairwiseER(encoded_log, min_prob=1e-10)
+        #add first seed randomly
+        seed_index = rng.choice(range(num_variants))
+        seeds.append(seed_index)
+        minimal_distances = engine.get_row(seed_index, norm=norm).copy()
+        is_seed = np.zeros(num_variants, dtype=bool)
+        is_seed[seed_index] = True
+        while len(seeds) < num_clusters:
+            #use the distance to closest seed to sample next seed, seeds themselves are never sampled
+            seed_index = sample_seed_cumulative(minimal_distances, rng, is_seed)
+            seeds.append(seed_index)
+            is_seed[seed_index] = True
+            np.minimum(minimal_distances, engine.get_row(seed_index, norm=norm), out=minimal_distances)
+    elif version == "random":
+        seeds = rng.sample(range(num_variants), num_clusters)
+    else:
+        raise ValueError("verion has to be '++' or '++_norm' or 'random'")
+    return seeds
 
-def get_seeds(variant_log, num_clusters, version= "++"):
+def get_seeds(variant_log, num_clusters, version= "++", encoded_log=None, rng=None):
     """
     Get seeds for clustering based on the variant log.
 
@@ -75,6 +111,8 @@ def get_seeds(variant_log, num_clusters, version= "++"):
         variant_log (dict): A dictionary representing the variant log.
         num_clusters (int): The number of clusters/seeds to generate.
         version (str, optional): The version of seed selection. Defaults to "++".
+        encoded_log (EncodedVariantLog, optional): The variant log encoded in the same order, if already available.
+        rng (random.Random, optional): The random number generator to use. Defaults to None (the random module).
 
     Returns:
         list: A list of seeds for clustering.
@@ -85,34 +123,14 @@ def get_seeds(variant_log, num_clusters, version= "++"):
             - "++": kmeans++ based seed selection.
             - "++_norm": kmeans++ based seed selection with normalized distances.
             - "random": random seed selection.
+        - For the kmeans++ versions, the distance of every variant to its closest seed is kept in an array and only compared 
+          with the newly added seed after every pick, using the pairwise ER rows of a 'PairwiseER' engine.
+        - The seeds are chosen by index with 'get_seed_indices', which draws the same random numbers as choosing from the variants.
     """
-    temp_variant_log = copy.deepcopy(variant_log)
-    seeds = []
-    if version == "++": #kmeans++ based seed selection
-        #add first seed randomly
-        first_seed = random.choice(list(temp_variant_log.keys()))
-        seeds.append(copy.deepcopy(first_seed))
-        del temp_variant_log[first_seed]
-        while len(seeds) < num_clusters:
-            #use inverse of the distance to closest seed to sample next seed
-            new_seed = sample_seed_distance_based(get_distances_to_closest_seed(temp_variant_log, seeds, distance_function="ER"))
-            seeds.append(copy.deepcopy(new_seed))
-            del temp_variant_log[new_seed]
-    elif version == "++_norm":
-        #add first seed randomly
-        first_seed = random.choice(list(temp_variant_log.keys()))
-        seeds.append(copy.deepcopy(first_seed))
-        del temp_variant_log[first_seed]
-        while len(seeds) < num_clusters:
-            #use inverse of the distance to closest seed to sample next seed
-            new_seed = sample_seed_distance_based(get_distances_to_closest_seed(temp_variant_log, seeds, distance_function="ER_norm"))
-            seeds.append(copy.deepcopy(new_seed))
-            del temp_variant_log[new_seed]
-    elif version == "random":
-        seeds = random.sample(list(temp_variant_log.keys()), num_clusters)
-    else:
-        raise ValueError("verion has to be '++' or '++_norm' or 'random'")
-    return seeds
+    keys_variants = list(variant_log.keys())
+    if encoded_log is None and (version == "++" or version == "++_norm"):
+        encoded_log = EncodedVariantLog.from_variant_log(variant_log)
+    return [keys_variants[i] for i in get_seed_indices(len(keys_variants), num_clusters, version=version, encoded_log=encoded_log, rng=rng)]
 
 def intialize_clusters(variant_log, seeds):
     """
@@ -126,9 +144,108 @@ def intialize_clusters(variant_log, seeds):
     - clusters (list): A list of clusters, where each cluster is a list of variants.
     - variant_log (list): The updated variant log after removing the seed variants.
     """
-    vl_temp = copy.deepcopy(variant_log)
+    #a shallow copy is enough, the variants (tuples) and occurrences (ints) are immutable
+    vl_temp = dict(variant_log)
     clusters = []
     for seed in seeds:
-        clusters.append({seed:copy.deepcopy(vl_temp[seed])})
-        del vl_temp[seed]
+        clusters.append({seed:vl_temp.pop(seed)})
     return clusters, vl_temp
+
+def refine_clusters(variant_log, clusters, dfgs_clusters=None, outgoing_clusters=None, max_passes=10, time_budget=None):
+    """
+    Refine a clustering with Lloyd-style local search: repeatedly pass over all variants and move a variant to another cluster when 
+    that lowers the total ER over all clusters (the sum of the ER_sum of every cluster on its own DFG, without the 1e-10 bound of 
+    'entropic_relevance.get_ER'). The change of the total ER follows from the per-source terms of 'entropic_relevance.get_node_ER_terms' 
+    of the source and target cluster only, and a move downdates and updates the two DFGs in place, so a pass costs about as much as 
+    one assignment pass. A cluster is never emptied.
+
+    Parameters:
+    - variant_log (dict): The clustered variant log, giving the order in which the variants are visited.
+    - clusters (list): A list of variant log dictionaries representing clusters. Updated in place.
+    - dfgs_clusters (list, optional): The (activity_counts, edge_counts) of every cluster, updated in place. Discovered if None.
+    - outgoing_clusters (list, optional): The outgoing totals of every cluster dfg, updated in place. Computed if None.
+    - max_passes (int, optional): The maximal number of passes over the variants. Defaults to 10.
+    - time_budget (float, optional): Stop after this many seconds, even within a pass. Defaults to None (no budget).
+
+    Returns:
+    - list: The refined list of clusters.
+    """
+    start = time.perf_counter()
+    if dfgs_clusters is None:
+        dfgs_clusters = [utils.get_dfg(clus) for clus in clusters]
+    if outgoing_clusters is None:
+        outgoing_clusters = [utils.get_outgoing_counts(dfg[1]) for dfg in dfgs_clusters]
+    cluster_of = {variant: k for k, clus in enumerate(clusters) for variant in clus}
+    for refine_pass in range(max_passes):
+        moves = 0
+        for variant, occurrence in variant_log.items():
+            current = cluster_of[variant]
+            if len(clusters[current]) == 1:
+                continue
+            variant_multisets = utils.get_edge_multiset(variant)
+            removal_delta = sum(entropic_relevance.get_node_ER_terms_delta(dfgs_clusters[current][1], outgoing_clusters[current], variant_multisets, -occurrence).values())
+            best_delta = -1e-9 #only strict improvements, so the search can not cycle on rounding errors
+            best_cluster_index = current
+            for k in range(len(clusters)):
+                if k == current:
+                    continue
+                delta = removal_delta + sum(entropic_relevance.get_node_ER_terms_delta(dfgs_clusters[k][1], outgoing_clusters[k], variant_multisets, occurrence).values())
+                if delta < best_delta:
+                    best_delta = delta
+                    best_cluster_index = k
+            if best_cluster_index != current:
+                del clusters[current][variant]
+                clusters[best_cluster_index][variant] = occurrence
+                cluster_of[variant] = best_cluster_index
+                dfgs_clusters[current] = utils.downdate_dfg(dfgs_clusters[current][0], dfgs_clusters[current][1], variant, occurrence, outgoing_clusters[current])
+                dfgs_clusters[best_cluster_index] = utils.update_dfg(dfgs_clusters[best_cluster_index][0], dfgs_clusters[best_cluster_index][1], variant, occurrence, outgoing_clusters[best_cluster_index])
+                moves += 1
+            if time_budget is not None and time.perf_counter() - start > time_budget:
+                break
+        print("refinement pass", refine_pass + 1, "moved", moves, "variants")
+        if moves == 0 or (time_budget is not None and time.perf_counter() - start > time_budget):
+            break
+    return clusters
+
+def refine_clusters_encoded(encoded_log, labels, dfgs_clusters, max_passes=10, time_budget=None):
+    """
+    Refine a clustering of an encoded variant log with Lloyd-style local search, the encoded counterpart of 'refine_clusters'. The change 
+    of the total ER for moving a variant to every other cluster is computed at once by 'StackedDFGs.get_move_deltas', and a move removes 
+    the trace from one cluster and adds it to another with 'StackedDFGs.update'.
+
+    Parameters:
+    - encoded_log (EncodedVariantLog): The encoded variant log.
+    - labels (numpy.ndarray): The cluster index of every variant of the encoded log. Updated in place.
+    - dfgs_clusters (StackedDFGs): The DFGs of all clusters. Updated in place.
+    - max_passes (int, optional): The maximal number of passes over the variants. Defaults to 10.
+    - time_budget (float, optional): Stop after this many seconds, even within a pass. Defaults to None (no budget).
+
+    Returns:
+    - numpy.ndarray: The refined cluster index of every variant.
+    """
+    start = time.perf_counter()
+    sizes = np.bincount(labels, minlength=dfgs_clusters.num_clusters)
+    for refine_pass in range(max_passes):
+        moves = 0
+        for i in range(len(encoded_log)):
+            current = int(labels[i])
+            if sizes[current] == 1:
+                continue
+            trace_ids = encoded_log.trace_ids(i)
+            occurrence = int(encoded_log.counts[i])
+            deltas = dfgs_clusters.get_move_deltas(trace_ids, occurrence, current)
+            best_cluster_index = int(np.argmin(deltas))
+            #only strict improvements, so the search can not cycle on rounding errors
+            if deltas[best_cluster_index] < -1e-9:
+                dfgs_clusters.update(current, trace_ids, -occurrence)
+                dfgs_clusters.update(best_cluster_index, trace_ids, occurrence)
+                labels[i] = best_cluster_index
+                sizes[current] -= 1
+                sizes[best_cluster_index] += 1
+                moves += 1
+            if time_budget is not None and time.perf_counter() - start > time_budget:
+                break
+        print("refinement pass", refine_pass + 1, "moved", moves, "variants")
+        if moves == 0 or (time_budget is not None and time.perf_counter() - start > time_budget):
+            break
+    return labels
@@ -1,7 +1,14 @@
 from entroclus import utils as utils
 from entroclus import entropic_relevance as entropic_relevance
 from entroclus import entropic_clustering_utils as entropic_clustering_utils
-import copy
+from entroclus.encoding import EncodedVariantLog
+from entroclus.encoded_dfg import EncodedDFG, StackedDFGs
+import heapq
+import math
+import numpy as np
+
+#margin (in log2) on the 1e-10 bound, so rounding in the bounds on the variant probabilities can not hide a variant at the bound
+BOUND_MARGIN = 1e-9
 
 def add_and_remove_variant(clusters, variant_log, variant, occurrence, cluster_index):
     """
@@ -22,7 +29,129 @@ def add_and_remove_variant(clusters, variant_log, variant, occurrence, cluster_i
     del variant_log[variant]
     return clusters, variant_log
 
-def entropic_clustering_VL(variant_log_input, num_clusters, initialization = '++', opt = 'trace'):
+def get_best_cluster_pruned(dfgs_clusters, outgoing_clusters, variant, occurrence, min_prob=1e-10):
+    """
+    Find the cluster for which inserting a variant gives the lowest ER of the variant itself (opt='trace'), with branch-and-bound:
+    the clusters are tried in order of the probability of the first step of the variant (the most promising first), and the evaluation
+    of a cluster is abandoned as soon as its running probability shows it can not beat the best cluster so far. The result is the same 
+    as evaluating every cluster with 'entropic_relevance.get_ER_with_insertion' and taking the first cluster with the lowest ER.
+
+    Parameters:
+    - dfgs_clusters (list): The (activity_counts, edge_counts) of every cluster.
+    - outgoing_clusters (list): The outgoing totals of every cluster dfg.
+    - variant (tuple): The variant to insert.
+    - occurrence (int): The occurrence of the variant.
+    - min_prob (float, optional): Lower bound on the probability, as used by 'entropic_relevance.get_ER'. Defaults to 1e-10.
+
+    Returns:
+    - best_cluster_index (int): The index of the best cluster.
+    - best_ER (float): The ER of the variant in the best cluster.
+    - steps (int): The number of steps (transitions) that were evaluated over all clusters.
+    - total_steps (int): The number of steps a full evaluation of all clusters takes.
+    """
+    variant_multisets = utils.get_edge_multiset(variant)
+    first_edge = ('BOS', variant[0]) if len(variant) > 0 else ('BOS', 'EOS')
+    def first_step_probability(k):
+        outgoing_edges = outgoing_clusters[k].get('BOS', 0) + occurrence * variant_multisets[1]['BOS']
+        return (dfgs_clusters[k][1].get(first_edge, 0) + occurrence * variant_multisets[0][first_edge]) / outgoing_edges
+    order = sorted(range(len(dfgs_clusters)), key=lambda k: -first_step_probability(k))
+    best_ER = 99999.0
+    best_cluster_index = len(dfgs_clusters)
+    best_prob = 0.0
+    steps = 0
+    for k in order:
+        #a cluster with a higher index only wins with a strictly higher probability, a lower index also wins a tie
+        if k > best_cluster_index:
+            min_probability = math.nextafter(best_prob, math.inf)
+        elif best_prob > min_prob:
+            min_probability = best_prob
+        else:
+            min_probability = 0.0
+        prob, cluster_steps = utils.get_probability_with_insertion_bounded(dfgs_clusters[k][1], outgoing_clusters[k], variant, variant_multisets, occurrence, min_probability)
+        steps += cluster_steps
+        if prob < min_probability:
+            continue
+        prob = max(prob, min_prob)
+        curr_ER = -math.log(prob, 2)
+        if curr_ER < best_ER or (curr_ER == best_ER and k < best_cluster_index):
+            best_ER = curr_ER
+            best_cluster_index = k
+            best_prob = prob
+    return best_cluster_index, best_ER, steps, len(dfgs_clusters) * (len(variant) + 1)
+
+def log2_or_inf(prob):
+    """
+    Return log2(prob), or -inf for a probability of 0.
+    """
+    return math.log2(prob) if prob > 0 else -math.inf
+
+def get_source_multiplicities(variant_log):
+    """
+    Get, for every source activity, the highest number of times it is followed by another activity within one variant of a variant log.
+
+    Parameters:
+    - variant_log (dict): The variant log.
+
+    Returns:
+    - dict: The highest multiplicity of every source activity (with 'BOS').
+    """
+    source_multiplicities = {}
+    for variant in variant_log:
+        for activity, multiplicity in utils.get_edge_multiset(variant)[1].items():
+            source_multiplicities[activity] = max(source_multiplicities.get(activity, 0), multiplicity)
+    return source_multiplicities
+
+def get_insertion_log_prob_drop(outgoing_counts, source_multiplicities, variant_multisets, occurrence):
+    """
+    Get an upper bound on how much the log2 probability of any variant of a cluster can drop when a variant is added to the cluster's
+    dfg. Adding the variant never lowers an edge count, and raises the outgoing total of each of its source activities s from o to o + d,
+    so every step from s of another variant loses at most log2((o + d)/o), at most as often as s is a source in that variant.
+
+    Parameters:
+    - outgoing_counts (dict): The outgoing totals of the cluster dfg.
+    - source_multiplicities (dict): The highest multiplicity of every source activity in a variant of the cluster (see 'get_source_multiplicities').
+    - variant_multisets (tuple): The edge and outgoing multisets of the added variant, as returned by 'utils.get_edge_multiset'.
+    - occurrence (int): The occurrence of the added variant.
+
+    Returns:
+    - float: The upper bound on the drop.
+    """
+    drop = 0.0
+    for activity, multiplicity in variant_multisets[1].items():
+        count = outgoing_counts.get(activity, 0)
+        if count > 0 and activity in source_multiplicities:
+            drop += source_multiplicities[activity] * math.log2((count + occurrence*multiplicity) / count)
+    return drop
+
+def get_cluster_ER_with_insertion(cluster, edge_counts, outgoing_counts, variant, variant_multisets, occurrence):
+    """
+    Calculate the ER of a cluster after adding a variant to it, with the 1e-10 bound per trace of 'entropic_relevance.get_ER', without
+    copying the cluster or its dfg. Also returns the lowest log2 probability of a variant of the cluster after the insertion.
+
+    Parameters:
+    - cluster (dict): The variant log of the cluster.
+    - edge_counts (dict): The edge counts of the cluster dfg.
+    - outgoing_counts (dict): The outgoing totals of the cluster dfg.
+    - variant (tuple): The added variant.
+    - variant_multisets (tuple): The edge and outgoing multisets of the added variant, as returned by 'utils.get_edge_multiset'.
+    - occurrence (int): The occurrence of the added variant.
+
+    Returns:
+    - ER (float): The ER of the cluster with the variant.
+    - min_log_prob (float): The lowest log2 probability of a variant of the cluster with the variant.
+    """
+    ER_sum = 0.0
+    total_occurences = 0
+    min_log_prob = math.inf
+    for v, o in list(cluster.items()) + [(variant, occurrence)]:
+        prob = utils.get_probability_with_insertion(edge_counts, outgoing_counts, v, variant_multisets, occurrence)
+        min_log_prob = min(min_log_prob, log2_or_inf(prob))
+        prob = max(prob, 1e-10)
+        ER_sum += (-math.log(prob, 2))*o
+        total_occurences += o
+    return ER_sum/total_occurences, min_log_prob
+
+def entropic_clustering_VL(variant_log_input, num_clusters, initialization = '++', opt = 'trace', backend = 'dict', rng = None, refine_passes = 0, refine_time_budget = None):
     """
     Perform entropic clustering on a given variant log.
 
@@ -30,7 +159,16 @@ def entropic_clustering_VL(variant_log_input, num_clusters, initialization = '++
     - variant log (dictionary): The variant log to be clustered.
     - num_clusters (int): The number of clusters to create.
     - initialization (str, optional): The initialization method for selecting initial seeds. Defaults to '++'.
-    - opt (str, optional): The optimization method for calculating ER. Can be 'full_cluster' or 'trace'. Defaults to 'trace'.
+    - opt (str, optional): The optimization method for calculating ER. Can be 'full_cluster', 'full_cluster_exact' or 'trace'. Defaults to 'trace'. 
+      For 'full_cluster', the cluster ER (with the 1e-10 bound per trace of 'get_ER') is maintained incrementally, as long as no variant 
+      of the cluster can be at the bound; other clusters are scored with the bound. For 'full_cluster_exact', the cluster ER is always 
+      maintained incrementally and computed exactly in log space, without the bound.
+    - backend (str, optional): The DFG implementation to use. Can be 'dict' (dictionaries from 'utils') or 'encoded' (integer-encoded, array-backed 
+      DFGs from 'encoded_dfg'). Defaults to 'dict'.
+    - rng (random.Random, optional): The random number generator used for the initialization. Defaults to None (the random module).
+    - refine_passes (int, optional): The maximal number of refinement passes after the greedy assignment, in which variants are moved 
+      between clusters when that lowers the total ER (see 'entropic_clustering_utils.refine_clusters'). Defaults to 0 (no refinement).
+    - refine_time_budget (float, optional): Time budget for the refinement in seconds. Defaults to None (no budget).
 
     Returns:
     - list: A list of clusters, where each cluster is a dictionary containing variants and their occurrences.
@@ -45,39 +183,151 @@ def entropic_clustering_VL(variant_log_input, num_clusters, initialization = '++
 
     Finally, the function returns the list of clusters.
     """
-    variant_log = copy.deepcopy(variant_log_input)
-    seeds = entropic_clustering_utils.get_seeds(variant_log, num_clusters, version=initialization)
+    if backend == 'encoded':
+        return entropic_clustering_VL_encoded(variant_log_input, num_clusters, initialization=initialization, opt=opt, rng=rng, 
+                                              refine_passes=refine_passes, refine_time_budget=refine_time_budget)
+    elif backend != 'dict':
+        raise ValueError("backend has to be 'dict' or 'encoded'")
+    seeds = entropic_clustering_utils.get_seeds(variant_log_input, num_clusters, version=initialization, rng=rng)
     print("seeds obtained")
-    clusters, variant_log = entropic_clustering_utils.intialize_clusters(variant_log, seeds)
-    variant_log_dum = copy.deepcopy(variant_log) #needed because within the loop, the size of the dictionary can not change
+    #the variants that are not a seed, in a shallow copy: the input is never changed, so it does not have to be copied
+    clusters, variant_log = entropic_clustering_utils.intialize_clusters(variant_log_input, seeds)
     dfgs_clusters = [utils.get_dfg(clus) for clus in clusters]
-    for variant, occurrence in variant_log_dum.items():
+    #keep the outgoing totals of every cluster dfg, so probabilities can be computed without passing over the alphabet
+    outgoing_clusters = [utils.get_outgoing_counts(dfg[1]) for dfg in dfgs_clusters]
+    if opt not in ('full_cluster', 'full_cluster_exact', 'trace'):
+        raise ValueError("opt has to be 'full_cluster', 'full_cluster_exact' or 'trace'")
+    if opt in ('full_cluster', 'full_cluster_exact'):
+        #keep the total ER of every cluster, split per source activity, so the ER after adding a variant follows from the terms it changes
+        node_terms_clusters = [entropic_relevance.get_node_ER_terms(dfgs_clusters[k][1], outgoing_clusters[k]) for k in range(len(clusters))]
+        ER_sums_clusters = [sum(node_terms.values()) for node_terms in node_terms_clusters]
+        occurrences_clusters = [sum(clus.values()) for clus in clusters]
+    if opt == 'full_cluster':
+        #the exact ER equals the bounded one while every variant has a probability of at least 1e-10: keep a lower bound on the log2
+        #probability of every variant of each cluster, and the highest multiplicity of every source activity in a variant of each cluster
+        min_log_prob = math.log2(1e-10) + BOUND_MARGIN
+        min_log_probs_clusters = [min(log2_or_inf(utils.get_probability(dfgs_clusters[k][0], dfgs_clusters[k][1], v, outgoing_clusters[k])) for v in clusters[k]) 
+                                  for k in range(len(clusters))]
+        source_multiplicities_clusters = [get_source_multiplicities(clus) for clus in clusters]
+    steps, total_steps = 0, 0
+    for variant, occurrence in variant_log.items():
         best_ER = 99999.0
         best_cluster_index = 0
-        for k in range(0, len(clusters)):
-            #add variant to each cluster and calculate ER
-            curr_clus = copy.deepcopy(clusters[k])
-            curr_clus.update({variant:occurrence})
-            #print(copy.deepcopy(dfgs_clusters[k]))
-            curr_activity_counts, curr_edge_counts = copy.deepcopy(dfgs_clusters[k])[0], copy.deepcopy(dfgs_clusters[k])[1]
-            curr_activity_counts, curr_edge_counts = utils.update_dfg(curr_activity_counts, curr_edge_counts, variant, occurrence)
-            if opt == 'full_cluster':
-                curr_ER = entropic_relevance.get_ER(curr_clus, curr_activity_counts, curr_edge_counts)
-            elif opt == 'trace':
-                tracelog = {variant: occurrence}
-                curr_ER = entropic_relevance.get_ER(tracelog, curr_activity_counts, curr_edge_counts)
-            else:
-                raise ValueError("opt has to be 'full_cluster' or 'trace'")
-            if curr_ER < best_ER:
-                best_ER = curr_ER
-                best_cluster_index = k
+        if opt == 'trace':
+            #ER of the variant as if it was added to each cluster (without copying the cluster or its dfg), abandoning hopeless clusters early
+            best_cluster_index, best_ER, variant_steps, variant_total_steps = get_best_cluster_pruned(dfgs_clusters, outgoing_clusters, variant, occurrence)
+            steps += variant_steps
+            total_steps += variant_total_steps
+        else:
+            variant_multisets = utils.get_edge_multiset(variant)
+            deltas_clusters = []
+            new_min_log_probs = []
+            for k in range(0, len(clusters)):
+                #calculate the cluster ER as if the variant was added to each cluster (without copying the cluster or its dfg)
+                deltas = entropic_relevance.get_node_ER_terms_delta(dfgs_clusters[k][1], outgoing_clusters[k], variant_multisets, occurrence)
+                deltas_clusters.append(deltas)
+                curr_ER = (ER_sums_clusters[k] + sum(deltas.values())) / (occurrences_clusters[k] + occurrence)
+                if opt == 'full_cluster':
+                    prob = utils.get_probability_with_insertion(dfgs_clusters[k][1], outgoing_clusters[k], variant, variant_multisets, occurrence)
+                    new_min_log_prob = min(min_log_probs_clusters[k] - get_insertion_log_prob_drop(outgoing_clusters[k], source_multiplicities_clusters[k], variant_multisets, occurrence),
+                                           log2_or_inf(prob))
+                    if new_min_log_prob < min_log_prob:
+                        #a variant may be at the bound, score the cluster like 'get_ER'
+                        curr_ER, new_min_log_prob = get_cluster_ER_with_insertion(clusters[k], dfgs_clusters[k][1], outgoing_clusters[k], variant, variant_multisets, occurrence)
+                    new_min_log_probs.append(new_min_log_prob)
+                if curr_ER < best_ER:
+                    best_ER = curr_ER
+                    best_cluster_index = k
         #actually add variant to cluster with optimal ER (lowest)
-        clusters, variant_log = add_and_remove_variant(clusters, variant_log, variant, occurrence, best_cluster_index)
+        clusters[best_cluster_index][variant] = occurrence
+        if opt == 'full_cluster':
+            min_log_probs_clusters[best_cluster_index] = new_min_log_probs[best_cluster_index]
+            source_multiplicities = source_multiplicities_clusters[best_cluster_index]
+            for activity, multiplicity in variant_multisets[1].items():
+                source_multiplicities[activity] = max(source_multiplicities.get(activity, 0), multiplicity)
+        if opt in ('full_cluster', 'full_cluster_exact'):
+            for activity, delta in deltas_clusters[best_cluster_index].items():
+                node_terms_clusters[best_cluster_index][activity] = node_terms_clusters[best_cluster_index].get(activity, 0.0) + delta
+            ER_sums_clusters[best_cluster_index] += sum(deltas_clusters[best_cluster_index].values())
+            occurrences_clusters[best_cluster_index] += occurrence
         #update dfg of cluster
-        dfgs_clusters[best_cluster_index] = utils.update_dfg(dfgs_clusters[best_cluster_index][0], dfgs_clusters[best_cluster_index][1], variant, occurrence)
+        dfgs_clusters[best_cluster_index] = utils.update_dfg(dfgs_clusters[best_cluster_index][0], dfgs_clusters[best_cluster_index][1], variant, occurrence, outgoing_clusters[best_cluster_index])
+    if total_steps > 0:
+        print("branch-and-bound evaluated", steps, "of", total_steps, "steps (" + str(round(100 * (1 - steps / total_steps), 1)) + "% pruned)")
+    if refine_passes > 0:
+        clusters = entropic_clustering_utils.refine_clusters(variant_log_input, clusters, dfgs_clusters, outgoing_clusters, max_passes=refine_passes, time_budget=refine_time_budget)
     return clusters
 
-def entropic_clustering(log, num_clusters, initialization = '++', opt = 'trace'):
+def entropic_clustering_encoded(encoded_log, num_clusters, initialization = '++', opt = 'trace', rng = None, refine_passes = 0, refine_time_budget = None):
+    """
+    Perform entropic clustering on an encoded variant log, using array-backed DFGs.
+    Same algorithm as 'entropic_clustering_VL', but activities are encoded once for the whole log and the DFGs of all clusters are 
+    stacked in one 'StackedDFGs' structure. The ER after inserting a variant is computed for all clusters at once and the argmin is 
+    taken, instead of looping over the clusters. For opt='full_cluster' and 'full_cluster_exact', every cluster keeps its total ER split 
+    per source activity, so the new cluster ER follows exactly from the terms of the activities in the variant (see 'StackedDFGs').
+    The encoded log is only read: clusters are arrays of variant indices into it, so no variant log is copied.
+
+    Parameters:
+    - encoded_log (EncodedVariantLog): The encoded variant log to be clustered.
+    - num_clusters (int): The number of clusters to create.
+    - initialization (str, optional): The initialization method for selecting initial seeds. Defaults to '++'.
+    - opt (str, optional): The optimization method for calculating ER. Can be 'full_cluster', 'full_cluster_exact' or 'trace'. Defaults to 'trace'.
+    - rng (random.Random, optional): The random number generator used for the initialization. Defaults to None (the random module).
+    - refine_passes (int, optional): The maximal number of refinement passes (see 'entropic_clustering_utils.refine_clusters_encoded'). Defaults to 0.
+    - refine_time_budget (float, optional): Time budget for the refinement in seconds. Defaults to None (no budget).
+
+    Returns:
+    - list: For every cluster, the indices of its variants in the encoded log (seed first, then in the order they were added, or in
+      the order of the log after refinement).
+    """
+    if opt not in ('full_cluster', 'full_cluster_exact', 'trace'):
+        raise ValueError("opt has to be 'full_cluster', 'full_cluster_exact' or 'trace'")
+    seeds = entropic_clustering_utils.get_seed_indices(len(encoded_log), num_clusters, version=initialization, encoded_log=encoded_log, rng=rng)
+    print("seeds obtained")
+    members = [[seed] for seed in seeds]
+    dfgs_clusters = StackedDFGs.from_encoded_log(encoded_log, members)
+    is_seed = np.zeros(len(encoded_log), dtype=bool)
+    is_seed[seeds] = True
+    for i in np.flatnonzero(~is_seed).tolist():
+        trace_ids = encoded_log.trace_ids(i)
+        occurrence = int(encoded_log.counts[i])
+        #ER after adding the variant to each cluster, for all clusters at once (with the same 1e-10 bound as 'get_ER')
+        best_cluster_index, _ = dfgs_clusters.assign(trace_ids, occurrence, min_prob=1e-10, opt=opt, get_cluster_log=lambda k: encoded_log.subset(members[k]))
+        #actually add variant to cluster with optimal ER (lowest)
+        members[best_cluster_index].append(i)
+        #update dfg of cluster
+        dfgs_clusters.update(best_cluster_index, trace_ids, occurrence)
+    if refine_passes > 0:
+        labels = np.zeros(len(encoded_log), dtype=np.int64)
+        for k, indices in enumerate(members):
+            labels[indices] = k
+        labels = entropic_clustering_utils.refine_clusters_encoded(encoded_log, labels, dfgs_clusters, max_passes=refine_passes, time_budget=refine_time_budget)
+        return [np.flatnonzero(labels == k) for k in range(num_clusters)]
+    return [np.array(indices, dtype=np.int64) for indices in members]
+
+def entropic_clustering_VL_encoded(variant_log_input, num_clusters, initialization = '++', opt = 'trace', rng = None, refine_passes = 0, refine_time_budget = None):
+    """
+    Perform entropic clustering on a given variant log, using integer-encoded, array-backed DFGs: the variant log is encoded once and
+    clustered with 'entropic_clustering_encoded'.
+
+    Parameters:
+    - variant log (dictionary): The variant log to be clustered.
+    - num_clusters (int): The number of clusters to create.
+    - initialization (str, optional): The initialization method for selecting initial seeds. Defaults to '++'.
+    - opt (str, optional): The optimization method for calculating ER. Can be 'full_cluster', 'full_cluster_exact' or 'trace'. Defaults to 'trace'.
+    - rng (random.Random, optional): The random number generator used for the initialization. Defaults to None (the random module).
+    - refine_passes (int, optional): The maximal number of refinement passes (see 'entropic_clustering_utils.refine_clusters_encoded'). Defaults to 0.
+    - refine_time_budget (float, optional): Time budget for the refinement in seconds. Defaults to None (no budget).
+
+    Returns:
+    - list: A list of clusters, where each cluster is a dictionary containing variants and their occurrences.
+    """
+    encoded_log = EncodedVariantLog.from_variant_log(variant_log_input)
+    members = entropic_clustering_encoded(encoded_log, num_clusters, initialization=initialization, opt=opt, rng=rng,
+                                          refine_passes=refine_passes, refine_time_budget=refine_time_budget)
+    return encoded_log.to_variant_logs(members, variants=list(variant_log_input))
+
+def entropic_clustering(log, num_clusters, initialization = '++', opt = 'trace', backend = 'dict', rng = None, refine_passes = 0, refine_time_budget = None):
     """
     Perform entropic clustering on a given event log.
 
@@ -85,7 +335,11 @@ def entropic_clustering(log, num_clusters, initialization = '++', opt = 'trace')
     - log (pm4py.objects.log.obj.EventLog): The event log to be clustered.
     - num_clusters (int): The number of clusters to create.
     - initialization (str, optional): The initialization method for selecting initial seeds. Defaults to '++'.
-    - opt (str, optional): The optimization method for calculating ER. Can be 'full_cluster' or 'trace'. Defaults to 'trace'.
+    - opt (str, optional): The optimization method for calculating ER. Can be 'full_cluster', 'full_cluster_exact' or 'trace'. Defaults to 'trace'.
+    - backend (str, optional): The DFG implementation to use, 'dict' or 'encoded'. Defaults to 'dict'.
+    - rng (random.Random, optional): The random number generator used for the initialization. Defaults to None (the random module).
+    - refine_passes (int, optional): The maximal number of refinement passes, see 'entropic_clustering_VL'. Defaults to 0 (no refinement).
+    - refine_time_budget (float, optional): Time budget for the refinement in seconds. Defaults to None (no budget).
 
     Returns:
     - list: A list of clusters, where each cluster is a dictionary containing variants and their occurrences.
@@ -96,27 +350,97 @@ def entropic_clustering(log, num_clusters, initialization = '++', opt = 'trace')
     """
     variant_log_input = utils.get_variant_log(log)
     print("variant_log obtained")
-    return entropic_clustering_VL(variant_log_input, num_clusters, initialization = initialization, opt = opt)
+    return entropic_clustering_VL(variant_log_input, num_clusters, initialization = initialization, opt = opt, backend = backend, rng = rng, 
+                                  refine_passes = refine_passes, refine_time_budget = refine_time_budget)
+
+def get_cluster_ER(cluster):
+    """
+    Get the Entropic Relevance (ER) of a cluster on the DFG discovered from that cluster, the score used to select the cluster to split.
+
+    Parameters:
+    - cluster (dict): A variant log dictionary representing a cluster.
 
-def get_worst_cluster_and_remove(clusters):
+    Returns:
+    - float: The ER of the cluster.
+    """
+    c_activity_counts, c_edge_counts = utils.get_dfg(cluster)
+    return entropic_relevance.get_ER(cluster, c_activity_counts, c_edge_counts)
+
+def split_clusters(clusters, num_clusters, initialization = '++', opt = 'trace', backend = 'dict', rng = None):
     """
-    Get the worst cluster from a list of clusters based on their Entropic Relevance (ER) values and remove it from the list.
+    Keep splitting the cluster with the highest ER in two until there are num_clusters clusters.
+    The ER of every cluster is computed once and kept in a heap, so after a split only the two new clusters are scored, instead of 
+    rediscovering the DFG of every cluster in every iteration. Ties are broken in favour of the oldest cluster, the one that comes first
+    in the list of clusters.
 
     Parameters:
-    - clusters (list): A list of variant log dictionaries representing clusters.
+    - clusters (list): The initial list of clusters (variant log dictionaries).
+    - num_clusters (int): The number of clusters to create.
+    - initialization (str, optional): The initialization method for selecting initial seeds. Defaults to '++'.
+    - opt (str, optional): The optimization method for calculating ER. Can be 'full_cluster', 'full_cluster_exact' or 'trace'. Defaults to 'trace'.
+    - backend (str, optional): The DFG implementation to use, 'dict' or 'encoded'. Defaults to 'dict'.
+    - rng (random.Random, optional): The random number generator used for the initialization. Defaults to None (the random module).
 
     Returns:
-    - tuple: A tuple containing the worst cluster and the updated list of clusters.
+    - list: A list of clusters, where each cluster is a dictionary containing variants and their occurrences.
     """
-    current_highest = 0.0 #ER needs to be minimized
-    for c in clusters: #c is a variant log dictionaries, clusters a list of these
-        c_activity_counts, c_edge_counts = utils.get_dfg(c)
-        c_ER = entropic_relevance.get_ER(c, c_activity_counts, c_edge_counts)
-        if c_ER > current_highest:
-            current_highest = c_ER
-            worst = c
-    clusters.remove(worst)
-    return worst, clusters
+    #heap entries are (-ER, age, cluster): the cluster with the highest ER is on top, the age keeps the order of the cluster list
+    heap = [(-get_cluster_ER(c), age, c) for age, c in enumerate(clusters)]
+    heapq.heapify(heap)
+    age = len(heap)
+    while len(heap) < num_clusters:
+        _, _, to_be_split_cluster = heapq.heappop(heap)
+        for c in entropic_clustering_VL(to_be_split_cluster, 2, initialization, opt, backend, rng):
+            heapq.heappush(heap, (-get_cluster_ER(c), age, c))
+            age += 1
+    return [c for _, _, c in sorted(heap, key=lambda entry: entry[1])]
+
+def get_cluster_ER_encoded(encoded_log, indices, chunk_size=1024):
+    """
+    Get the Entropic Relevance (ER) of a cluster of an encoded variant log on the DFG discovered from that cluster, like 'get_cluster_ER'.
+    The variants are scored in chunks, so the memory use does not grow with the size of the cluster.
+
+    Parameters:
+    - encoded_log (EncodedVariantLog): The encoded variant log.
+    - indices (numpy.ndarray): The indices of the variants of the cluster.
+    - chunk_size (int, optional): The number of variants scored at once. Defaults to 1024.
+
+    Returns:
+    - float: The ER of the cluster.
+    """
+    dfg = EncodedDFG.from_encoded_log(encoded_log, indices)
+    ER_sum = 0.0
+    for start in range(0, len(indices), chunk_size):
+        ER_sum += entropic_relevance.get_ER_batch(encoded_log.subset(indices[start:start + chunk_size]), dfg, min_prob=1e-10)[2]
+    return ER_sum/float(encoded_log.counts[indices].sum())
+
+def split_clusters_encoded(encoded_log, clusters, num_clusters, initialization = '++', opt = 'trace', rng = None):
+    """
+    Keep splitting the cluster with the highest ER in two until there are num_clusters clusters, like 'split_clusters', for clusters
+    that are arrays of variant indices into one encoded variant log. Only the cluster that is split is gathered into a compact encoded
+    log of its own, which is clustered with 'entropic_clustering_encoded'.
+
+    Parameters:
+    - encoded_log (EncodedVariantLog): The encoded variant log.
+    - clusters (list): The initial clusters, as arrays of variant indices.
+    - num_clusters (int): The number of clusters to create.
+    - initialization (str, optional): The initialization method for selecting initial seeds. Defaults to '++'.
+    - opt (str, optional): The optimization method for calculating ER. Can be 'full_cluster', 'full_cluster_exact' or 'trace'. Defaults to 'trace'.
+    - rng (random.Random, optional): The random number generator used for the initialization. Defaults to None (the random module).
+
+    Returns:
+    - list: The clusters, as arrays of variant indices.
+    """
+    heap = [(-get_cluster_ER_encoded(encoded_log, c), age, c) for age, c in enumerate(clusters)]
+    heapq.heapify(heap)
+    age = len(heap)
+    while len(heap) < num_clusters:
+        _, _, to_be_split_cluster = heapq.heappop(heap)
+        for c in entropic_clustering_encoded(encoded_log.subset(to_be_split_cluster), 2, initialization, opt, rng):
+            c = to_be_split_cluster[c]
+            heapq.heappush(heap, (-get_cluster_ER_encoded(encoded_log, c), age, c))
+            age += 1
+    return [c for _, _, c in sorted(heap, key=lambda entry: entry[1])]
 
 def add_clusters(clusters, new_clusters):
     """
@@ -134,7 +458,24 @@ def add_clusters(clusters, new_clusters):
         clusters_updated.append(c)
     return clusters_updated
 
-def entropic_clustering_split_VL(variant_log_input, num_clusters, initialization = '++', opt = 'trace'):
+def entropic_clustering_split_encoded(encoded_log, num_clusters, initialization = '++', opt = 'trace', rng = None):
+    """
+    Hierarchical variant on an encoded variant log: all splits work on arrays of variant indices into the same encoded log.
+
+    Parameters:
+    - encoded_log (EncodedVariantLog): The encoded variant log to be clustered.
+    - num_clusters (int): The number of clusters to create.
+    - initialization (str, optional): The initialization method for selecting initial seeds. Defaults to '++'.
+    - opt (str, optional): The optimization method for calculating ER. Can be 'full_cluster', 'full_cluster_exact' or 'trace'. Defaults to 'trace'.
+    - rng (random.Random, optional): The random number generator used for the initialization. Defaults to None (the random module).
+
+    Returns:
+    - list: For every cluster, the indices of its variants in the encoded log.
+    """
+    clusters = entropic_clustering_encoded(encoded_log, 2, initialization, opt, rng)
+    return split_clusters_encoded(encoded_log, clusters, num_clusters, initialization, opt, rng)
+
+def entropic_clustering_split_VL(variant_log_input, num_clusters, initialization = '++', opt = 'trace', backend = 'dict', rng = None):
     """
     Hierarchical variant.
     Perform entropic clustering on a given event log and split clusters to create the desired number of clusters.
@@ -143,24 +484,22 @@ def entropic_clustering_split_VL(variant_log_input, num_clusters, initialization
     - log (pm4py.objects.log.obj.EventLog): The event log to be clustered.
     - num_clusters (int): The number of clusters to create.
     - initialization (str, optional): The initialization method for selecting initial seeds. Defaults to '++'.
-    - opt (str, optional): The optimization method for calculating ER. Can be 'full_cluster' or 'trace'. Defaults to 'trace'.
+    - opt (str, optional): The optimization method for calculating ER. Can be 'full_cluster', 'full_cluster_exact' or 'trace'. Defaults to 'trace'.
+    - backend (str, optional): The DFG implementation to use, 'dict' or 'encoded'. Defaults to 'dict'.
+    - rng (random.Random, optional): The random number generator used for the initialization. Defaults to None (the random module).
 
     Returns:
     - list: A list of clusters, where each cluster is a dictionary containing variants and their occurrences.
 """
-    variant_log = copy.deepcopy(variant_log_input)
-    clusters = entropic_clustering_VL(variant_log, 2, initialization, opt)
-    if num_clusters>2:
-        i = 2
-        while i<num_clusters:
-            to_be_split_cluster, clusters = get_worst_cluster_and_remove(copy.deepcopy(clusters))
-            new_clusters = entropic_clustering_VL(to_be_split_cluster, 2, initialization, opt)
-            clusters = add_clusters(clusters, new_clusters)
-            i += 1
-    return clusters
+    if backend == 'encoded':
+        encoded_log = EncodedVariantLog.from_variant_log(variant_log_input)
+        clusters = entropic_clustering_split_encoded(encoded_log, num_clusters, initialization, opt, rng)
+        return encoded_log.to_variant_logs(clusters, variants=list(variant_log_input))
+    clusters = entropic_clustering_VL(variant_log_input, 2, initialization, opt, backend, rng)
+    return split_clusters(clusters, num_clusters, initialization, opt, backend, rng)
 
 
-def entropic_clustering_split(log, num_clusters, initialization = '++', opt = 'trace'):
+def entropic_clustering_split(log, num_clusters, initialization = '++', opt = 'trace', backend = 'dict', rng = None):
     """
     Hierarchical variant.
     Perform entropic clustering on a given event log and split clusters to create the desired number of clusters.
@@ -169,18 +508,14 @@ def entropic_clustering_split(log, num_clusters, initialization = '++', opt = 't
     - log (pm4py.objects.log.obj.EventLog): The event log to be clustered.
     - num_clusters (int): The number of clusters to create.
     - initialization (str, optional): The initialization method for selecting initial seeds. Defaults to '++'.
-    - opt (str, optional): The optimization method for calculating ER. Can be 'full_cluster' or 'trace'. Defaults to 'trace'.
+    - opt (str, optional): The optimization method for calculating ER. Can be 'full_cluster', 'full_cluster_exact' or 'trace'. Defaults to 'trace'.
+    - backend (str, optional): The DFG implementation to use, 'dict' or 'encoded'. Defaults to 'dict'.
+    - rng (random.Random, optional): The random number generator used for the initialization. Defaults to None (the random module).
 
     Returns:
     - list: A list of clusters, where each cluster is a dictionary containing variants and their occurrences.
 """
 
-    clusters = entropic_clustering(log, 2, initialization, opt)
-    if num_clusters>2:
-        i = 2
-        while i<num_clusters:
-            to_be_split_cluster, clusters = get_worst_cluster_and_remove(copy.deepcopy(clusters))
-            new_clusters = entropic_clustering_VL(to_be_split_cluster, 2, initialization, opt)
-            clusters = add_clusters(clusters, new_clusters)
-            i += 1
-    return clusters
+    variant_log_input = utils.get_variant_log(log)
+    print("variant_log obtained")
+    return entropic_clustering_split_VL(variant_log_input, num_clusters, initialization, opt, backend, rng)
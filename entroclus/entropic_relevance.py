@@ -1,23 +1,29 @@
 import math
+import numpy as np
 from entroclus import utils as utils
+from entroclus.encoding import EncodedVariantLog
+from entroclus.encoded_dfg import EncodedDFG
 
-def get_ER(variant_log, activity_counts, edge_counts):
+def get_ER(variant_log, activity_counts, edge_counts=None, outgoing_counts=None):
     """
     Calculate the Entropic Relevance (ER) value for a given variant log, activity counts, and edge counts (last two together dfg).
     #! This is the average ER over all traces in the log
 
     Parameters:
     - variant_log (dict): A dictionary where the keys are variants (sequences of activities) and the values are the occurrences of each variant in the log.
-    - activity_counts (dict): A dictionary containing the counts of each activity in the graph.
-    - edge_counts (dict): A dictionary containing the counts of each edge in the graph.
+    - activity_counts (dict or EncodedDFG): A dictionary containing the counts of each activity in the graph, or an array-backed DFG.
+    - edge_counts (dict): A dictionary containing the counts of each edge in the graph. Can be None when activity_counts is an EncodedDFG.
+    - outgoing_counts (dict, optional): The outgoing totals of the graph (see 'utils.get_outgoing_counts'). Computed once from edge_counts if not given.
 
     Returns:
     - float: The ER value for the given variant log, activity counts, and edge counts.
     """
+    if outgoing_counts is None and not isinstance(activity_counts, EncodedDFG):
+        outgoing_counts = utils.get_outgoing_counts(edge_counts)
     ER_sum = 0.0
     total_occurences = 0
     for variant, occurrence in variant_log.items():
-        prob = utils.get_probability(activity_counts, edge_counts, variant)
+        prob = utils.get_probability(activity_counts, edge_counts, variant, outgoing_counts)
         #use this for the logs where probabilities get too small
         prob = max(prob, 1e-10)
         ER_sum += (-math.log(prob, 2))*occurrence
@@ -25,28 +31,106 @@ def get_ER(variant_log, activity_counts, edge_counts):
     ER = ER_sum/total_occurences
     return ER
 
-def get_ER_sum(variant_log, activity_counts, edge_counts):
+def get_ER_sum(variant_log, activity_counts, edge_counts=None, outgoing_counts=None):
     """
     Calculate the Entropic Relevance (ER) value for a given variant log, activity counts, and edge counts (last two together dfg).
     #! This is the total ER over all traces in the log
 
     Parameters:
     - variant_log (dict): A dictionary where the keys are variants (sequences of activities) and the values are the occurrences of each variant in the log.
-    - activity_counts (dict): A dictionary containing the counts of each activity in the graph.
-    - edge_counts (dict): A dictionary containing the counts of each edge in the graph.
+    - activity_counts (dict or EncodedDFG): A dictionary containing the counts of each activity in the graph, or an array-backed DFG.
+    - edge_counts (dict): A dictionary containing the counts of each edge in the graph. Can be None when activity_counts is an EncodedDFG.
+    - outgoing_counts (dict, optional): The outgoing totals of the graph (see 'utils.get_outgoing_counts'). Computed once from edge_counts if not given.
 
     Returns:
     - float: The ER value for the given variant log, activity counts, and edge counts.
     """
+    if outgoing_counts is None and not isinstance(activity_counts, EncodedDFG):
+        outgoing_counts = utils.get_outgoing_counts(edge_counts)
     ER_sum = 0.0
     for variant, occurrence in variant_log.items():
-        prob = utils.get_probability(activity_counts, edge_counts, variant)
+        prob = utils.get_probability(activity_counts, edge_counts, variant, outgoing_counts)
         #use this for the logs where probabilities get too small
         prob = max(prob, 1e-10)
         ER_sum += (-math.log(prob, 2))*occurrence
     return ER_sum
 
-def get_ER_normalized(variant_log, activity_counts, edge_counts):
+def get_ER_with_insertion(variant_log, edge_counts, outgoing_counts, new_trace, occurrence):
+    """
+    Calculate the Entropic Relevance (ER) value of a variant log extended with a new trace, on the dfg extended with that trace, 
+    without copying the log or the dfg. This is the average ER over all traces, as in 'get_ER'.
+
+    Parameters:
+    - variant_log (dict): The variant log without the new trace (can be empty).
+    - edge_counts (dict): A dictionary containing the counts of each edge in the graph, without the new trace.
+    - outgoing_counts (dict): The outgoing totals of the graph, without the new trace (see 'utils.get_outgoing_counts').
+    - new_trace (tuple): The trace that is inserted.
+    - occurrence (int): The occurrence of the new trace.
+
+    Returns:
+    - float: The ER value after the insertion.
+    """
+    new_trace_multisets = utils.get_edge_multiset(new_trace)
+    ER_sum = 0.0
+    total_occurences = 0
+    for variant, variant_occurrence in list(variant_log.items()) + [(new_trace, occurrence)]:
+        prob = utils.get_probability_with_insertion(edge_counts, outgoing_counts, variant, new_trace_multisets, occurrence)
+        #use this for the logs where probabilities get too small
+        prob = max(prob, 1e-10)
+        ER_sum += (-math.log(prob, 2))*variant_occurrence
+        total_occurences += variant_occurrence
+    ER = ER_sum/total_occurences
+    return ER
+
+def xlog2x(x):
+    """
+    Compute x * log2(x), with 0 * log2(0) = 0.
+    """
+    return x*math.log(x, 2) if x > 0 else 0.0
+
+def get_node_ER_terms(edge_counts, outgoing_counts):
+    """
+    Split the total ER of a log over the source activities of the dfg that was discovered from exactly that log. 
+    Every trace contributes -log2(e/o) for every step, so the total ER (without the 1e-10 bound of 'get_ER') is the sum over all source 
+    activities s of o_s*log2(o_s) - sum_d e_sd*log2(e_sd), with o_s the outgoing total of s and e_sd the count of edge (s, d).
+
+    Parameters:
+    - edge_counts (dict): A dictionary containing the counts of each edge in the graph.
+    - outgoing_counts (dict): The outgoing totals of the graph (see 'utils.get_outgoing_counts').
+
+    Returns:
+    - dict: A dictionary where the keys are the source activities and the values their term of the total ER.
+    """
+    node_terms = {activity: xlog2x(count) for activity, count in outgoing_counts.items()}
+    for (current_activity, next_activity), count in edge_counts.items():
+        node_terms[current_activity] -= xlog2x(count)
+    return node_terms
+
+def get_node_ER_terms_delta(edge_counts, outgoing_counts, new_trace_multisets, occurrence):
+    """
+    Calculate how the per-source terms of the total ER (see 'get_node_ER_terms') change when a trace is added to the log and the dfg.
+    Only the source activities of the new trace are affected, so the cost is proportional to the length of the trace.
+
+    Parameters:
+    - edge_counts (dict): A dictionary containing the counts of each edge in the graph, without the new trace.
+    - outgoing_counts (dict): The outgoing totals of the graph, without the new trace.
+    - new_trace_multisets (tuple): The edge and outgoing multisets of the new trace, as returned by 'utils.get_edge_multiset'.
+    - occurrence (int): The occurrence of the new trace (negative to remove it).
+
+    Returns:
+    - dict: A dictionary where the keys are the affected source activities and the values the change of their term.
+    """
+    new_edge_counts, new_outgoing_counts = new_trace_multisets
+    deltas = {}
+    for activity, multiplicity in new_outgoing_counts.items():
+        count = outgoing_counts.get(activity, 0)
+        deltas[activity] = xlog2x(count + occurrence*multiplicity) - xlog2x(count)
+    for edge, multiplicity in new_edge_counts.items():
+        count = edge_counts.get(edge, 0)
+        deltas[edge[0]] -= xlog2x(count + occurrence*multiplicity) - xlog2x(count)
+    return deltas
+
+def get_ER_normalized(variant_log, activity_counts, edge_counts=None, outgoing_counts=None):
     """
     Calculate the normalized Entropic Relevance (ER) value for a given variant log, activity counts, and edge counts. it corrects the ER function by adjusting it to not 
     take into account the inherent decrease in probability introduced by loops. We therefore deduct the ER score of each trace, on a dfg mined on only that trace itself
@@ -54,26 +138,83 @@ def get_ER_normalized(variant_log, activity_counts, edge_counts):
 
     Parameters:
     - variant_log (dict): A dictionary where the keys are variants (sequences of activities) and the values are the occurrences of each variant in the log.
-    - activity_counts (dict): A dictionary containing the counts of each activity in the graph.
-    - edge_counts (dict): A dictionary containing the counts of each edge in the graph.
+    - activity_counts (dict or EncodedDFG): A dictionary containing the counts of each activity in the graph, or an array-backed DFG.
+    - edge_counts (dict): A dictionary containing the counts of each edge in the graph. Can be None when activity_counts is an EncodedDFG.
+    - outgoing_counts (dict, optional): The outgoing totals of the graph (see 'utils.get_outgoing_counts'). Computed once from edge_counts if not given.
 
     Returns:
     - float: The normalized ER value.
     
     """
+    if outgoing_counts is None and not isinstance(activity_counts, EncodedDFG):
+        outgoing_counts = utils.get_outgoing_counts(edge_counts)
     ER_sum = 0.0
     total_occurences = 0
     for variant, occurrence in variant_log.items():
         # Calculate the replay probability of the trace with the real dfg 
-        prob = utils.get_probability(activity_counts, edge_counts, variant)
-        # Get a new dfg, which is only discovered using the varint, used for normalization
-        act_counts_var, edge_count_var = utils.get_dfg({variant:1})
-        # The probability of this dfg is the maximal probability possible for this trace when using dfg's, not always 1 because of loops
-        maximal_prob = utils.get_probability(act_counts_var, edge_count_var, variant)
+        prob = utils.get_probability(activity_counts, edge_counts, variant, outgoing_counts)
+        # The probability of the variant on a dfg discovered using only the variant itself is the maximal probability possible for this 
+        # trace when using dfg's, not always 1 because of loops. Every variant occurs once in the log, so it is computed once per call.
+        maximal_prob = utils.get_self_probability(variant)
         # Get normalized probability, subtracting the minimal ER at the end (obtained with maximal probability) would be the same
         prob_norm = prob/maximal_prob
         
         ER_sum += (-math.log(prob_norm, 2))*occurrence
         total_occurences += occurrence
     ER = ER_sum/total_occurences
-    return ER
\ No newline at end of file
+    return ER
+
+def get_transition_log_probabilities(encoded_log, dfg):
+    """
+    Get the log2 probability of every transition in an encoded variant log under an array-backed DFG, for all transitions at once.
+
+    Parameters:
+    - encoded_log (EncodedVariantLog): The encoded variant log.
+    - dfg (EncodedDFG): The DFG. Its vocabulary can differ from the one of the log, activities unknown to the DFG get probability 0.
+
+    Returns:
+    - log_probs (numpy.ndarray): The log2 probability of every transition (-inf for transitions the DFG can not replay).
+    - variant_index (numpy.ndarray): The index of the variant every transition belongs to.
+    """
+    src, dst, variant_index = encoded_log.transitions()
+    if encoded_log.vocabulary is not dfg.vocabulary:
+        mapping = encoded_log.vocabulary.get_mapping(dfg.vocabulary)
+        src, dst = mapping[src], mapping[dst]
+    edge_counts = dfg.get_edge_counts(src, dst)
+    outgoing_counts = dfg.get_outgoing_counts(src)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        log_probs = np.log2(edge_counts) - np.log2(outgoing_counts)
+    #no outgoing edges means probability 0, like in utils.get_probability
+    log_probs[outgoing_counts == 0] = -np.inf
+    return log_probs, variant_index
+
+def get_ER_batch(encoded_log, dfg, min_prob=None, normalized=False):
+    """
+    Calculate the Entropic Relevance (ER) of every variant of a log in one vectorized pass. Probabilities are multiplied in log space
+    (as sums of log2 transition probabilities per variant), so long traces do not underflow.
+
+    Parameters:
+    - encoded_log (EncodedVariantLog or dict): The variant log, encoded or as a dictionary of variants and occurrences.
+    - dfg (EncodedDFG): The DFG.
+    - min_prob (float, optional): Lower bound on the trace probabilities, as used by 'get_ER' (1e-10). If None, the exact ER is returned, 
+      which is infinite for traces the DFG can not replay. Defaults to None.
+    - normalized (bool, optional): Whether to return the normalized ER of 'get_ER_normalized' instead, i.e. minus the ER of every variant 
+      on its own dfg (see 'EncodedVariantLog.get_self_ERs'). min_prob is not used in that case. Defaults to False.
+
+    Returns:
+    - ER_variants (numpy.ndarray): The ER of every variant (the ER of a single trace of that variant).
+    - ER (float): The average ER over all traces in the log (weighted by occurrence), as in 'get_ER'.
+    - ER_sum (float): The total ER over all traces in the log, as in 'get_ER_sum'.
+    """
+    if not isinstance(encoded_log, EncodedVariantLog):
+        encoded_log = EncodedVariantLog.from_variant_log(encoded_log)
+    log_probs, variant_index = get_transition_log_probabilities(encoded_log, dfg)
+    #segment sum of the transition log probabilities per variant
+    ER_variants = -np.bincount(variant_index, weights=log_probs, minlength=len(encoded_log))
+    if normalized == True:
+        ER_variants = ER_variants - encoded_log.get_self_ERs()
+    elif min_prob is not None:
+        ER_variants = np.minimum(ER_variants, -math.log(min_prob, 2))
+    ER_sum = float(np.dot(ER_variants, encoded_log.counts))
+    ER = ER_sum/float(encoded_log.counts.sum())
+    return ER_variants, ER, ER_sum
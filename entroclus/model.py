@@ -0,0 +1,151 @@
+import pandas
+
+from entroclus import utils as utils
+from entroclus import entropic_clustering as entropic_clustering
+from entroclus.encoding import Vocabulary, EncodedVariantLog
+from entroclus.encoded_dfg import StackedDFGs
+
+
+class EntropicClustering:
+    """
+    Entropic clustering as a fitted model. After fitting, the model keeps the encoded DFGs of all clusters, so new traces can be assigned
+    to the existing clusters ('predict') and new variants can be added to them ('partial_fit') without clustering the whole log again.
+
+    Parameters:
+    - num_clusters (int): The number of clusters to create.
+    - variant (str, optional): 'regular' or 'split'. Defaults to 'regular'.
+    - initialization (str, optional): The initialization method for selecting initial seeds. Defaults to '++'.
+    - opt (str, optional): The optimization method for calculating ER, 'trace', 'full_cluster' or 'full_cluster_exact'. Also used to assign new variants in
+      'partial_fit'. Defaults to 'trace'.
+    - backend (str, optional): The DFG implementation used while fitting, 'dict' or 'encoded'. Defaults to 'dict'.
+    - random_state (int, optional): Seed for the random initialization. Defaults to None.
+    - refine_passes (int, optional): The maximal number of refinement passes after fitting (regular variant only). Defaults to 0.
+
+    Attributes (after fitting):
+    - clusters_ (list): A list of variant log dictionaries representing the clusters.
+    - vocabulary_ (Vocabulary): The vocabulary of all activities seen so far.
+    - dfgs_ (StackedDFGs): The DFGs of all clusters.
+    - cluster_of_ (dict): The cluster index of every variant seen so far.
+    - pruning_stats_ (dict): The number of scored and total steps of the last call to 'predict' (see 'StackedDFGs.assign_batch').
+    """
+    def __init__(self, num_clusters, variant='regular', initialization='++', opt='trace', backend='dict', random_state=None, refine_passes=0):
+        self.num_clusters = num_clusters
+        self.variant = variant
+        self.initialization = initialization
+        self.opt = opt
+        self.backend = backend
+        self.random_state = random_state
+        self.refine_passes = refine_passes
+
+    def _get_variant_log(self, X):
+        #event logs are turned into variant logs, variant logs are used as they are
+        if isinstance(X, pandas.core.frame.DataFrame):
+            return utils.get_variant_log(X)
+        elif isinstance(X, dict):
+            return X
+        else:
+            raise ValueError("Input has to be a pandas DataFrame (event log) or a variant log dictionary.")
+
+    def fit(self, X):
+        """
+        Cluster a log and keep the DFGs of the clusters.
+
+        Parameters:
+        - X (pandas.DataFrame or dict): The event log or variant log to be clustered.
+
+        Returns:
+        - EntropicClustering: The fitted model.
+        """
+        variant_log = self._get_variant_log(X)
+        self.clusters_ = entropic_clustering.cluster(variant_log, self.num_clusters, outputshape='variant_log', variant=self.variant,
+                                                     initialization=self.initialization, opt=self.opt, backend=self.backend,
+                                                     random_state=self.random_state, refine_passes=self.refine_passes)
+        self.vocabulary_ = Vocabulary()
+        encoded_log = EncodedVariantLog.from_variant_log(variant_log, self.vocabulary_)
+        self.cluster_of_ = {variant: k for k, cluster in enumerate(self.clusters_) for variant in cluster}
+        members = [[] for _ in range(len(self.clusters_))]
+        for i, variant in enumerate(variant_log):
+            members[self.cluster_of_[variant]].append(i)
+        self.dfgs_ = StackedDFGs.from_encoded_log(encoded_log, members)
+        return self
+
+    def predict(self, X):
+        """
+        Assign traces to the existing clusters in one batch: every trace goes to the cluster for which it gets the lowest ER after adding
+        it (with its occurrence) to the cluster's DFG, the criterion used while clustering with opt='trace' (with the 1e-10 bound of
+        'entropic_relevance.get_ER'). The model itself is not changed.
+
+        Parameters:
+        - X (pandas.DataFrame, dict or list): An event log, a variant log dictionary, or a list of traces (tuples of activities).
+
+        Returns:
+        - numpy.ndarray: The cluster index of every trace, in the order of the list, or of the variants of the (variant) log.
+        """
+        return self.predict_ER(X)[0]
+
+    def predict_ER(self, X):
+        """
+        Assign traces to the existing clusters like 'predict', and also return the ER every trace gets in its cluster. Clusters that can
+        not beat the best cluster of a trace are abandoned early (see 'StackedDFGs.assign_batch'), the number of scored and total steps of
+        the last call is kept in pruning_stats_.
+
+        Parameters:
+        - X (pandas.DataFrame, dict or list): An event log, a variant log dictionary, or a list of traces (tuples of activities).
+
+        Returns:
+        - labels (numpy.ndarray): The cluster index of every trace.
+        - ERs (numpy.ndarray): The ER of every trace in its cluster (after adding it to the cluster's DFG).
+        """
+        if isinstance(X, (pandas.core.frame.DataFrame, dict)):
+            encoded_log = EncodedVariantLog.from_variant_log(self._get_variant_log(X), self.vocabulary_, add=False)
+        else:
+            encoded_log = EncodedVariantLog.from_traces(X, vocabulary=self.vocabulary_, add=False)
+        #branch-and-bound over the clusters, the amount of pruned work is kept in pruning_stats_
+        labels, ERs, self.pruning_stats_ = self.dfgs_.assign_batch(encoded_log, min_prob=1e-10)
+        return labels, ERs
+
+    def partial_fit(self, X):
+        """
+        Add new traces to the clusters and update their DFGs. Variants that were seen before go to their own cluster, new variants are
+        assigned one by one to the cluster with the lowest ER (as in 'entropic_clustering_variants.entropic_clustering_VL', using opt),
+        so later variants see the counts of earlier ones. New activities are added to the vocabulary. An unfitted model is fitted instead.
+
+        Parameters:
+        - X (pandas.DataFrame or dict): The event log or variant log with the new traces.
+
+        Returns:
+        - EntropicClustering: The updated model.
+
+        Raises:
+        - ValueError: If the model was loaded read-only.
+        """
+        if not hasattr(self, 'dfgs_'):
+            return self.fit(X)
+        if self.clusters_ is None:
+            raise ValueError("The model was loaded read-only (load_model with mmap_mode='r') and can not be updated; load it with mmap_mode='c' or None.")
+        for variant, occurrence in self._get_variant_log(X).items():
+            trace_ids = self.vocabulary_.encode(variant, add=True)
+            if variant in self.cluster_of_:
+                cluster_index = self.cluster_of_[variant]
+                self.clusters_[cluster_index][variant] += occurrence
+            else:
+                #with the same 1e-10 bound as 'get_ER'
+                cluster_index, _ = self.dfgs_.assign(trace_ids, occurrence, min_prob=1e-10, opt=self.opt,
+                                                     get_cluster_log=lambda k: EncodedVariantLog.from_variant_log(self.clusters_[k], self.vocabulary_, add=False))
+                self.clusters_[cluster_index][variant] = occurrence
+                self.cluster_of_[variant] = cluster_index
+            self.dfgs_.update(cluster_index, trace_ids, occurrence)
+        return self
+
+    def get_dfg(self, cluster_index):
+        """
+        Get the DFG of one cluster as dictionaries, like 'utils.get_dfg'.
+
+        Parameters:
+        - cluster_index (int): The index of the cluster.
+
+        Returns:
+        - activity_counts (dict): The counts of every activity in the cluster.
+        - edge_counts (dict): The counts of every edge in the cluster.
+        """
+        return self.dfgs_.get_dfg(cluster_index).to_dicts()
@@ -0,0 +1,155 @@
+from collections import defaultdict, deque
+
+from entroclus import utils as utils
+from entroclus import entropic_clustering_variants as entropic_clustering_variants
+
+#Rescale all counts once the weight of new cases exceeds this, so the counts stay within the range of floats under decay
+MAX_WEIGHT = 1e100
+
+
+class OnlineEntropicClustering:
+    """
+    Entropic clustering over a stream of completed cases. Every case is assigned to the cluster for which it gets the lowest ER after
+    adding it to the cluster's DFG, the greedy rule of 'entropic_clustering_variants.entropic_clustering_VL' with opt='trace' (with
+    branch-and-bound over the clusters, in O(trace length) per cluster), after which the DFG of that cluster is updated with
+    'utils.update_dfg'. The clusters start empty: an empty cluster gives a trace its lowest possible ER, its self-ER (the ER on the DFG
+    of only that trace), so the first num_clusters distinct variants of the stream each open a cluster, as seeds.
+
+    Only the DFGs of the clusters are kept, not the cases or variants, so the memory use is bounded by the number of clusters and the
+    size of the alphabet (plus the cases in the window, if one is used), not by the number of cases seen. To let the clusters follow
+    changes in the process, older cases can be weighted down exponentially (decay) or forgotten after a number of cases (window).
+
+    Parameters:
+    - num_clusters (int): The number of clusters.
+    - decay (float, optional): The fraction by which the weight of all earlier cases shrinks with every new case, between 0 and 1.
+      Defaults to None (no decay).
+    - window (int, optional): The number of most recent cases kept in the DFGs; older cases are removed with 'utils.downdate_dfg'.
+      Can not be combined with decay. Defaults to None (no window).
+    - min_prob (float, optional): Lower bound on the trace probabilities, as used by 'entropic_relevance.get_ER'. Defaults to 1e-10.
+
+    Attributes:
+    - dfgs_ (list): The (activity_counts, edge_counts) of every cluster.
+    - weights_ (list): The (decayed) number of cases in every cluster.
+    - num_cases_ (int): The number of cases seen.
+    - pruning_stats_ (dict): The number of scored and total steps over all assignments (see 'get_best_cluster_pruned').
+    """
+    def __init__(self, num_clusters, decay=None, window=None, min_prob=1e-10):
+        if decay is not None and not 0 < decay < 1:
+            raise ValueError("decay has to be between 0 and 1.")
+        if window is not None and window < 1:
+            raise ValueError("window has to be at least 1.")
+        if decay is not None and window is not None:
+            raise ValueError("Use either decay or a window, not both.")
+        self.num_clusters = num_clusters
+        self.decay = decay
+        self.window = window
+        self.min_prob = min_prob
+        self.dfgs_ = [(defaultdict(int), {}) for _ in range(num_clusters)]
+        self.outgoing_ = [{} for _ in range(num_clusters)]
+        self.weights_ = [0] * num_clusters
+        self.num_cases_ = 0
+        self.pruning_stats_ = {'steps': 0, 'total_steps': 0}
+        #the weight of the next case: instead of multiplying all counts with (1 - decay) for every case, new cases get a higher weight
+        self._weight = 1
+        self._window = deque()
+
+    def _rescale(self):
+        #divide all counts by the weight of the next case, which does not change any probability
+        scale = self._weight
+        for k in range(self.num_clusters):
+            activity_counts, edge_counts = self.dfgs_[k]
+            for counts in [activity_counts, edge_counts, self.outgoing_[k]]:
+                for key in counts:
+                    counts[key] /= scale
+            self.weights_[k] /= scale
+        self._weight = 1.0
+
+    def predict_one(self, trace):
+        """
+        Get the cluster a trace would be assigned to, without changing the clusters.
+
+        Parameters:
+        - trace (tuple): The trace (tuple of activities).
+
+        Returns:
+        - cluster_index (int): The index of the cluster with the lowest ER.
+        - ER (float): The ER of the trace in that cluster, after adding it to the cluster's DFG.
+        """
+        cluster_index, ER, _, _ = entropic_clustering_variants.get_best_cluster_pruned(self.dfgs_, self.outgoing_, tuple(trace), self._weight, self.min_prob)
+        return cluster_index, ER
+
+    def learn_one(self, trace):
+        """
+        Assign a completed case to the cluster with the lowest ER and update the DFG of that cluster.
+
+        Parameters:
+        - trace (tuple): The trace (tuple of activities) of the case.
+
+        Returns:
+        - int: The index of the cluster the case was assigned to.
+        """
+        trace = tuple(trace)
+        cluster_index, _, steps, total_steps = entropic_clustering_variants.get_best_cluster_pruned(self.dfgs_, self.outgoing_, trace, self._weight, self.min_prob)
+        self.pruning_stats_['steps'] += steps
+        self.pruning_stats_['total_steps'] += total_steps
+        activity_counts, edge_counts = self.dfgs_[cluster_index]
+        utils.update_dfg(activity_counts, edge_counts, trace, self._weight, self.outgoing_[cluster_index])
+        self.weights_[cluster_index] += self._weight
+        self.num_cases_ += 1
+        if self.window is not None:
+            self._window.append((trace, cluster_index))
+            if len(self._window) > self.window:
+                old_trace, old_cluster_index = self._window.popleft()
+                activity_counts, edge_counts = self.dfgs_[old_cluster_index]
+                utils.downdate_dfg(activity_counts, edge_counts, old_trace, 1, self.outgoing_[old_cluster_index])
+                self.weights_[old_cluster_index] -= 1
+        elif self.decay is not None:
+            self._weight /= (1 - self.decay)
+            if self._weight > MAX_WEIGHT:
+                self._rescale()
+        return cluster_index
+
+    def fit_stream(self, cases):
+        """
+        Cluster a stream of completed cases, one at a time, e.g. the traces of 'xes.iter_traces'.
+
+        Parameters:
+        - cases (iterable): The traces (tuples of activities) of the cases, in the order they were completed.
+
+        Yields:
+        - int: The index of the cluster every case was assigned to.
+        """
+        for trace in cases:
+            yield self.learn_one(trace)
+
+    async def afit_stream(self, cases):
+        """
+        Cluster an asynchronous stream of completed cases, like 'fit_stream'.
+
+        Parameters:
+        - cases (async iterable): The traces (tuples of activities) of the cases, in the order they were completed.
+
+        Yields:
+        - int: The index of the cluster every case was assigned to.
+        """
+        async for trace in cases:
+            yield self.learn_one(trace)
+
+    def get_dfg(self, cluster_index):
+        """
+        Get the DFG of one cluster as dictionaries, like 'utils.get_dfg'. Under decay the counts are weights, relative to the last case.
+
+        Parameters:
+        - cluster_index (int): The index of the cluster.
+
+        Returns:
+        - activity_counts (dict): The counts of every activity in the cluster.
+        - edge_counts (dict): The counts of every edge in the cluster.
+        """
+        activity_counts, edge_counts = self.dfgs_[cluster_index]
+        if self.decay is None:
+            return dict(activity_counts), dict(edge_counts)
+        #the weight of the last case
+        scale = self._weight * (1 - self.decay)
+        return ({activity: count / scale for activity, count in activity_counts.items()},
+                {edge: count / scale for edge, count in edge_counts.items()})
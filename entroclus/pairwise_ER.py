@@ -0,0 +1,148 @@
+import math
+from collections import OrderedDict
+
+import numpy as np
+from scipy import sparse
+
+from entroclus.encoded_dfg import edge_keys
+
+
+def _log2(matrix):
+    #elementwise log2 of the stored (positive) entries of a sparse matrix
+    result = matrix.copy()
+    result.data = np.log2(result.data)
+    return result
+
+
+class PairwiseER:
+    """
+    Computes pairwise Entropic Relevance (ER) distances between the variants of an encoded variant log, i.e. the value of
+    'entropic_clustering_utils.pairwise_ER' for every pair, without building a DFG per pair.
+
+    For a pair (a, b) the DFG is mined from {a: 1, b: 1}, so every edge count is m_a(e) + m_b(e) and every outgoing total o_a(s) + o_b(s),
+    with m and o the edge and outgoing multisets of the single traces. Those multisets are stored as sparse (variants x edges) and
+    (variants x activities) matrices, so the distances from one variant to a whole block of variants only need the columns of the
+    edges and activities of that one variant.
+
+    Computed rows (the distances from one variant to all variants) are kept in a cache with LRU eviction. Since the distance is
+    symmetric, a value is also found when only the row of the other variant is cached.
+
+    Parameters:
+    - encoded_log (EncodedVariantLog): The encoded variant log.
+    - min_prob (float, optional): Lower bound on the trace probabilities, as used by 'entropic_relevance.get_ER' (1e-10). Only used for
+      the regular (not normalized) ER. Defaults to None (exact ER).
+    - max_bytes (int, optional): Memory cap of the row cache in bytes. Defaults to 256 MB.
+    """
+    def __init__(self, encoded_log, min_prob=None, max_bytes=256 * 2**20):
+        self.encoded_log = encoded_log
+        self.min_prob = min_prob
+        self.max_bytes = max_bytes
+        self.num_variants = len(encoded_log)
+        src, dst, variant_index = encoded_log.transitions()
+        _, edge_index = np.unique(edge_keys(src, dst), return_inverse=True)
+        ones = np.ones(len(src), dtype=np.float64)
+        #duplicate entries are summed, which gives the multiplicities
+        self.edge_multisets = sparse.csr_matrix((ones, (variant_index, edge_index.ravel())), shape=(self.num_variants, int(edge_index.max()) + 1 if len(src) > 0 else 0))
+        self.outgoing_multisets = sparse.csr_matrix((ones, (variant_index, src)), shape=(self.num_variants, len(encoded_log.vocabulary)))
+        self.edge_multisets_csc = self.edge_multisets.tocsc()
+        self.outgoing_multisets_csc = self.outgoing_multisets.tocsc()
+        #sum of m*log2(m) over the edges and over the sources of every single trace
+        self.edge_self_terms = np.asarray(self.edge_multisets.multiply(_log2(self.edge_multisets)).sum(axis=1)).ravel()
+        self.outgoing_self_terms = np.asarray(self.outgoing_multisets.multiply(_log2(self.outgoing_multisets)).sum(axis=1)).ravel()
+        #ER of every trace on a dfg mined from that trace only (the normalization term of 'get_ER_normalized')
+        self.self_ERs = encoded_log.get_self_ERs()
+        self.cache = OrderedDict()
+        self.cache_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _compute_row(self, i, cols, norm):
+        edge_row = self.edge_multisets.getrow(i)
+        outgoing_row = self.outgoing_multisets.getrow(i)
+        edges_a, m_a = edge_row.indices, edge_row.data
+        sources_a, o_a = outgoing_row.indices, outgoing_row.data
+        #multiplicities of the edges and sources of variant i in every other variant
+        m_b = self.edge_multisets_csc[:, edges_a].toarray()[cols]
+        o_b = self.outgoing_multisets_csc[:, sources_a].toarray()[cols]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            #ER of trace a: -sum over its steps of log2(edge count / outgoing total) on the pair dfg
+            ER_a = -(np.log2(m_a + m_b) @ m_a) + np.log2(o_a + o_b) @ o_a
+            #ER of trace b: its own terms, corrected on the edges and sources it shares with a
+            edge_correction = np.where(m_b > 0, m_b * (np.log2(m_b + m_a) - np.log2(np.where(m_b > 0, m_b, 1.0))), 0.0).sum(axis=1)
+            outgoing_correction = np.where(o_b > 0, o_b * (np.log2(o_b + o_a) - np.log2(np.where(o_b > 0, o_b, 1.0))), 0.0).sum(axis=1)
+        ER_b = -(self.edge_self_terms[cols] + edge_correction) + self.outgoing_self_terms[cols] + outgoing_correction
+        if norm == True:
+            return ((ER_a - self.self_ERs[i]) + (ER_b - self.self_ERs[cols])) / 2
+        if self.min_prob is not None:
+            bound = -math.log(self.min_prob, 2)
+            ER_a, ER_b = np.minimum(ER_a, bound), np.minimum(ER_b, bound)
+        return (ER_a + ER_b) / 2
+
+    def _store(self, key, row):
+        self.cache[key] = row
+        self.cache_bytes += row.nbytes
+        #evict least recently used rows until the cache fits the memory cap again
+        while len(self.cache) > 1 and self.cache_bytes > self.max_bytes:
+            _, evicted = self.cache.popitem(last=False)
+            self.cache_bytes -= evicted.nbytes
+
+    def get_row(self, i, norm=False):
+        """
+        Get the pairwise ER between variant i and all variants of the log.
+
+        Parameters:
+        - i (int): The index of the variant.
+        - norm (bool, optional): Whether to use the normalized ER ('get_ER_normalized'). Defaults to False.
+
+        Returns:
+        - numpy.ndarray: The pairwise ER between variant i and every variant.
+        """
+        key = (i, norm)
+        if key in self.cache:
+            self.hits += 1
+            self.cache.move_to_end(key)
+            return self.cache[key]
+        self.misses += 1
+        row = self._compute_row(i, np.arange(self.num_variants), norm)
+        self._store(key, row)
+        return row
+
+    def get_block(self, rows, cols, norm=False):
+        """
+        Get the pairwise ER for a block of variant pairs.
+
+        Parameters:
+        - rows (list): The indices of the row variants.
+        - cols (list): The indices of the column variants.
+        - norm (bool, optional): Whether to use the normalized ER. Defaults to False.
+
+        Returns:
+        - numpy.ndarray: A (len(rows) x len(cols)) matrix with the pairwise ER values.
+        """
+        cols = np.asarray(cols, dtype=np.int64)
+        block = np.zeros((len(rows), len(cols)), dtype=np.float64)
+        cached_cols = all((j, norm) in self.cache for j in cols)
+        for r, i in enumerate(rows):
+            if (i, norm) in self.cache:
+                block[r] = self.get_row(i, norm)[cols]
+            elif cached_cols:
+                #symmetric: read the value from the cached rows of the column variants
+                self.hits += 1
+                block[r] = [self.cache[(j, norm)][i] for j in cols]
+            else:
+                block[r] = self.get_row(i, norm)[cols]
+        return block
+
+    def get_distance(self, i, j, norm=False):
+        """
+        Get the pairwise ER between variants i and j.
+        """
+        if (i, norm) not in self.cache and (j, norm) in self.cache:
+            i, j = j, i
+        return float(self.get_row(i, norm)[j])
+
+    def cache_info(self):
+        """
+        Return the number of cache hits and misses, the number of cached rows and their memory use in bytes.
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'rows': len(self.cache), 'bytes': self.cache_bytes}
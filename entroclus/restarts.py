@@ -0,0 +1,182 @@
+import random
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from entroclus import utils as utils
+from entroclus import entropic_relevance as entropic_relevance
+from entroclus import entropic_clustering_variants as entropic_clustering_variants
+from entroclus.encoding import EncodedVariantLog
+from entroclus.encoded_dfg import EncodedDFG
+
+#the store attached to, the encoded variant log on it and the variant log dictionary (decoded only for the dict backend), shared
+#(read-only) by all restarts in a worker process, set once per worker by '_init_worker'
+_worker_store = None
+_worker_encoded_log = None
+_worker_variant_log = None
+
+
+def _init_worker(handle, backend='dict', variant_log=None):
+    global _worker_store, _worker_encoded_log, _worker_variant_log
+    if handle is None:
+        #variant logs with activities that are not strings can not be published, and are sent to every worker instead
+        _worker_variant_log = variant_log
+        _worker_encoded_log = EncodedVariantLog.from_variant_log(variant_log) if backend == 'encoded' else None
+        return
+    from entroclus import shared_store as shared_store
+    _worker_store = handle.attach()
+    _worker_encoded_log = shared_store.attach_variant_log(_worker_store)[0]
+    _worker_variant_log = _worker_encoded_log.to_variant_log() if backend == 'dict' else None
+
+
+def get_total_ER_sum(clusters):
+    """
+    Calculate the total ER over all traces of a clustering, every cluster being scored on its own DFG.
+
+    Parameters:
+    - clusters (list): A list of variant log dictionaries representing clusters.
+
+    Returns:
+    - float: The sum of the ER_sum of every cluster.
+    """
+    ER_sum = 0.0
+    for c in clusters:
+        c_activity_counts, c_edge_counts = utils.get_dfg(c)
+        ER_sum += entropic_relevance.get_ER_sum(c, c_activity_counts, c_edge_counts)
+    return ER_sum
+
+
+def get_total_ER_sum_encoded(encoded_log, clusters):
+    """
+    Calculate the total ER over all traces of a clustering of an encoded variant log, every cluster being scored on its own DFG.
+
+    Parameters:
+    - encoded_log (EncodedVariantLog): The encoded variant log.
+    - clusters (list): The clusters, as arrays of variant indices.
+
+    Returns:
+    - float: The sum of the ER_sum of every cluster.
+    """
+    ER_sum = 0.0
+    for c in clusters:
+        if len(c) > 0:
+            ER_sum += entropic_relevance.get_ER_batch(encoded_log.subset(c), EncodedDFG.from_encoded_log(encoded_log, c), min_prob=1e-10)[2]
+    return ER_sum
+
+
+def get_labels(variant_log, clusters):
+    """
+    Get the cluster index of every variant, in the order of the variant log.
+
+    Parameters:
+    - variant_log (dict): The clustered variant log.
+    - clusters (list): A list of variant log dictionaries representing clusters.
+
+    Returns:
+    - numpy.ndarray: The cluster index of every variant of the variant log.
+    """
+    cluster_of = {variant: k for k, c in enumerate(clusters) for variant in c}
+    return np.array([cluster_of[variant] for variant in variant_log], dtype=np.int64)
+
+
+def get_clusters_from_labels(variant_log, labels, num_clusters):
+    """
+    Get the clusters (as variant log dictionaries) from the cluster index of every variant.
+
+    Parameters:
+    - variant_log (dict): The clustered variant log.
+    - labels (numpy.ndarray): The cluster index of every variant, in the order of the variant log.
+    - num_clusters (int): The number of clusters.
+
+    Returns:
+    - list: A list of variant log dictionaries representing clusters.
+    """
+    clusters = [{} for _ in range(num_clusters)]
+    for (variant, occurrence), k in zip(variant_log.items(), labels):
+        clusters[k][variant] = occurrence
+    return clusters
+
+
+def run_restart(seed, num_clusters, variant='regular', initialization='++', opt='trace', backend='dict', refine_passes=0, refine_time_budget=None):
+    """
+    Run one restart of entropic clustering on the variant log of the worker process.
+
+    Parameters:
+    - seed (int): The seed of the random number generator of this restart.
+    - num_clusters (int): The number of clusters to create.
+    - variant (str, optional): 'regular' or 'split'. Defaults to 'regular'.
+    - initialization (str, optional): The initialization method. Defaults to '++'.
+    - opt (str, optional): The optimization method. Defaults to 'trace'.
+    - backend (str, optional): The DFG implementation to use. Defaults to 'dict'.
+    - refine_passes (int, optional): The maximal number of refinement passes (regular variant only). Defaults to 0.
+    - refine_time_budget (float, optional): Time budget for the refinement in seconds. Defaults to None.
+
+    Returns:
+    - labels (numpy.ndarray): The cluster index of every variant.
+    - ER_sum (float): The total ER of the clustering.
+    """
+    rng = random.Random(seed)
+    if variant not in ['regular', 'split']:
+        raise ValueError("Variant has to be 'regular' or 'split'.")
+    if backend == 'encoded':
+        #the clusters are arrays of variant indices into the encoded log of the worker
+        if variant == 'regular':
+            clusters = entropic_clustering_variants.entropic_clustering_encoded(_worker_encoded_log, num_clusters, initialization, opt, rng, refine_passes, refine_time_budget)
+        else:
+            clusters = entropic_clustering_variants.entropic_clustering_split_encoded(_worker_encoded_log, num_clusters, initialization, opt, rng)
+        labels = np.zeros(len(_worker_encoded_log), dtype=np.int64)
+        for k, c in enumerate(clusters):
+            labels[c] = k
+        return labels, get_total_ER_sum_encoded(_worker_encoded_log, clusters)
+    if variant == 'regular':
+        clusters = entropic_clustering_variants.entropic_clustering_VL(_worker_variant_log, num_clusters, initialization, opt, backend, rng, refine_passes, refine_time_budget)
+    else:
+        clusters = entropic_clustering_variants.entropic_clustering_split_VL(_worker_variant_log, num_clusters, initialization, opt, backend, rng)
+    return get_labels(_worker_variant_log, clusters), get_total_ER_sum(clusters)
+
+
+def entropic_clustering_n_init(variant_log, num_clusters, n_init=10, n_jobs=None, random_state=None, variant='regular', initialization='++', opt='trace', backend='dict',
+                               refine_passes=0, refine_time_budget=None):
+    """
+    Run entropic clustering n_init times with independent random initializations on a process pool, and keep the clustering with
+    the lowest total ER. The variant log is encoded once and published in shared memory ('shared_store'), which every worker process
+    attaches to without copying; every restart only sends back its labels and total ER. The shared memory is removed when the restarts
+    are done, also when they fail.
+
+    Parameters:
+    - variant_log (dict): The variant log to be clustered.
+    - num_clusters (int): The number of clusters to create.
+    - n_init (int, optional): The number of restarts. Defaults to 10.
+    - n_jobs (int, optional): The number of worker processes. Defaults to None (the number of CPUs).
+    - random_state (int, optional): Seed from which the independent random streams of the restarts are derived, for reproducibility.
+      Defaults to None (not reproducible).
+    - variant (str, optional): 'regular' or 'split'. Defaults to 'regular'.
+    - initialization (str, optional): The initialization method. Defaults to '++'.
+    - opt (str, optional): The optimization method. Defaults to 'trace'.
+    - backend (str, optional): The DFG implementation to use. Defaults to 'dict'.
+    - refine_passes (int, optional): The maximal number of refinement passes of every restart (regular variant only). Defaults to 0.
+    - refine_time_budget (float, optional): Time budget for the refinement of every restart in seconds. Defaults to None.
+
+    Returns:
+    - list: The best clustering, as a list of variant log dictionaries.
+    """
+    seeds = [int(child.generate_state(1)[0]) for child in np.random.SeedSequence(random_state).spawn(n_init)]
+    encoded_log = EncodedVariantLog.from_variant_log(variant_log)
+    store = None
+    if all(isinstance(activity, str) for activity in encoded_log.vocabulary.activities):
+        #imported here, as shared_store depends (through serialization) on model, which imports this module through entropic_clustering
+        from entroclus import shared_store as shared_store
+        store = shared_store.publish_variant_log(encoded_log)
+        initargs = (store.handle, backend)
+    else:
+        initargs = (None, backend, variant_log)
+    try:
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker, initargs=initargs) as executor:
+            futures = [executor.submit(run_restart, seed, num_clusters, variant, initialization, opt, backend, refine_passes, refine_time_budget) for seed in seeds]
+            results = [future.result() for future in futures]
+    finally:
+        if store is not None:
+            store.close()
+    best_labels, best_ER_sum = min(results, key=lambda result: result[1])
+    print("best total ER over", n_init, "restarts:", best_ER_sum)
+    return get_clusters_from_labels(variant_log, best_labels, num_clusters)
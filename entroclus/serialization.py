@@ -0,0 +1,289 @@
+import numpy as np
+
+from entroclus.encoding import Vocabulary, EncodedVariantLog
+from entroclus.encoded_dfg import StackedDFGs
+from entroclus.model import EntropicClustering
+
+#File layout (all little-endian):
+#- a fixed size header (HEADER_DTYPE), starting with MAGIC and the format VERSION,
+#- a table with one entry (SECTION_DTYPE) per array: its name, dtype, shape and byte offset,
+#- the arrays themselves, every one starting at a multiple of ALIGNMENT bytes, so they can be used as views on one memory map.
+#Strings (activities, model parameters) are stored as UTF-8 bytes in one array plus an array of offsets.
+#Version 2 added the bound arrays of the DFGs (min_log_probs, source_mults); files of version 1 are rejected.
+MAGIC = b'ENTROCLU'
+VERSION = 2
+ALIGNMENT = 64
+HEADER_DTYPE = np.dtype([('magic', 'S8'), ('version', '<u4'), ('num_sections', '<u4'), ('num_clusters', '<u8'), ('num_activities', '<u8'),
+                         ('dense', 'u1'), ('reserved', 'S31')])
+SECTION_DTYPE = np.dtype([('name', 'S16'), ('dtype', 'S8'), ('ndim', '<u4'), ('reserved', '<u4'), ('shape', '<u8', (3,)),
+                          ('offset', '<u8'), ('nbytes', '<u8')])
+
+
+def _align(position):
+    return -(-position // ALIGNMENT) * ALIGNMENT
+
+
+def pack_strings(strings):
+    """
+    Pack a list of strings into one byte array and the offsets of every string in it.
+
+    Parameters:
+    - strings (list): The strings.
+
+    Returns:
+    - offsets (numpy.ndarray): The start of every string in the byte array, plus the total length at the end.
+    - data (numpy.ndarray): The UTF-8 encoded strings, concatenated.
+    """
+    encoded = [string.encode('utf-8') for string in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype='<i8')
+    np.cumsum([len(e) for e in encoded], out=offsets[1:])
+    return offsets, np.frombuffer(b''.join(encoded), dtype=np.uint8)
+
+
+def unpack_strings(offsets, data):
+    """
+    Unpack the strings packed by 'pack_strings'.
+    """
+    data = bytes(data)
+    return [data[offsets[i]:offsets[i + 1]].decode('utf-8') for i in range(len(offsets) - 1)]
+
+
+def get_layout(arrays, num_clusters=0, num_activities=0, dense=False):
+    """
+    Lay out named arrays in the format described at the top of this module, without writing them.
+
+    Parameters:
+    - arrays (dict): The arrays by name (at most 16 ASCII characters, at most 3 dimensions).
+    - num_clusters (int, optional): The number of clusters, stored in the header. Defaults to 0.
+    - num_activities (int, optional): The number of activities, stored in the header. Defaults to 0.
+    - dense (bool, optional): Whether the edge counts are stored densely, stored in the header. Defaults to False.
+
+    Returns:
+    - arrays (dict): The arrays as contiguous little-endian arrays.
+    - header (numpy.ndarray): The header.
+    - table (numpy.ndarray): The section table.
+    - size (int): The total size in bytes, up to the end of the last aligned section.
+    """
+    arrays = {name: np.ascontiguousarray(array, dtype=np.asarray(array).dtype.newbyteorder('<')) for name, array in arrays.items()}
+    header = np.zeros(1, dtype=HEADER_DTYPE)
+    header['magic'] = MAGIC
+    header['version'] = VERSION
+    header['num_sections'] = len(arrays)
+    header['num_clusters'] = num_clusters
+    header['num_activities'] = num_activities
+    header['dense'] = dense
+    table = np.zeros(len(arrays), dtype=SECTION_DTYPE)
+    position = _align(HEADER_DTYPE.itemsize + SECTION_DTYPE.itemsize * len(arrays))
+    for entry, (name, array) in zip(table, arrays.items()):
+        if array.ndim > 3:
+            raise ValueError("Arrays can have at most 3 dimensions.")
+        entry['name'] = name.encode('ascii')
+        entry['dtype'] = array.dtype.str.encode('ascii')
+        entry['ndim'] = array.ndim
+        entry['shape'][:array.ndim] = array.shape
+        entry['offset'] = position
+        entry['nbytes'] = array.nbytes
+        position = _align(position + array.nbytes)
+    return arrays, header, table, position
+
+
+def write_arrays(path, arrays, num_clusters=0, num_activities=0, dense=False):
+    """
+    Write named arrays to a file in the format described at the top of this module.
+
+    Parameters:
+    - path (str): The file to write.
+    - arrays (dict): The arrays by name (at most 16 ASCII characters, at most 3 dimensions).
+    - num_clusters (int, optional): The number of clusters, stored in the header. Defaults to 0.
+    - num_activities (int, optional): The number of activities, stored in the header. Defaults to 0.
+    - dense (bool, optional): Whether the edge counts are stored densely, stored in the header. Defaults to False.
+    """
+    arrays, header, table, size = get_layout(arrays, num_clusters=num_clusters, num_activities=num_activities, dense=dense)
+    with open(path, 'wb') as f:
+        f.write(header.tobytes())
+        f.write(table.tobytes())
+        for entry, array in zip(table, arrays.values()):
+            f.seek(int(entry['offset']))
+            f.write(array.tobytes())
+        #pad the file up to the end of the last aligned section
+        f.truncate(size)
+
+
+def write_arrays_to_buffer(buffer, arrays, header, table):
+    """
+    Write arrays laid out by 'get_layout' into a writable byte buffer of at least the size of the layout (e.g. a shared memory block).
+
+    Parameters:
+    - buffer (numpy.ndarray): The uint8 buffer.
+    - arrays (dict): The arrays, as returned by 'get_layout'.
+    - header (numpy.ndarray): The header, as returned by 'get_layout'.
+    - table (numpy.ndarray): The section table, as returned by 'get_layout'.
+    """
+    buffer[:HEADER_DTYPE.itemsize] = header.view(np.uint8)
+    buffer[HEADER_DTYPE.itemsize:HEADER_DTYPE.itemsize + table.nbytes] = table.view(np.uint8)
+    for entry, array in zip(table, arrays.values()):
+        offset = int(entry['offset'])
+        buffer[offset:offset + array.nbytes] = array.reshape(-1).view(np.uint8)
+
+
+def read_arrays(path, mmap_mode='r'):
+    """
+    Read a file written by 'write_arrays'. The whole file is memory-mapped once and every array is a view on that map, so opening
+    costs only the parsing of the header and the section table, and processes that map the same file read-only share its pages.
+
+    Parameters:
+    - path (str): The file to read.
+    - mmap_mode (str, optional): 'r' (read-only), 'c' (copy-on-write) or None (read the file into memory). Defaults to 'r'.
+
+    Returns:
+    - header (numpy.void): The header, with num_clusters, num_activities and dense.
+    - arrays (dict): The arrays by name.
+    """
+    if mmap_mode is None:
+        buffer = np.fromfile(path, dtype=np.uint8)
+    else:
+        buffer = np.memmap(path, dtype=np.uint8, mode=mmap_mode)
+    return parse_arrays(buffer, str(path))
+
+
+def parse_arrays(buffer, source='buffer'):
+    """
+    Parse a byte buffer in the format described at the top of this module, every array being a view on the buffer.
+
+    Parameters:
+    - buffer (numpy.ndarray): The uint8 buffer (a memory map, a shared memory block or an array in memory).
+    - source (str, optional): The name of the buffer, used in error messages. Defaults to 'buffer'.
+
+    Returns:
+    - header (numpy.void): The header, with num_clusters, num_activities and dense.
+    - arrays (dict): The arrays by name.
+    """
+    header = buffer[:HEADER_DTYPE.itemsize].view(HEADER_DTYPE)[0]
+    if header['magic'] != MAGIC:
+        raise ValueError("Not an entroclus model file: " + source)
+    if header['version'] != VERSION:
+        raise ValueError("Unsupported model file version " + str(int(header['version'])) + ", expected " + str(VERSION) + ": " + source)
+    table_end = HEADER_DTYPE.itemsize + SECTION_DTYPE.itemsize * int(header['num_sections'])
+    table = buffer[HEADER_DTYPE.itemsize:table_end].view(SECTION_DTYPE)
+    arrays = {}
+    for entry in table:
+        offset, nbytes = int(entry['offset']), int(entry['nbytes'])
+        shape = tuple(int(size) for size in entry['shape'][:int(entry['ndim'])])
+        arrays[entry['name'].decode('ascii')] = buffer[offset:offset + nbytes].view(np.dtype(entry['dtype'].decode('ascii'))).reshape(shape)
+    return header, arrays
+
+
+def get_dfgs_arrays(dfgs):
+    """
+    Get the count and ER term arrays of the DFGs of all clusters, by the names used in model files.
+
+    Parameters:
+    - dfgs (StackedDFGs): The DFGs.
+
+    Returns:
+    - dict: The arrays by name.
+    """
+    dfgs._resize()
+    arrays = {'activity_counts': dfgs.activity_counts, 'outgoing_counts': dfgs.outgoing_counts, 'node_terms': dfgs.node_terms,
+              'ER_sums': dfgs.ER_sums, 'occurrences': dfgs.occurrences, 'min_log_probs': dfgs.min_log_probs, 'source_mults': dfgs.source_multiplicities}
+    if dfgs.dense:
+        arrays['edge_counts'] = dfgs.edge_counts
+    else:
+        arrays['edge_keys'] = dfgs.edge_keys
+        arrays['edge_values'] = dfgs.edge_values
+    return arrays
+
+
+def get_dfgs_from_arrays(vocabulary, header, arrays):
+    """
+    Get the DFGs of all clusters from the arrays of 'get_dfgs_arrays', without copying them.
+
+    Parameters:
+    - vocabulary (Vocabulary): The vocabulary of the DFGs.
+    - header (numpy.void): The header, with num_clusters, num_activities and dense.
+    - arrays (dict): The arrays by name.
+
+    Returns:
+    - StackedDFGs: The DFGs, with the arrays as their counts.
+    """
+    dfgs = StackedDFGs.__new__(StackedDFGs)
+    dfgs.vocabulary = vocabulary
+    dfgs.dense = bool(header['dense'])
+    dfgs.num_clusters = int(header['num_clusters'])
+    dfgs.num_activities = int(header['num_activities'])
+    for name in ['activity_counts', 'outgoing_counts', 'node_terms', 'ER_sums', 'occurrences']:
+        setattr(dfgs, name, arrays[name])
+    dfgs.min_log_probs = arrays['min_log_probs']
+    dfgs.source_multiplicities = arrays['source_mults']
+    dfgs._insertion = None
+    if dfgs.dense:
+        dfgs.edge_counts = arrays['edge_counts']
+    else:
+        dfgs.edge_keys = arrays['edge_keys']
+        dfgs.edge_values = arrays['edge_values']
+    return dfgs
+
+
+def save_model(model, path):
+    """
+    Save a fitted EntropicClustering model: its vocabulary, the counts and ER terms of all cluster DFGs, the clustered variants
+    (encoded) with their cluster index, and the model parameters.
+
+    Parameters:
+    - model (EntropicClustering): The fitted model.
+    - path (str): The file to write.
+
+    Raises:
+    - ValueError: If the model was loaded read-only, without its clustered variants.
+    """
+    if model.clusters_ is None:
+        raise ValueError("The model was loaded read-only (load_model with mmap_mode='r') and can not be saved; load it with mmap_mode='c' or None.")
+    dfgs = model.dfgs_
+    variants = list(model.cluster_of_.keys())
+    encoded_variants = EncodedVariantLog.from_traces(variants, np.array([model.clusters_[model.cluster_of_[v]][v] for v in variants], dtype=np.int64),
+                                                     vocabulary=model.vocabulary_, add=False)
+    params = ['variant=' + model.variant, 'initialization=' + model.initialization, 'opt=' + model.opt, 'backend=' + model.backend,
+              'random_state=' + str(model.random_state), 'refine_passes=' + str(model.refine_passes)]
+    vocabulary_offsets, vocabulary_data = pack_strings(model.vocabulary_.activities)
+    params_offsets, params_data = pack_strings(params)
+    arrays = {'vocab_offsets': vocabulary_offsets, 'vocab_data': vocabulary_data, 'params_offsets': params_offsets, 'params_data': params_data}
+    arrays.update(get_dfgs_arrays(dfgs))
+    arrays.update({'variant_buffer': encoded_variants.buffer, 'variant_offsets': encoded_variants.offsets, 'variant_counts': encoded_variants.counts,
+                   'variant_labels': np.array([model.cluster_of_[v] for v in variants], dtype=np.int64)})
+    write_arrays(path, arrays, num_clusters=dfgs.num_clusters, num_activities=dfgs.num_activities, dense=dfgs.dense)
+
+
+def load_model(path, mmap_mode='r'):
+    """
+    Load a model saved with 'save_model'. The count arrays are views on a memory map of the file.
+    With mmap_mode='r' the model is read-only and meant for scoring: 'predict' works right away, and the clusters are not rebuilt as
+    variant logs (clusters_ and cluster_of_ are None), so 'partial_fit' and 'save_model' raise a ValueError. With mmap_mode='c' or None
+    the clusters are rebuilt from the stored variants and the model can be updated with 'partial_fit' (with 'c', changes stay in memory
+    and are not written to the file).
+
+    Parameters:
+    - path (str): The file to read.
+    - mmap_mode (str, optional): 'r' (read-only), 'c' (copy-on-write) or None (read the file into memory). Defaults to 'r'.
+
+    Returns:
+    - EntropicClustering: The fitted model.
+    """
+    header, arrays = read_arrays(path, mmap_mode=mmap_mode)
+    params = dict(param.split('=', 1) for param in unpack_strings(arrays['params_offsets'], arrays['params_data']))
+    model = EntropicClustering(int(header['num_clusters']), variant=params['variant'], initialization=params['initialization'], opt=params['opt'],
+                               backend=params['backend'], random_state=None if params['random_state'] == 'None' else int(params['random_state']),
+                               refine_passes=int(params['refine_passes']))
+    model.vocabulary_ = Vocabulary(unpack_strings(arrays['vocab_offsets'], arrays['vocab_data'])[2:])
+    dfgs = get_dfgs_from_arrays(model.vocabulary_, header, arrays)
+    model.dfgs_ = dfgs
+    model.clusters_ = None
+    model.cluster_of_ = None
+    if mmap_mode != 'r':
+        encoded_variants = EncodedVariantLog(model.vocabulary_, arrays['variant_buffer'], arrays['variant_offsets'], arrays['variant_counts'])
+        model.clusters_ = [{} for _ in range(dfgs.num_clusters)]
+        model.cluster_of_ = {}
+        for i, k in enumerate(arrays['variant_labels']):
+            variant = encoded_variants.variant(i)
+            model.clusters_[k][variant] = int(encoded_variants.counts[i])
+            model.cluster_of_[variant] = int(k)
+    return model
@@ -0,0 +1,271 @@
+import argparse
+import collections
+import json
+import queue
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from entroclus import serialization as serialization
+
+
+class ScoringStats:
+    """
+    Latency and throughput counters of the scoring service. Latencies are kept for the most recent requests only.
+
+    Parameters:
+    - window (int, optional): The number of recent request latencies used for the percentiles. Defaults to 10000.
+    """
+    def __init__(self, window=10000):
+        self.lock = threading.Lock()
+        self.start_time = time.perf_counter()
+        self.requests = 0
+        self.traces = 0
+        self.batches = 0
+        self.batched_traces = 0
+        self.errors = 0
+        self.latencies = collections.deque(maxlen=window)
+
+    def add_request(self, num_traces, latency):
+        with self.lock:
+            self.requests += 1
+            self.traces += num_traces
+            self.latencies.append(latency)
+
+    def add_batch(self, num_traces):
+        with self.lock:
+            self.batches += 1
+            self.batched_traces += num_traces
+
+    def add_error(self):
+        with self.lock:
+            self.errors += 1
+
+    def get_stats(self):
+        """
+        Get all counters, the throughput since the start and the latency percentiles (in milliseconds) of the recent requests.
+
+        Returns:
+        - dict: The statistics.
+        """
+        with self.lock:
+            latencies = np.array(self.latencies, dtype=np.float64) * 1000
+            elapsed = time.perf_counter() - self.start_time
+            stats = {'requests': self.requests, 'traces': self.traces, 'batches': self.batches, 'errors': self.errors,
+                     'mean_batch_size': self.batched_traces / self.batches if self.batches > 0 else 0.0,
+                     'requests_per_second': self.requests / elapsed, 'traces_per_second': self.traces / elapsed}
+        for percentile in [50, 90, 99]:
+            stats['latency_p' + str(percentile) + '_ms'] = float(np.percentile(latencies, percentile)) if len(latencies) > 0 else 0.0
+        return stats
+
+
+class MicroBatcher:
+    """
+    Groups the traces of concurrent requests into micro-batches that are scored together with 'EntropicClustering.predict_ER', so the
+    fixed cost of a vectorized scoring call is shared by all requests in the batch. A batch is scored as soon as it holds max_batch_size
+    traces, or max_wait seconds after its first request arrived.
+
+    Parameters:
+    - model (EntropicClustering): The fitted model.
+    - max_batch_size (int, optional): The maximal number of traces in a batch. Defaults to 256.
+    - max_wait (float, optional): The maximal time in seconds a request waits for others to join its batch. Defaults to 0.0005.
+    - stats (ScoringStats, optional): The counters to update. Defaults to None (new counters).
+    """
+    def __init__(self, model, max_batch_size=256, max_wait=0.0005, stats=None):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.stats = stats if stats is not None else ScoringStats()
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def submit(self, traces):
+        """
+        Score traces and wait for the result.
+
+        Parameters:
+        - traces (list): The traces (tuples of activities).
+
+        Returns:
+        - labels (numpy.ndarray): The cluster index of every trace.
+        - ERs (numpy.ndarray): The ER of every trace in its cluster.
+        """
+        request = {'traces': traces, 'done': threading.Event(), 'result': None, 'error': None}
+        self.queue.put(request)
+        request['done'].wait()
+        if request['error'] is not None:
+            raise request['error']
+        return request['result']
+
+    def close(self):
+        """
+        Stop the batching thread after the pending requests are scored.
+        """
+        self.queue.put(None)
+        self.thread.join()
+
+    def _run(self):
+        running = True
+        while running:
+            request = self.queue.get()
+            if request is None:
+                break
+            batch = [request]
+            size = len(request['traces'])
+            deadline = time.perf_counter() + self.max_wait
+            while size < self.max_batch_size:
+                try:
+                    request = self.queue.get(timeout=max(deadline - time.perf_counter(), 0.0))
+                except queue.Empty:
+                    break
+                if request is None:
+                    running = False
+                    break
+                batch.append(request)
+                size += len(request['traces'])
+            self._score(batch)
+
+    def _score(self, batch):
+        traces = [trace for request in batch for trace in request['traces']]
+        try:
+            labels, ERs = self.model.predict_ER(traces)
+        except Exception as error:
+            if len(batch) == 1:
+                batch[0]['error'] = error
+                batch[0]['done'].set()
+            else:
+                #score every request on its own, so one bad request does not fail the others in its batch
+                for request in batch:
+                    self._score([request])
+            return
+        self.stats.add_batch(len(traces))
+        start = 0
+        for request in batch:
+            end = start + len(request['traces'])
+            request['result'] = (labels[start:end], ERs[start:end])
+            request['done'].set()
+            start = end
+
+
+def get_traces(content):
+    """
+    Get the traces of the JSON body of a scoring request, checking that every trace is a list of activities (strings).
+
+    Parameters:
+    - content (dict): The parsed body, {"trace": [activities]} or {"traces": [[activities], ...]}.
+
+    Returns:
+    - traces (list): The traces (tuples of activities).
+    - single (bool): Whether the request holds a single trace.
+
+    Raises:
+    - ValueError: If the body does not hold a trace or a list of traces of strings.
+    """
+    if not isinstance(content, dict) or not ('trace' in content or 'traces' in content):
+        raise ValueError('the body has to be an object with a "trace" or a "traces" field')
+    single = 'trace' in content
+    traces = [content['trace']] if single else content['traces']
+    if not isinstance(traces, list):
+        raise ValueError('"traces" has to be a list of traces')
+    for trace in traces:
+        if not isinstance(trace, list) or not all(isinstance(activity, str) for activity in trace):
+            raise ValueError('every trace has to be a list of activities (strings)')
+    return [tuple(trace) for trace in traces], single
+
+
+class ScoringRequestHandler(BaseHTTPRequestHandler):
+    """
+    HTTP handler of the scoring service.
+    - POST /predict with a JSON body {"trace": [activities]} or {"traces": [[activities], ...]} returns the cluster and the ER of the
+      trace(s), as {"cluster": k, "ER": x} or a list of those. Malformed requests get status 400, without being batched.
+    - GET /stats returns the latency and throughput counters.
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def _send_json(self, status, content):
+        body = json.dumps(content).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == '/stats':
+            self._send_json(200, self.server.batcher.stats.get_stats())
+        else:
+            self._send_json(404, {'error': 'unknown path'})
+
+    def do_POST(self):
+        start = time.perf_counter()
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.path != '/predict':
+            self._send_json(404, {'error': 'unknown path'})
+            return
+        try:
+            traces, single = get_traces(json.loads(body))
+        except ValueError as error:
+            #also invalid JSON, json.JSONDecodeError is a ValueError
+            self.server.batcher.stats.add_error()
+            self._send_json(400, {'error': str(error)})
+            return
+        try:
+            labels, ERs = self.server.batcher.submit(traces)
+        except Exception as error:
+            self.server.batcher.stats.add_error()
+            self._send_json(500, {'error': str(error)})
+            return
+        results = [{'cluster': int(label), 'ER': float(ER)} for label, ER in zip(labels, ERs)]
+        self._send_json(200, results[0] if single else results)
+        self.server.batcher.stats.add_request(len(traces), time.perf_counter() - start)
+
+    def log_message(self, format, *args):
+        #no line per request, see /stats instead
+        pass
+
+
+def create_server(model_path, host='127.0.0.1', port=8000, max_batch_size=256, max_wait=0.0005):
+    """
+    Create the scoring service for a model saved with 'serialization.save_model'. The model is memory-mapped read-only.
+
+    Parameters:
+    - model_path (str): The model file.
+    - host (str, optional): The address to listen on. Defaults to '127.0.0.1'.
+    - port (int, optional): The port to listen on. Defaults to 8000.
+    - max_batch_size (int, optional): The maximal number of traces in a micro-batch. Defaults to 256.
+    - max_wait (float, optional): The maximal time in seconds a request waits for others to join its batch. Defaults to 0.0005.
+
+    Returns:
+    - ThreadingHTTPServer: The server, with the micro-batcher as its 'batcher' attribute. Start it with serve_forever().
+    """
+    model = serialization.load_model(model_path)
+    server = ThreadingHTTPServer((host, port), ScoringRequestHandler)
+    server.daemon_threads = True
+    server.batcher = MicroBatcher(model, max_batch_size=max_batch_size, max_wait=max_wait)
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve a fitted entropic clustering model: assign traces to the cluster with the lowest ER.')
+    parser.add_argument('model', help='model file written by entroclus.serialization.save_model')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--max-batch-size', type=int, default=256)
+    parser.add_argument('--max-wait-ms', type=float, default=0.5)
+    args = parser.parse_args()
+    server = create_server(args.model, host=args.host, port=args.port, max_batch_size=args.max_batch_size, max_wait=args.max_wait_ms / 1000)
+    print("serving", args.model, "on", args.host + ":" + str(args.port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.batcher.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,247 @@
+import os
+import sys
+import tempfile
+import weakref
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas
+
+from entroclus import serialization as serialization
+from entroclus.encoding import Vocabulary, EncodedVariantLog
+
+#A store is one block of named arrays in the format of 'serialization.write_arrays', published either as a shared memory block
+#(backend 'shared_memory') or as a file that every process memory-maps (backend 'file'). The process that publishes the store owns it
+#and removes it when the store is closed, garbage collected or the interpreter exits. If the owner crashes, shared memory blocks are
+#removed by the resource tracker of multiprocessing (a separate process), and files are removed by the next store created in the same
+#directory, as their name holds the process id of their owner.
+FILE_PREFIX = 'entroclus-'
+FILE_SUFFIX = '.store'
+
+
+def _unlink(backend, name, shm):
+    if backend == 'shared_memory':
+        shm.close()
+        shm.unlink()
+    elif os.path.exists(name):
+        os.remove(name)
+
+
+def _is_running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def remove_stale_files(directory=None):
+    """
+    Remove the store files left behind by owners that are no longer running.
+
+    Parameters:
+    - directory (str, optional): The directory of the files. Defaults to None (the temporary directory).
+
+    Returns:
+    - int: The number of removed files.
+    """
+    directory = tempfile.gettempdir() if directory is None else directory
+    removed = 0
+    for name in os.listdir(directory):
+        if not (name.startswith(FILE_PREFIX) and name.endswith(FILE_SUFFIX)):
+            continue
+        pid = name[len(FILE_PREFIX):].split('-', 1)[0]
+        if pid.isdigit() and not _is_running(int(pid)):
+            try:
+                os.remove(os.path.join(directory, name))
+                removed += 1
+            except FileNotFoundError:
+                #removed by another process in the meantime
+                pass
+    return removed
+
+
+class StoreHandle:
+    """
+    A small, picklable reference to a published store, passed to worker processes (e.g. as initializer argument of a process pool)
+    instead of the arrays themselves.
+
+    Parameters:
+    - backend (str): 'shared_memory' or 'file'.
+    - name (str): The name of the shared memory block, or the path of the file.
+    """
+    def __init__(self, backend, name):
+        self.backend = backend
+        self.name = name
+
+    def attach(self):
+        """
+        Attach to the store, without copying it.
+
+        Returns:
+        - AttachedStore: The attached store.
+        """
+        return AttachedStore(self)
+
+
+class SharedStore:
+    """
+    Named arrays published to other processes, owned by the process that created the store. Use it as a context manager, or call
+    'close', to remove it; it is also removed when it is garbage collected and when the interpreter exits.
+
+    Parameters:
+    - arrays (dict): The arrays by name (at most 16 ASCII characters, at most 3 dimensions).
+    - num_clusters (int, optional): The number of clusters, stored in the header. Defaults to 0.
+    - num_activities (int, optional): The number of activities, stored in the header. Defaults to 0.
+    - dense (bool, optional): Whether the edge counts are stored densely, stored in the header. Defaults to False.
+    - backend (str, optional): 'shared_memory' or 'file' (a memory-mapped temporary file). Defaults to 'shared_memory'.
+    - directory (str, optional): The directory of the file (backend 'file'). Defaults to None (the temporary directory).
+
+    Attributes:
+    - handle (StoreHandle): The handle workers attach to.
+    - size (int): The size of the store in bytes.
+    """
+    def __init__(self, arrays, num_clusters=0, num_activities=0, dense=False, backend='shared_memory', directory=None):
+        arrays, header, table, self.size = serialization.get_layout(arrays, num_clusters=num_clusters, num_activities=num_activities, dense=dense)
+        shm = None
+        if backend == 'shared_memory':
+            shm = shared_memory.SharedMemory(create=True, size=max(self.size, 1))
+            name = shm.name
+            try:
+                serialization.write_arrays_to_buffer(np.frombuffer(shm.buf, dtype=np.uint8), arrays, header, table)
+            except BaseException:
+                _unlink(backend, name, shm)
+                raise
+        elif backend == 'file':
+            directory = tempfile.gettempdir() if directory is None else directory
+            remove_stale_files(directory)
+            handle, name = tempfile.mkstemp(prefix=FILE_PREFIX + str(os.getpid()) + '-', suffix=FILE_SUFFIX, dir=directory)
+            os.close(handle)
+            try:
+                serialization.write_arrays(name, arrays, num_clusters=num_clusters, num_activities=num_activities, dense=dense)
+            except BaseException:
+                os.remove(name)
+                raise
+        else:
+            raise ValueError("Backend has to be 'shared_memory' or 'file'.")
+        self.handle = StoreHandle(backend, name)
+        #runs once: on 'close', on garbage collection or at exit
+        self._finalizer = weakref.finalize(self, _unlink, backend, name, shm)
+
+    def close(self):
+        """
+        Remove the store. Processes that are still attached keep their views until they detach.
+        """
+        self._finalizer()
+
+    @property
+    def closed(self):
+        return not self._finalizer.alive
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class AttachedStore:
+    """
+    A store attached to by a (worker) process. The arrays are read-only views on the shared memory block or on the memory map of the
+    file, so attaching costs only the parsing of the header, whatever the size of the store. Call 'close' (or use it as a context manager)
+    to detach; the views must not be used after that.
+
+    Parameters:
+    - handle (StoreHandle): The handle of the store.
+
+    Attributes:
+    - header (numpy.void): The header, with num_clusters, num_activities and dense.
+    - arrays (dict): The arrays by name.
+    """
+    def __init__(self, handle):
+        self._shm = None
+        if handle.backend == 'shared_memory':
+            if sys.version_info >= (3, 13):
+                #the owner is responsible for removing the block
+                self._shm = shared_memory.SharedMemory(name=handle.name, track=False)
+            else:
+                self._shm = shared_memory.SharedMemory(name=handle.name)
+            buffer = np.frombuffer(self._shm.buf, dtype=np.uint8)
+        elif handle.backend == 'file':
+            buffer = np.memmap(handle.name, dtype=np.uint8, mode='r')
+        else:
+            raise ValueError("Backend has to be 'shared_memory' or 'file'.")
+        buffer.flags.writeable = False
+        self.header, self.arrays = serialization.parse_arrays(buffer, handle.name)
+
+    def close(self):
+        """
+        Detach from the store.
+        """
+        self.header, self.arrays = None, {}
+        if self._shm is not None:
+            try:
+                self._shm.close()
+            except BufferError:
+                raise ValueError("The store can not be detached while views on it are still in use.")
+            self._shm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def publish_variant_log(encoded_log, case_variants=None, dfgs=None, backend='shared_memory', directory=None):
+    """
+    Publish an encoded variant log, and optionally its case to variant map and the DFGs of its clusters, for worker processes.
+
+    Parameters:
+    - encoded_log (EncodedVariantLog): The encoded variant log (with string activities).
+    - case_variants (pandas.Series, optional): The index of the variant of every case, indexed by case id. Defaults to None.
+    - dfgs (StackedDFGs, optional): The DFGs of the clusters, e.g. of a fitted 'model.EntropicClustering'. Defaults to None.
+    - backend (str, optional): 'shared_memory' or 'file'. Defaults to 'shared_memory'.
+    - directory (str, optional): The directory of the file (backend 'file'). Defaults to None (the temporary directory).
+
+    Returns:
+    - SharedStore: The store, owned by the calling process.
+    """
+    vocabulary_offsets, vocabulary_data = serialization.pack_strings(encoded_log.vocabulary.activities)
+    arrays = {'vocab_offsets': vocabulary_offsets, 'vocab_data': vocabulary_data,
+              'buffer': encoded_log.buffer, 'offsets': encoded_log.offsets, 'counts': encoded_log.counts}
+    if case_variants is not None:
+        case_offsets, case_data = serialization.pack_strings([str(case_id) for case_id in case_variants.index])
+        arrays.update({'case_offsets': case_offsets, 'case_data': case_data, 'case_variants': case_variants.to_numpy(dtype=np.int64)})
+    num_clusters, dense = 0, False
+    if dfgs is not None:
+        arrays.update(serialization.get_dfgs_arrays(dfgs))
+        num_clusters, dense = dfgs.num_clusters, dfgs.dense
+    return SharedStore(arrays, num_clusters=num_clusters, num_activities=len(encoded_log.vocabulary), dense=dense, backend=backend, directory=directory)
+
+
+def attach_variant_log(attached):
+    """
+    Get the encoded variant log, case to variant map and DFGs of an attached store made by 'publish_variant_log', as views on the store.
+
+    Parameters:
+    - attached (AttachedStore): The attached store, which has to stay attached while they are used.
+
+    Returns:
+    - encoded_log (EncodedVariantLog): The encoded variant log.
+    - case_variants (pandas.Series): The index of the variant of every case, indexed by case id (None if not published).
+    - dfgs (StackedDFGs): The (read-only) DFGs of the clusters (None if not published).
+    """
+    arrays = attached.arrays
+    vocabulary = Vocabulary(serialization.unpack_strings(arrays['vocab_offsets'], arrays['vocab_data'])[2:])
+    encoded_log = EncodedVariantLog(vocabulary, arrays['buffer'], arrays['offsets'], arrays['counts'])
+    case_variants = None
+    if 'case_variants' in arrays:
+        case_ids = serialization.unpack_strings(arrays['case_offsets'], arrays['case_data'])
+        case_variants = pandas.Series(arrays['case_variants'], index=case_ids, name='variant')
+    dfgs = None
+    if 'occurrences' in arrays:
+        dfgs = serialization.get_dfgs_from_arrays(vocabulary, attached.header, arrays)
+    return encoded_log, case_variants, dfgs
@@ -0,0 +1,170 @@
+import heapq
+
+import numpy as np
+
+from entroclus import utils as utils
+from entroclus import entropic_relevance as entropic_relevance
+from entroclus import entropic_clustering_variants as entropic_clustering_variants
+from entroclus.encoding import EncodedVariantLog
+
+
+class SplitTreeNode:
+    """
+    A node of a split tree: a cluster together with its Entropic Relevance (ER) on the DFG discovered from it. The DFG itself is only
+    discovered when it is asked for.
+
+    Parameters:
+    - cluster (dict): A variant log dictionary representing the cluster.
+    - parent (SplitTreeNode, optional): The node this cluster was split from. None for the root.
+    - indices (numpy.ndarray, optional): The indices of the variants of the cluster in the encoded variant log of the tree (backend 
+      'encoded'). Defaults to None.
+
+    Attributes:
+    - ER (float): The ER of the cluster, set when the node is added to the tree. None for the root, which is always split.
+    """
+    def __init__(self, cluster, parent=None, indices=None):
+        self.cluster = cluster
+        self.parent = parent
+        self.indices = indices
+        self.children = []
+        self.ER = None
+        self._dfg = None
+
+    def get_dfg(self):
+        """
+        Get the DFG discovered from the cluster, as returned by 'utils.get_dfg'.
+
+        Returns:
+        - activity_counts (dict): The counts of every activity in the cluster.
+        - edge_counts (dict): The counts of every edge in the cluster.
+        """
+        if self._dfg is None:
+            self._dfg = utils.get_dfg(self.cluster)
+        return self._dfg
+
+    @property
+    def activity_counts(self):
+        return self.get_dfg()[0]
+
+    @property
+    def edge_counts(self):
+        return self.get_dfg()[1]
+
+
+class SplitTree:
+    """
+    The binary split tree of the hierarchical (split) variant of entropic clustering, built once up to a maximal number of clusters.
+    The root holds the whole variant log. Like 'entropic_clustering_variants.entropic_clustering_split_VL', the leaf with the highest
+    ER is split in two with 'entropic_clustering_VL' until there are max_clusters leaves, and the splits are recorded in order. Since the
+    clusterings for increasing k are nested, the clustering for any k up to max_clusters is obtained by replaying the first k-1 splits,
+    without clustering again. With the same random state, cut(k) gives the same clusters as 'entropic_clustering_split_VL' with k clusters.
+    With backend 'encoded' the variant log is encoded once, and every node is a subset of variant indices into it, like in 
+    'entropic_clustering_variants.split_clusters_encoded'.
+
+    Parameters:
+    - variant_log (dict): The variant log to be clustered.
+    - max_clusters (int): The maximal number of clusters.
+    - initialization (str, optional): The initialization method for selecting initial seeds. Defaults to '++'.
+    - opt (str, optional): The optimization method for calculating ER. Can be 'full_cluster', 'full_cluster_exact' or 'trace'. Defaults to 'trace'.
+    - backend (str, optional): The DFG implementation to use, 'dict' or 'encoded'. Defaults to 'dict'.
+    - rng (random.Random, optional): The random number generator used for the initialization. Defaults to None (the random module).
+
+    Attributes:
+    - encoded_log (EncodedVariantLog): The encoded variant log shared by all nodes (backend 'encoded'), None otherwise.
+    """
+    def __init__(self, variant_log, max_clusters, initialization='++', opt='trace', backend='dict', rng=None):
+        self.max_clusters = max_clusters
+        self.initialization = initialization
+        self.opt = opt
+        self.backend = backend
+        self.rng = rng
+        self.encoded_log = None
+        if backend == 'encoded':
+            self.encoded_log = EncodedVariantLog.from_variant_log(variant_log)
+            self._variants = list(variant_log)
+            self.root = SplitTreeNode(variant_log, indices=np.arange(len(self.encoded_log)))
+        else:
+            self.root = SplitTreeNode(variant_log)
+        #the split nodes, in the order they were split
+        self.splits = []
+        if max_clusters < 2:
+            return
+        #heap entries are (-ER, age, node), the age breaks ties in favour of the oldest leaf like 'entropic_clustering_variants.split_clusters'.
+        #The root is split first whatever its ER, so it is not scored.
+        heap = []
+        age = 0
+        node = self.root
+        while True:
+            for child in self._split(node):
+                node.children.append(child)
+                heapq.heappush(heap, (-child.ER, age, child))
+                age += 1
+            self.splits.append(node)
+            if len(heap) >= max_clusters:
+                break
+            _, _, node = heapq.heappop(heap)
+
+    def _split(self, node):
+        #cluster the node in two and score both children
+        if self.encoded_log is None:
+            children = [SplitTreeNode(c, parent=node) for c in entropic_clustering_variants.entropic_clustering_VL(node.cluster, 2, self.initialization, self.opt, self.backend, self.rng)]
+            for child in children:
+                child.ER = entropic_relevance.get_ER(child.cluster, *child.get_dfg())
+            return children
+        #the root is the whole encoded log, other nodes are gathered into a compact encoded log of their own
+        encoded_log = self.encoded_log if node is self.root else self.encoded_log.subset(node.indices)
+        children = []
+        for c in entropic_clustering_variants.entropic_clustering_encoded(encoded_log, 2, self.initialization, self.opt, self.rng):
+            indices = node.indices[c]
+            child = SplitTreeNode(self.encoded_log.to_variant_logs([indices], variants=self._variants)[0], parent=node, indices=indices)
+            child.ER = entropic_clustering_variants.get_cluster_ER_encoded(self.encoded_log, indices)
+            children.append(child)
+        return children
+
+    @classmethod
+    def from_log(cls, log, max_clusters, initialization='++', opt='trace', backend='dict', rng=None):
+        """
+        Build the split tree of an event log.
+
+        Parameters:
+        - log (pm4py.objects.log.obj.EventLog): The event log to be clustered.
+        - max_clusters (int): The maximal number of clusters.
+        - initialization (str, optional): The initialization method for selecting initial seeds. Defaults to '++'.
+        - opt (str, optional): The optimization method for calculating ER. Defaults to 'trace'.
+        - backend (str, optional): The DFG implementation to use. Defaults to 'dict'.
+        - rng (random.Random, optional): The random number generator used for the initialization. Defaults to None.
+
+        Returns:
+        - SplitTree: The split tree of the variant log of the event log.
+        """
+        return cls(utils.get_variant_log(log), max_clusters, initialization=initialization, opt=opt, backend=backend, rng=rng)
+
+    def get_leaves(self, num_clusters):
+        """
+        Get the nodes of the clustering with num_clusters clusters, in the order 'entropic_clustering_split_VL' returns them.
+
+        Parameters:
+        - num_clusters (int): The number of clusters, between 1 and max_clusters.
+
+        Returns:
+        - list: The SplitTreeNode of every cluster, with its ER (None for the root).
+        """
+        if not 1 <= num_clusters <= self.max_clusters:
+            raise ValueError("num_clusters has to be between 1 and " + str(self.max_clusters))
+        nodes = [self.root]
+        for node in self.splits[:num_clusters - 1]:
+            nodes.remove(node)
+            nodes.extend(node.children)
+        return nodes
+
+    def cut(self, num_clusters):
+        """
+        Get the clustering with num_clusters clusters.
+
+        Parameters:
+        - num_clusters (int): The number of clusters, between 1 and max_clusters.
+
+        Returns:
+        - list: A list of clusters, where each cluster is a dictionary containing variants and their occurrences.
+        """
+        return [node.cluster for node in self.get_leaves(num_clusters)]
@@ -0,0 +1,176 @@
+import numpy as np
+
+from entroclus.encoding import BOS_ID, EncodedVariantLog
+from entroclus.encoded_dfg import StackedDFGs
+
+
+class VariantTrie:
+    """
+    A variant log stored as a prefix trie over encoded activities. The root is the start marker (BOS), every node is a prefix of one or
+    more variants and every variant ends in its own end marker (EOS) node. Nodes keep how many traces pass through them, so the trie
+    holds the same information as the variant log while every shared prefix is stored, and scored, only once.
+
+    The nodes are stored in arrays: node i is reached from parents[i] with activity activities[i], at depth depths[i] (the root has
+    depth 0), and counts[i] traces pass through it. Parents always have a lower index than their children.
+
+    Parameters:
+    - vocabulary (Vocabulary): The vocabulary of the activities.
+    - parents (numpy.ndarray): The parent of every node (-1 for the root).
+    - activities (numpy.ndarray): The activity id of every node.
+    - depths (numpy.ndarray): The depth of every node.
+    - counts (numpy.ndarray): The number of traces passing through every node.
+    - variant_nodes (numpy.ndarray): The end marker node of every variant, in the order of the variant log.
+    """
+    def __init__(self, vocabulary, parents, activities, depths, counts, variant_nodes):
+        self.vocabulary = vocabulary
+        self.parents = np.asarray(parents, dtype=np.int64)
+        self.activities = np.asarray(activities, dtype=np.int32)
+        self.depths = np.asarray(depths, dtype=np.int64)
+        self.counts = np.asarray(counts, dtype=np.int64)
+        self.variant_nodes = np.asarray(variant_nodes, dtype=np.int64)
+        #the nodes of every depth, so paths can be accumulated one level at a time
+        order = np.argsort(self.depths, kind='stable')
+        self.levels = np.split(order, np.flatnonzero(np.diff(self.depths[order])) + 1)
+
+    @classmethod
+    def from_encoded_log(cls, encoded_log):
+        """
+        Build the trie of an encoded variant log.
+
+        Parameters:
+        - encoded_log (EncodedVariantLog): The encoded variant log.
+
+        Returns:
+        - VariantTrie: The trie, with the variants in the order of the encoded log.
+        """
+        children = {}
+        parents, activities, depths, counts = [-1], [BOS_ID], [0], [0]
+        variant_nodes = np.zeros(len(encoded_log), dtype=np.int64)
+        for i in range(len(encoded_log)):
+            occurrence = int(encoded_log.counts[i])
+            node = 0
+            counts[0] += occurrence
+            for activity in encoded_log.trace_ids(i)[1:].tolist():
+                child = children.get((node, activity))
+                if child is None:
+                    child = len(parents)
+                    children[(node, activity)] = child
+                    parents.append(node)
+                    activities.append(activity)
+                    depths.append(depths[node] + 1)
+                    counts.append(0)
+                counts[child] += occurrence
+                node = child
+            variant_nodes[i] = node
+        return cls(encoded_log.vocabulary, parents, activities, depths, counts, variant_nodes)
+
+    @classmethod
+    def from_variant_log(cls, variant_log, vocabulary=None):
+        """
+        Build the trie of a variant log dictionary.
+
+        Parameters:
+        - variant_log (dict): A dictionary where the keys are variants (tuples of activities) and the values are their occurrences.
+        - vocabulary (Vocabulary, optional): The vocabulary to use and extend. A new one is created if None.
+
+        Returns:
+        - VariantTrie: The trie, with the variants in the order of the dictionary.
+        """
+        return cls.from_encoded_log(EncodedVariantLog.from_variant_log(variant_log, vocabulary))
+
+    def __len__(self):
+        return len(self.parents)
+
+    def get_variant_counts(self):
+        """
+        Return the occurrences of every variant.
+        """
+        return self.counts[self.variant_nodes]
+
+    def get_transition_log_probabilities(self, dfg):
+        """
+        Get the log2 probability of the transition into every node (from the activity of its parent) under a DFG, once per node.
+
+        Parameters:
+        - dfg (EncodedDFG or StackedDFGs): The DFG, or the DFGs of all clusters.
+
+        Returns:
+        - numpy.ndarray: The log2 probability of the transition into every node (0 for the root), or a (k x nodes) matrix for StackedDFGs.
+        """
+        src = self.activities[np.maximum(self.parents, 0)]
+        dst = self.activities
+        if self.vocabulary is not dfg.vocabulary:
+            mapping = self.vocabulary.get_mapping(dfg.vocabulary)
+            src, dst = mapping[src], mapping[dst]
+        edge_counts = dfg.get_edge_counts(src, dst)
+        outgoing_counts = dfg.get_outgoing_counts(src)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            log_probs = np.log2(edge_counts) - np.log2(outgoing_counts)
+        #no outgoing edges means probability 0, like in utils.get_probability
+        log_probs[outgoing_counts == 0] = -np.inf
+        log_probs[..., 0] = 0.0
+        return log_probs
+
+    def get_prefix_log_probabilities(self, dfg):
+        """
+        Get the log2 probability of the prefix of every node under a DFG, by accumulating the transition log probabilities from the root,
+        one level of the trie at a time.
+
+        Parameters:
+        - dfg (EncodedDFG or StackedDFGs): The DFG, or the DFGs of all clusters.
+
+        Returns:
+        - numpy.ndarray: The log2 probability of every prefix, or a (k x nodes) matrix for StackedDFGs.
+        """
+        prefix_log_probs = self.get_transition_log_probabilities(dfg)
+        for level in self.levels[1:]:
+            prefix_log_probs[..., level] += prefix_log_probs[..., self.parents[level]]
+        return prefix_log_probs
+
+    def get_ER_batch(self, dfg, min_prob=None):
+        """
+        Calculate the Entropic Relevance (ER) of every variant on a DFG, with every shared prefix scored once. Gives the same values as
+        'entropic_relevance.get_ER_batch'.
+
+        Parameters:
+        - dfg (EncodedDFG or StackedDFGs): The DFG, or the DFGs of all clusters.
+        - min_prob (float, optional): Lower bound on the trace probabilities, as used by 'get_ER' (1e-10). If None, the exact ER is returned,
+          which is infinite for traces the DFG can not replay. Defaults to None.
+
+        Returns:
+        - ER_variants (numpy.ndarray): The ER of every variant (a (k x variants) matrix for StackedDFGs).
+        - ER (float or numpy.ndarray): The average ER over all traces in the log (per cluster for StackedDFGs).
+        - ER_sum (float or numpy.ndarray): The total ER over all traces in the log (per cluster for StackedDFGs).
+        """
+        ER_variants = -self.get_prefix_log_probabilities(dfg)[..., self.variant_nodes]
+        if min_prob is not None:
+            ER_variants = np.minimum(ER_variants, -np.log2(min_prob))
+        variant_counts = self.get_variant_counts()
+        ER_sum = ER_variants @ variant_counts.astype(np.float64)
+        ER = ER_sum/float(variant_counts.sum())
+        if not isinstance(dfg, StackedDFGs):
+            ER, ER_sum = float(ER), float(ER_sum)
+        return ER_variants, ER, ER_sum
+
+    def get_stats(self):
+        """
+        Get statistics of the variant log, without passing over the traces: the case lengths follow from the depths of the end nodes.
+
+        Returns:
+        - dict: The number of cases, variants and distinct activities, the average, minimal and maximal case length, the number of trie
+          nodes, and the number of events of the variants per activity node of the trie (how much the variants share their prefixes).
+        """
+        variant_counts = self.get_variant_counts()
+        #the end marker node of a variant of length l has depth l+1
+        lengths = self.depths[self.variant_nodes] - 1
+        num_cases = int(variant_counts.sum())
+        num_events = int(lengths @ variant_counts)
+        num_activity_nodes = len(self) - 1 - len(np.unique(self.variant_nodes))
+        return {'num_cases': num_cases,
+                'num_variants': len(self.variant_nodes),
+                'vocabulary_size': len(np.unique(self.activities[self.depths > 0])) - 1,
+                'average_case_length': num_events / num_cases,
+                'minimum_case_length': int(lengths.min()),
+                'maximum_case_length': int(lengths.max()),
+                'num_nodes': len(self),
+                'variant_events_per_node': int(lengths.sum()) / max(num_activity_nodes, 1)}
@@ -1,21 +1,35 @@
 import networkx as nx
+import numpy as np
+import pandas
 import pm4py
 import copy
 from collections import defaultdict
 
+from entroclus.encoded_dfg import EncodedDFG
+from entroclus.encoding import EncodedVariantLog
 
-def get_variant_log(log, order=True):
+
+def get_variant_log(log, order=True, cache_dir=None):
     """
-    Get the variants of a given event log, together with the occurences.
+    Get the variants of a given event log, together with the occurences. Pandas event logs are handled by the vectorized
+    'EncodedVariantLog.from_dataframe', other logs by pm4py. The path of an XES file is streamed with 'xes.read_variant_log', through
+    the cache of 'variant_cache.load_variant_log' if a cache directory is given.
 
     Parameters:
-    - log (pm4py.objects.log.obj.EventLog): The event log for which to compute the variants.
+    - log (pandas.DataFrame, pm4py.objects.log.obj.EventLog or str): The event log for which to compute the variants, or the path of an XES file.
     - order (bool, optional): Whether to order the variants by frequency. Defaults to True.
+    - cache_dir (str, optional): The variant log cache directory, only used for paths. Defaults to None (no caching).
 
     Returns:
     - dict: A dictionary where the keys are the variant/trace tuples and the values are their frequencies.
 
     """
+    if isinstance(log, str):
+        #imported here, as variant_cache depends (through serialization and model) on this module
+        from entroclus import variant_cache as variant_cache
+        return variant_cache.load_variant_log(log, cache_dir=cache_dir, order=order)[0].to_variant_log()
+    if isinstance(log, pandas.DataFrame):
+        return EncodedVariantLog.from_dataframe(log, order=order)[0].to_variant_log()
     variants = pm4py.stats.get_variants_as_tuples(log)
     if order == True:
         return dict(sorted(variants.items(), key=lambda x: x[1], reverse=True))
@@ -62,7 +76,22 @@ def get_dfg(variant_log):
     
     return dict(activity_counts), dict(edge_counts)
 
-def update_dfg(activity_counts, edge_counts, new_trace, occurrence):
+def get_outgoing_counts(edge_counts):
+    """
+    Calculate the total count of the outgoing edges of every activity in a DFG.
+
+    Parameters:
+    - edge_counts (dict): A dictionary containing the counts of each edge in the DFG.
+
+    Returns:
+    - outgoing_counts (dict): A dictionary where the keys are the source activities and the values the sum of the counts of their outgoing edges.
+    """
+    outgoing_counts = defaultdict(int)
+    for (current_activity, next_activity), count in edge_counts.items():
+        outgoing_counts[current_activity] += count
+    return dict(outgoing_counts)
+
+def update_dfg(activity_counts, edge_counts, new_trace, occurrence, outgoing_counts=None):
     """
     Update the Directly-Follows Graph (DFG) with a new trace.
 
@@ -71,6 +100,7 @@ def update_dfg(activity_counts, edge_counts, new_trace, occurrence):
     - edge_counts (defaultdict): A dictionary containing the counts of each edge in the DFG.
     - new_trace (tuple): The new trace to be added to the DFG.
     - occurrence (int): The number of times the new trace occurred.
+    - outgoing_counts (dict, optional): The outgoing totals of the DFG (see 'get_outgoing_counts'). If given, they are updated as well.
 
     Returns:
     - activity_counts (defaultdict): The updated activity counts after adding the new trace.
@@ -90,31 +120,78 @@ def update_dfg(activity_counts, edge_counts, new_trace, occurrence):
             edge_counts[(current_activity, next_activity)] = occurrence
         else:
             edge_counts[(current_activity, next_activity)] += occurrence
+        if outgoing_counts is not None:
+            outgoing_counts[current_activity] = outgoing_counts.get(current_activity, 0) + occurrence
 
     #add end count
     activity_counts[new_trace_with_start_end[-1]] += occurrence
 
     return activity_counts, edge_counts
 
-def get_probability(activity_counts, edge_counts, trace):
+def downdate_dfg(activity_counts, edge_counts, old_trace, occurrence, outgoing_counts=None):
+    """
+    Remove a trace from the Directly-Follows Graph (DFG), the inverse of 'update_dfg'. Activities and edges whose count drops to 0 are
+    removed, so the result is the same as the DFG discovered from the log without the trace.
+
+    Parameters:
+    - activity_counts (dict): A dictionary containing the counts of each activity in the DFG.
+    - edge_counts (dict): A dictionary containing the counts of each edge in the DFG.
+    - old_trace (tuple): The trace to be removed from the DFG. It has to be part of the log the DFG was discovered from.
+    - occurrence (int): The occurrence with which the trace was added.
+    - outgoing_counts (dict, optional): The outgoing totals of the DFG (see 'get_outgoing_counts'). If given, they are updated as well.
+
+    Returns:
+    - activity_counts (dict): The updated activity counts after removing the trace.
+    - edge_counts (dict): The updated edge counts after removing the trace.
+    """
+    old_trace_with_start_end = add_start_end(old_trace)
+    for i in range(len(old_trace_with_start_end) - 1):
+        current_activity = old_trace_with_start_end[i]
+        next_activity = old_trace_with_start_end[i + 1]
+        activity_counts[current_activity] -= occurrence
+        if activity_counts[current_activity] == 0:
+            del activity_counts[current_activity]
+        edge_counts[(current_activity, next_activity)] -= occurrence
+        if edge_counts[(current_activity, next_activity)] == 0:
+            del edge_counts[(current_activity, next_activity)]
+        if outgoing_counts is not None:
+            outgoing_counts[current_activity] -= occurrence
+            if outgoing_counts[current_activity] == 0:
+                del outgoing_counts[current_activity]
+
+    #remove end count
+    activity_counts[old_trace_with_start_end[-1]] -= occurrence
+    if activity_counts[old_trace_with_start_end[-1]] == 0:
+        del activity_counts[old_trace_with_start_end[-1]]
+
+    return activity_counts, edge_counts
+
+def get_probability(activity_counts, edge_counts, trace, outgoing_counts=None):
     """
     Calculate the probability of a given trace to be replayed by a graph.
 
     Parameters:
-    - activity_counts (dict): A dictionary containing the counts of each activity in the graph.
-    - edge_counts (dict): A dictionary containing the counts of each edge in the graph.
+    - activity_counts (dict or EncodedDFG): A dictionary containing the counts of each activity in the graph, or an array-backed DFG.
+    - edge_counts (dict): A dictionary containing the counts of each edge in the graph. Not used when activity_counts is an EncodedDFG.
     - trace (tuple): The trace for which the probability needs to be calculated.
+    - outgoing_counts (dict, optional): The outgoing totals of the graph (see 'get_outgoing_counts'). If not given, they are 
+      recomputed for every step, which costs a pass over the whole alphabet.
 
     Returns:
     - float: The probability of the given trace in the graph.
     """
+    if isinstance(activity_counts, EncodedDFG):
+        return activity_counts.get_probability(trace)
     total_probability = 1.0
     trace_with_start_end = add_start_end(trace)
     for i in range(len( trace_with_start_end) - 1): 
         current_activity =  trace_with_start_end[i]
         next_activity =  trace_with_start_end[i + 1]      
         # Calculate the probability of taking the edge from current_activity to next_activity
-        outgoing_edges = sum(edge_counts.get((current_activity, other_element), 0) for other_element in activity_counts.keys())
+        if outgoing_counts is not None:
+            outgoing_edges = outgoing_counts.get(current_activity, 0)
+        else:
+            outgoing_edges = sum(edge_counts.get((current_activity, other_element), 0) for other_element in activity_counts.keys())
         if outgoing_edges > 0:
             edge_probability = edge_counts.get((current_activity, next_activity), 0) / outgoing_edges
             total_probability *= edge_probability
@@ -124,6 +201,112 @@ def get_probability(activity_counts, edge_counts, trace):
             break
     return total_probability
 
+def get_edge_multiset(trace):
+    """
+    Count the edges and the outgoing steps of a single trace (with start and end markers added), i.e. the amounts by which 
+    'update_dfg' would increase the edge counts and outgoing totals of a DFG when adding the trace once.
+
+    Parameters:
+    - trace (tuple): The trace.
+
+    Returns:
+    - trace_edge_counts (dict): A dictionary where the keys are the edges of the trace and the values how often they occur in it.
+    - trace_outgoing_counts (dict): A dictionary where the keys are the source activities of the trace and the values how often they are followed by another activity.
+    """
+    trace_edge_counts = defaultdict(int)
+    trace_outgoing_counts = defaultdict(int)
+    trace_with_start_end = add_start_end(trace)
+    for i in range(len(trace_with_start_end) - 1):
+        trace_edge_counts[(trace_with_start_end[i], trace_with_start_end[i + 1])] += 1
+        trace_outgoing_counts[trace_with_start_end[i]] += 1
+    return dict(trace_edge_counts), dict(trace_outgoing_counts)
+
+def get_self_probability(trace):
+    """
+    Calculate the probability of a trace to be replayed by the dfg discovered from only that trace, i.e. 
+    get_probability(*get_dfg({trace: 1}), trace), in closed form from the edge multiset of the trace: every step contributes the number 
+    of times its edge occurs in the trace divided by the number of times its source activity is followed by another activity.
+    This is the maximal probability a dfg can give the trace, used for normalization in 'entropic_relevance.get_ER_normalized'.
+
+    Parameters:
+    - trace (tuple): The trace.
+
+    Returns:
+    - float: The probability of the trace on its own dfg.
+    """
+    trace_edge_counts, trace_outgoing_counts = get_edge_multiset(trace)
+    total_probability = 1.0
+    trace_with_start_end = add_start_end(trace)
+    for i in range(len(trace_with_start_end) - 1):
+        edge = (trace_with_start_end[i], trace_with_start_end[i + 1])
+        total_probability *= trace_edge_counts[edge] / trace_outgoing_counts[edge[0]]
+    return total_probability
+
+def get_probability_with_insertion(edge_counts, outgoing_counts, trace, new_trace_multisets, occurrence):
+    """
+    Calculate the probability of a trace to be replayed by a graph as if another trace had been added to it with 'update_dfg',
+    without copying or modifying the graph: the counts after insertion are the current counts plus the occurrence times the 
+    edge multiset of the inserted trace.
+
+    Parameters:
+    - edge_counts (dict): A dictionary containing the counts of each edge in the graph.
+    - outgoing_counts (dict): The outgoing totals of the graph (see 'get_outgoing_counts').
+    - trace (tuple): The trace for which the probability needs to be calculated.
+    - new_trace_multisets (tuple): The edge and outgoing multisets of the inserted trace, as returned by 'get_edge_multiset'.
+    - occurrence (int): The occurrence with which the trace is inserted.
+
+    Returns:
+    - float: The probability of the given trace in the graph after the insertion.
+    """
+    new_edge_counts, new_outgoing_counts = new_trace_multisets
+    total_probability = 1.0
+    trace_with_start_end = add_start_end(trace)
+    for i in range(len(trace_with_start_end) - 1):
+        current_activity = trace_with_start_end[i]
+        next_activity = trace_with_start_end[i + 1]
+        outgoing_edges = outgoing_counts.get(current_activity, 0) + occurrence * new_outgoing_counts.get(current_activity, 0)
+        if outgoing_edges > 0:
+            edge = (current_activity, next_activity)
+            total_probability *= (edge_counts.get(edge, 0) + occurrence * new_edge_counts.get(edge, 0)) / outgoing_edges
+        else:
+            total_probability = 0.0
+            break
+    return total_probability
+
+
+def get_probability_with_insertion_bounded(edge_counts, outgoing_counts, trace, new_trace_multisets, occurrence, min_probability):
+    """
+    Calculate the probability of a trace like 'get_probability_with_insertion', but stop as soon as the running probability drops below 
+    min_probability. Every step multiplies the probability with a factor of at most 1, so the final probability can only be lower than 
+    the running one: the trace can then not reach min_probability anymore and the remaining steps are skipped (branch-and-bound).
+
+    Parameters:
+    - edge_counts (dict): A dictionary containing the counts of each edge in the graph.
+    - outgoing_counts (dict): The outgoing totals of the graph (see 'get_outgoing_counts').
+    - trace (tuple): The trace for which the probability needs to be calculated.
+    - new_trace_multisets (tuple): The edge and outgoing multisets of the inserted trace, as returned by 'get_edge_multiset'.
+    - occurrence (int): The occurrence with which the trace is inserted.
+    - min_probability (float): The probability below which the evaluation is abandoned.
+
+    Returns:
+    - probability (float): The probability of the trace, or the running probability (an upper bound) if the evaluation was abandoned.
+    - steps (int): The number of steps that were evaluated.
+    """
+    new_edge_counts, new_outgoing_counts = new_trace_multisets
+    total_probability = 1.0
+    trace_with_start_end = add_start_end(trace)
+    for i in range(len(trace_with_start_end) - 1):
+        current_activity = trace_with_start_end[i]
+        next_activity = trace_with_start_end[i + 1]
+        outgoing_edges = outgoing_counts.get(current_activity, 0) + occurrence * new_outgoing_counts.get(current_activity, 0)
+        if outgoing_edges > 0:
+            edge = (current_activity, next_activity)
+            total_probability *= (edge_counts.get(edge, 0) + occurrence * new_edge_counts.get(edge, 0)) / outgoing_edges
+        else:
+            total_probability = 0.0
+        if total_probability < min_probability:
+            return total_probability, i + 1
+    return total_probability, len(trace_with_start_end) - 1
 
 
 import networkx as nx
@@ -178,3 +361,86 @@ def filter_log_with_vl(log, variantlog):
     variants = list(variantlog.keys())
     filtered = pm4py.filtering.filter_variants(log, variants)
     return filtered
+
+
+def get_case_labels(log, clusters_vl, variant_key=None, case_id_key='case:concept:name', activity_key='concept:name', timestamp_key=None):
+    """
+    Get the cluster of every case of an event log, in one pass over the case to variant map of 'EncodedVariantLog.from_dataframe'
+    instead of filtering the log once per cluster.
+
+    Parameters:
+    - log (pandas.DataFrame): The event log that was clustered.
+    - clusters_vl (list): The clusters, as variant log dictionaries.
+    - variant_key (function, optional): Applied to every variant of the log before it is looked up in the clusters, for clusterings
+      of variants with changed activity names. Defaults to None.
+    - case_id_key (str, optional): The case id column. Defaults to 'case:concept:name'.
+    - activity_key (str, optional): The activity column. Defaults to 'concept:name'.
+    - timestamp_key (str, optional): The timestamp column to order the events of every case on. Defaults to None (the order of the log).
+
+    Returns:
+    - pandas.Series: The cluster index of every case (-1 for variants that are in no cluster), indexed by (sorted) case id.
+    """
+    encoded_log, case_variants = EncodedVariantLog.from_dataframe(log, order=False, case_id_key=case_id_key, activity_key=activity_key,
+                                                                  timestamp_key=timestamp_key)
+    cluster_of = {variant: k for k, cluster_vl in enumerate(clusters_vl) for variant in cluster_vl}
+    variants = encoded_log.variants()
+    if variant_key is not None:
+        variants = [variant_key(variant) for variant in variants]
+    variant_labels = np.array([cluster_of.get(variant, -1) for variant in variants], dtype=np.int64)
+    return pandas.Series(variant_labels[case_variants.to_numpy()], index=case_variants.index, name='cluster')
+
+
+def get_case_labels_encoded(case_variants, clusters, num_variants):
+    """
+    Get the cluster of every case from clusters of variant indices into an encoded variant log.
+
+    Parameters:
+    - case_variants (pandas.Series): The index of the variant of every case, indexed by case id (see 'EncodedVariantLog.from_dataframe').
+    - clusters (list): For every cluster, the indices of its variants.
+    - num_variants (int): The number of variants in the encoded variant log.
+
+    Returns:
+    - pandas.Series: The cluster index of every case (-1 for variants that are in no cluster), indexed by case id.
+    """
+    variant_labels = np.full(num_variants, -1, dtype=np.int64)
+    for k, indices in enumerate(clusters):
+        variant_labels[indices] = k
+    return pandas.Series(variant_labels[case_variants.to_numpy()], index=case_variants.index, name='cluster')
+
+
+def get_event_labels(log, case_labels, case_id_key='case:concept:name'):
+    """
+    Get the cluster of every event of an event log from the clusters of its cases.
+
+    Parameters:
+    - log (pandas.DataFrame): The event log.
+    - case_labels (pandas.Series): The cluster index of every case, indexed by case id (see 'get_case_labels').
+    - case_id_key (str, optional): The case id column. Defaults to 'case:concept:name'.
+
+    Returns:
+    - numpy.ndarray: The cluster index of every event, aligned with the rows of the log.
+    """
+    return case_labels.to_numpy()[case_labels.index.get_indexer(log[case_id_key])]
+
+
+def get_cluster_views(log, case_labels, num_clusters, case_id_key='case:concept:name'):
+    """
+    Lazily yield the sub-log of every cluster. The log is sorted once on the clusters of its events (stably, so the events of a cluster
+    keep their order) and every cluster is a contiguous slice of that one sorted log, instead of a filtered copy of the log per cluster.
+
+    Parameters:
+    - log (pandas.DataFrame): The event log.
+    - case_labels (pandas.Series): The cluster index of every case, indexed by case id (see 'get_case_labels').
+    - num_clusters (int): The number of clusters.
+    - case_id_key (str, optional): The case id column. Defaults to 'case:concept:name'.
+
+    Yields:
+    - pandas.DataFrame: The events of the next cluster, as a slice of the sorted log.
+    """
+    event_labels = get_event_labels(log, case_labels, case_id_key=case_id_key)
+    event_order = np.argsort(event_labels, kind='stable')
+    sorted_log = log.take(event_order)
+    #events of cases in no cluster (-1) sort before all clusters and are skipped
+    bounds = np.searchsorted(event_labels[event_order], np.arange(num_clusters + 1))
+    for k in range(num_clusters):
+        yield sorted_log.iloc[bounds[k]:bounds[k + 1]]
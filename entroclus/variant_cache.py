@@ -0,0 +1,209 @@
+import hashlib
+import os
+import tempfile
+
+import numpy as np
+import pandas
+
+from entroclus import serialization as serialization
+from entroclus import xes as xes
+from entroclus.encoding import Vocabulary, EncodedVariantLog
+
+#Cache entries are files in the format of 'serialization.write_arrays', named after the key of the entry, with the vocabulary, the
+#encoded variant log (buffer, offsets, counts), the case to variant map and the parameters the entry was extracted with. The key is
+#the hash of the content of the source file together with those parameters, so a changed file or other parameters never hit an old
+#entry. Entries are loaded as views on a memory map; every hit updates the modification time of the entry, which orders the eviction.
+CACHE_VERSION = 1
+CACHE_SUFFIX = '.variants'
+DEFAULT_MAX_SIZE = 2**30
+
+
+def get_file_hash(path, chunk_size=2**20):
+    """
+    Get the SHA-256 hash of the content of a file, read in chunks.
+
+    Parameters:
+    - path (str): The file.
+    - chunk_size (int, optional): The number of bytes read at once. Defaults to 2**20.
+
+    Returns:
+    - str: The hexadecimal hash.
+    """
+    file_hash = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+
+def get_key(file_hash, params):
+    """
+    Get the cache key of a source file hash and a list of extraction parameters.
+    """
+    return hashlib.sha256('\n'.join([str(CACHE_VERSION), file_hash] + params).encode('utf-8')).hexdigest()[:32]
+
+
+def write_entry(entry_path, encoded_log, case_variants, params):
+    """
+    Write a cache entry. The entry is written to a temporary file that is then renamed, so other processes never see half an entry.
+
+    Parameters:
+    - entry_path (str): The file of the entry.
+    - encoded_log (EncodedVariantLog): The encoded variant log.
+    - case_variants (pandas.Series): The index of the variant of every case, indexed by case id.
+    - params (list): The extraction parameters, as 'name=value' strings.
+    """
+    vocabulary_offsets, vocabulary_data = serialization.pack_strings(encoded_log.vocabulary.activities)
+    case_offsets, case_data = serialization.pack_strings([str(case_id) for case_id in case_variants.index])
+    params_offsets, params_data = serialization.pack_strings(params)
+    arrays = {'vocab_offsets': vocabulary_offsets, 'vocab_data': vocabulary_data, 'params_offsets': params_offsets, 'params_data': params_data,
+              'buffer': encoded_log.buffer, 'offsets': encoded_log.offsets, 'counts': encoded_log.counts,
+              'case_offsets': case_offsets, 'case_data': case_data, 'case_variants': case_variants.to_numpy(dtype=np.int64)}
+    directory = os.path.dirname(entry_path)
+    handle, temporary_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    os.close(handle)
+    try:
+        serialization.write_arrays(temporary_path, arrays, num_activities=len(encoded_log.vocabulary))
+        os.replace(temporary_path, entry_path)
+    except BaseException:
+        os.remove(temporary_path)
+        raise
+
+
+def read_entry(entry_path):
+    """
+    Read a cache entry. The activity-id buffer, offsets, counts and case to variant map are views on a read-only memory map of the entry.
+
+    Parameters:
+    - entry_path (str): The file of the entry.
+
+    Returns:
+    - encoded_log (EncodedVariantLog): The encoded variant log.
+    - case_variants (pandas.Series): The index of the variant of every case, indexed by case id.
+    - params (dict): The extraction parameters of the entry.
+    """
+    _, arrays = serialization.read_arrays(entry_path, mmap_mode='r')
+    vocabulary = Vocabulary(serialization.unpack_strings(arrays['vocab_offsets'], arrays['vocab_data'])[2:])
+    encoded_log = EncodedVariantLog(vocabulary, arrays['buffer'], arrays['offsets'], arrays['counts'])
+    case_ids = serialization.unpack_strings(arrays['case_offsets'], arrays['case_data'])
+    case_variants = pandas.Series(arrays['case_variants'], index=case_ids, name='variant')
+    params = dict(param.split('=', 1) for param in serialization.unpack_strings(arrays['params_offsets'], arrays['params_data']))
+    return encoded_log, case_variants, params
+
+
+def load_variant_log(path, cache_dir=None, order=True, activity_key='concept:name', timestamp_key=None, case_id_key='concept:name',
+                     max_size=DEFAULT_MAX_SIZE):
+    """
+    Get the encoded variant log of a (plain or gzipped) XES file through the cache. On a hit the cached entry is memory-mapped, on a miss
+    the file is streamed with 'xes.read_variant_log' and a new entry is written, after which the oldest entries are evicted until the
+    cache fits in max_size bytes.
+
+    Parameters:
+    - path (str): The XES file.
+    - cache_dir (str, optional): The cache directory, created if it does not exist. If None, the file is read without caching.
+      Defaults to None.
+    - order (bool, optional): Whether to order the variants by frequency. Defaults to True.
+    - activity_key (str, optional): The event attribute holding the activity. Defaults to 'concept:name'.
+    - timestamp_key (str, optional): The event attribute holding the timestamp to order the events of every trace on. Defaults to None (the
+      order of the file, like pm4py).
+    - case_id_key (str, optional): The trace attribute holding the case id. Defaults to 'concept:name'.
+    - max_size (int, optional): The maximal total size of the cache in bytes. Defaults to 2**30.
+
+    Returns:
+    - encoded_log (EncodedVariantLog): The encoded variant log.
+    - case_variants (pandas.Series): The index of the variant of every case, indexed by case id.
+    """
+    if cache_dir is None:
+        return xes.read_variant_log(path, order=order, activity_key=activity_key, timestamp_key=timestamp_key, case_id_key=case_id_key)
+    os.makedirs(cache_dir, exist_ok=True)
+    params = ['order=' + str(order), 'activity_key=' + activity_key, 'timestamp_key=' + str(timestamp_key), 'case_id_key=' + case_id_key]
+    file_hash = get_file_hash(path)
+    entry_path = os.path.join(cache_dir, get_key(file_hash, params) + CACHE_SUFFIX)
+    if os.path.exists(entry_path):
+        try:
+            encoded_log, case_variants, _ = read_entry(entry_path)
+            os.utime(entry_path)
+            return encoded_log, case_variants
+        except (ValueError, KeyError):
+            #an entry of another version or a damaged entry is replaced
+            os.remove(entry_path)
+    encoded_log, case_variants = xes.read_variant_log(path, order=order, activity_key=activity_key, timestamp_key=timestamp_key,
+                                                      case_id_key=case_id_key)
+    write_entry(entry_path, encoded_log, case_variants, ['source=' + os.path.abspath(path), 'file_hash=' + file_hash] + params)
+    evict(cache_dir, max_size, keep=entry_path)
+    return encoded_log, case_variants
+
+
+def get_entries(cache_dir):
+    """
+    List the entries of a cache directory, least recently used first.
+
+    Parameters:
+    - cache_dir (str): The cache directory.
+
+    Returns:
+    - list: The (file, size in bytes, modification time) of every entry.
+    """
+    if not os.path.isdir(cache_dir):
+        return []
+    entries = []
+    for name in os.listdir(cache_dir):
+        if name.endswith(CACHE_SUFFIX):
+            entry_path = os.path.join(cache_dir, name)
+            stat = os.stat(entry_path)
+            entries.append((entry_path, stat.st_size, stat.st_mtime))
+    return sorted(entries, key=lambda entry: entry[2])
+
+
+def evict(cache_dir, max_size=DEFAULT_MAX_SIZE, keep=None):
+    """
+    Remove the least recently used entries until the cache fits in max_size bytes. Entries that are memory-mapped by a running process
+    stay readable by that process after their removal.
+
+    Parameters:
+    - cache_dir (str): The cache directory.
+    - max_size (int, optional): The maximal total size of the cache in bytes. Defaults to 2**30.
+    - keep (str, optional): An entry that is never removed (the one just written). Defaults to None.
+
+    Returns:
+    - int: The number of removed entries.
+    """
+    entries = get_entries(cache_dir)
+    total_size = sum(size for _, size, _ in entries)
+    removed = 0
+    for entry_path, size, _ in entries:
+        if total_size <= max_size:
+            break
+        if entry_path == keep:
+            continue
+        os.remove(entry_path)
+        total_size -= size
+        removed += 1
+    return removed
+
+
+def invalidate(cache_dir, path=None):
+    """
+    Remove the entries of one source file, or all entries.
+
+    Parameters:
+    - cache_dir (str): The cache directory.
+    - path (str, optional): The source file whose entries are removed, whatever its content was when they were written. If None, all
+      entries are removed. Defaults to None.
+
+    Returns:
+    - int: The number of removed entries.
+    """
+    removed = 0
+    for entry_path, _, _ in get_entries(cache_dir):
+        if path is not None:
+            try:
+                _, arrays = serialization.read_arrays(entry_path, mmap_mode='r')
+                params = dict(param.split('=', 1) for param in serialization.unpack_strings(arrays['params_offsets'], arrays['params_data']))
+            except (ValueError, KeyError):
+                params = {}
+            if params.get('source') not in [None, os.path.abspath(path)]:
+                continue
+        os.remove(entry_path)
+        removed += 1
+    return removed
@@ -0,0 +1,163 @@
+import gzip
+from datetime import datetime, timezone
+import xml.etree.ElementTree as ElementTree
+
+import numpy as np
+import pandas
+
+from entroclus.encoding import Vocabulary, EncodedVariantLog
+
+
+def _open(path):
+    #gzipped files are recognized by their magic bytes, not by their extension
+    with open(path, 'rb') as f:
+        gzipped = f.read(2) == b'\x1f\x8b'
+    return gzip.open(path, 'rb') if gzipped else open(path, 'rb')
+
+
+def _local_name(tag):
+    #drop the namespace, if the file declares one
+    return tag.rsplit('}', 1)[-1]
+
+
+def _parse_timestamp(timestamp):
+    #a trace can mix timestamps with and without a time zone, which can not be compared: the ones without are taken to be in UTC
+    parsed = datetime.fromisoformat(timestamp)
+    if parsed.tzinfo is None:
+        return parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+
+def iter_traces(path, activity_key='concept:name', timestamp_key=None, case_id_key='concept:name'):
+    """
+    Stream the traces of a (plain or gzipped) XES file, one at a time. Only the activity and the timestamp of every event are read, and
+    every trace is removed from the parsed tree once it is yielded, so the memory use does not grow with the size of the file.
+    The events of a trace keep the order of the file, as in the event log of 'pm4py.read_xes'. If a timestamp_key is given, they are
+    ordered on their timestamps instead (stably, so ties keep the order of the file); traces with events without a timestamp keep the 
+    order of the file. Timestamps without a time zone are taken to be in UTC.
+
+    Parameters:
+    - path (str): The XES file.
+    - activity_key (str, optional): The event attribute holding the activity. Defaults to 'concept:name'.
+    - timestamp_key (str, optional): The event attribute holding the timestamp to order the events of every trace on. Defaults to None (the
+      order of the file, like pm4py).
+    - case_id_key (str, optional): The trace attribute holding the case id. Defaults to 'concept:name'.
+
+    Yields:
+    - case_id (str): The case id of the trace, or its position in the file if it has none.
+    - trace (tuple): The activities of the trace.
+    """
+    with _open(path) as f:
+        root = None
+        in_trace = False
+        events = []
+        num_traces = 0
+        for event, elem in ElementTree.iterparse(f, events=('start', 'end')):
+            tag = _local_name(elem.tag)
+            if event == 'start':
+                if root is None:
+                    root = elem
+                elif tag == 'trace':
+                    in_trace = True
+                    events = []
+                continue
+            if tag == 'event' and in_trace:
+                activity, timestamp = None, None
+                #only the attributes of the event itself, not those nested in lists or containers
+                for attribute in elem:
+                    key = attribute.get('key')
+                    if key == activity_key:
+                        activity = attribute.get('value')
+                    elif key == timestamp_key:
+                        timestamp = attribute.get('value')
+                events.append((timestamp, activity))
+                elem.clear()
+            elif tag == 'trace':
+                case_id = None
+                for attribute in elem:
+                    if attribute.get('key') == case_id_key:
+                        case_id = attribute.get('value')
+                        break
+                if timestamp_key is not None and len(events) > 0 and all(timestamp is not None for timestamp, _ in events):
+                    events.sort(key=lambda e: _parse_timestamp(e[0]))
+                yield (case_id if case_id is not None else str(num_traces)), tuple(activity for _, activity in events)
+                num_traces += 1
+                in_trace = False
+                #drop the trace (and everything before it) from the tree
+                root.clear()
+
+
+def read_variant_log(path, vocabulary=None, add=True, order=True, activity_key='concept:name', timestamp_key=None,
+                     case_id_key='concept:name'):
+    """
+    Read the encoded variant log of a (plain or gzipped) XES file without building an event log: the traces are streamed with
+    'iter_traces' and folded into the variant log one by one, so only the distinct variants and the case ids are kept in memory.
+    Variants come in the order of 'utils.get_variant_log': by first appearance over the sorted case ids, and if order is True stably
+    sorted on frequency.
+
+    Parameters:
+    - path (str): The XES file.
+    - vocabulary (Vocabulary, optional): The vocabulary to use and extend. A new one is created if None.
+    - add (bool, optional): Whether unknown activities are added to the vocabulary, see 'Vocabulary.encode'. Defaults to True.
+    - order (bool, optional): Whether to order the variants by frequency. Defaults to True.
+    - activity_key (str, optional): The event attribute holding the activity. Defaults to 'concept:name'.
+    - timestamp_key (str, optional): The event attribute holding the timestamp to order the events of every trace on. Defaults to None (the
+      order of the file, like pm4py).
+    - case_id_key (str, optional): The trace attribute holding the case id. Defaults to 'concept:name'.
+
+    Returns:
+    - encoded_log (EncodedVariantLog): The encoded variant log.
+    - case_variants (pandas.Series): The index of the variant of every case, indexed by (sorted) case id.
+    """
+    if vocabulary is None:
+        vocabulary = Vocabulary()
+    variant_index = {}
+    encoded = []
+    case_ids = []
+    case_variant_codes = []
+    for case_id, trace in iter_traces(path, activity_key=activity_key, timestamp_key=timestamp_key, case_id_key=case_id_key):
+        trace_ids = vocabulary.encode(trace, add=add)
+        code = variant_index.setdefault(trace_ids.tobytes(), len(encoded))
+        if code == len(encoded):
+            encoded.append(trace_ids)
+        case_ids.append(case_id)
+        case_variant_codes.append(code)
+    case_variant_codes = np.array(case_variant_codes, dtype=np.int64)
+    counts = np.bincount(case_variant_codes, minlength=len(encoded)).astype(np.int64)
+
+    #number the variants by first appearance over the sorted case ids
+    case_order = sorted(range(len(case_ids)), key=case_ids.__getitem__)
+    sorted_codes = case_variant_codes[case_order]
+    _, first_positions = np.unique(sorted_codes, return_index=True)
+    variant_order = np.argsort(first_positions, kind='stable')
+    if order == True:
+        variant_order = variant_order[np.argsort(-counts[variant_order], kind='stable')]
+    variant_rank = np.empty(len(encoded), dtype=np.int64)
+    variant_rank[variant_order] = np.arange(len(encoded))
+
+    lengths = np.array([len(encoded[v]) for v in variant_order], dtype=np.int64)
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    buffer = np.concatenate([encoded[v] for v in variant_order]) if len(encoded) > 0 else np.zeros(0, dtype=np.int32)
+    case_variants = pandas.Series(variant_rank[sorted_codes], index=[case_ids[c] for c in case_order], name='variant')
+    return EncodedVariantLog(vocabulary, buffer, offsets, counts[variant_order]), case_variants
+
+
+def read_variant_log_dict(path, order=True, activity_key='concept:name', timestamp_key=None, case_id_key='concept:name'):
+    """
+    Read the variant log dictionary of a (plain or gzipped) XES file with 'read_variant_log', the same dictionary 'utils.get_variant_log'
+    gives for the event log of the file.
+
+    Parameters:
+    - path (str): The XES file.
+    - order (bool, optional): Whether to order the variants by frequency. Defaults to True.
+    - activity_key (str, optional): The event attribute holding the activity. Defaults to 'concept:name'.
+    - timestamp_key (str, optional): The event attribute holding the timestamp to order the events of every trace on. Defaults to None (the
+      order of the file, like pm4py).
+    - case_id_key (str, optional): The trace attribute holding the case id. Defaults to 'concept:name'.
+
+    Returns:
+    - dict: A dictionary where the keys are the variant/trace tuples and the values are their frequencies.
+    """
+    encoded_log, _ = read_variant_log(path, order=order, activity_key=activity_key, timestamp_key=timestamp_key, case_id_key=case_id_key)
+    return encoded_log.to_variant_log()
@@ -0,0 +1,66 @@
+import os
+import random
+import time
+
+import pandas as pd
+
+from entroclus import utils
+from entroclus import entropic_relevance
+from entroclus import entropic_clustering_variants
+from entroclus.encoded_dfg import EncodedDFG
+
+logs = ['Helpdesk.xes', 'RTFM.xes', 'BPIC13_incidents.xes', 'BPIC13_closedproblems.xes', 'Hospital_Billing.xes', 'Sepsis.xes', 'BPIC12.xes', 'BPIC15.xes']
+
+
+def time_backends(variant_log, n_clus, seed=0):
+    """
+    Time DFG discovery, ER scoring and entropic clustering with the dictionary and the encoded DFG backend.
+
+    Parameters:
+    - variant_log (dict): The variant log to use.
+    - n_clus (int): The number of clusters.
+    - seed (int, optional): Random seed, so both backends start from the same seeds. Defaults to 0.
+
+    Returns:
+    - dict: The runtimes (in seconds) for every step and backend.
+    """
+    results = {}
+
+    start = time.perf_counter()
+    activity_counts, edge_counts = utils.get_dfg(variant_log)
+    ER_dict = entropic_relevance.get_ER(variant_log, activity_counts, edge_counts)
+    results['ER_dict'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    dfg = EncodedDFG.from_variant_log(variant_log)
+    ER_encoded = entropic_relevance.get_ER(variant_log, dfg)
+    results['ER_encoded'] = time.perf_counter() - start
+    assert abs(ER_dict - ER_encoded) < 1e-6
+
+    for backend in ['dict', 'encoded']:
+        random.seed(seed)
+        start = time.perf_counter()
+        entropic_clustering_variants.entropic_clustering_VL(variant_log, n_clus, initialization='++', opt='trace', backend=backend)
+        results['clustering_' + backend] = time.perf_counter() - start
+    return results
+
+
+def benchmark_all_logs(n_clus=4, output='experimental_results_benchmark/backends.csv'):
+    rows = []
+    for logname in logs:
+        if not os.path.exists('datasets/' + logname):
+            print("Skipping missing log:", logname)
+            continue
+        # the variant log is read from the cache after the first run
+        variant_log = utils.get_variant_log('datasets/' + logname, cache_dir='cache')
+        results = time_backends(variant_log, n_clus)
+        results['log'] = logname
+        results['speedup_clustering'] = results['clustering_dict'] / results['clustering_encoded']
+        print(results)
+        rows.append(results)
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    pd.DataFrame(rows).to_csv(output, index=False)
+
+
+if __name__ == '__main__':
+    benchmark_all_logs()
@@ -2,7 +2,34 @@ from evaluation import metrics
 import pm4py
 import pandas as pd
 
-def test_all_methods(log_location, n_clus):
+from entroclus import utils as utils
+from entroclus.split_tree import SplitTree
+
+# the split variant gives nested clusterings, so one split tree per log gives the clusters for every cluster size (like in 
+# run_elbow_experiment.py), and a cluster is only evaluated once for all cluster sizes it is part of
+split_trees = {}
+split_node_results = {}
+
+
+def get_cluster_results(cluster):
+    num_traces = cluster["case:concept:name"].nunique()
+    return num_traces, metrics.get_stochastic_metrics(cluster), metrics.get_graph_simplicity_metrics(cluster)
+
+
+def get_split_results(log_location, log, n_clus, max_clusters=None):
+    tree = split_trees.get(log_location)
+    if tree is None or tree.max_clusters < n_clus:
+        tree = SplitTree.from_log(log, max(n_clus, max_clusters or n_clus), initialization = '++', opt = 'trace')
+        split_trees[log_location] = tree
+    results = []
+    for node in tree.get_leaves(n_clus):
+        if node not in split_node_results:
+            split_node_results[node] = get_cluster_results(utils.filter_log_with_vl(log, node.cluster))
+        results.append(split_node_results[node])
+    return results
+
+
+def test_all_methods(log_location, n_clus, max_clusters=None):
     log = pm4py.read_xes('datasets/'+log_location)
     print(log)
     baseline_stoch = metrics.get_stochastic_metrics(log)
@@ -24,12 +51,12 @@ def test_all_methods(log_location, n_clus):
         save_dir = f"experimental_results_elbow/clusters/{log_location.replace('.xes','').replace('.gz','')}/{method}/{n_clus}"
         total_traces = 0
         weighted_sums = {col: 0 for col in columns[3:]}  # Initialize dictionary to store weighted sums of metrics used for avergaging
+        if method == 'entropic_clustering_split':
+            all_cluster_results = get_split_results(log_location, log, n_clus, max_clusters)
+        else:
+            all_cluster_results = [get_cluster_results(pm4py.read_xes(f"{save_dir}/cluster_{cluster_index + 1}.xes")) for cluster_index in range(0,n_clus)]
         for cluster_index in range(0,n_clus):
-            cluster_log_location = f"{save_dir}/cluster_{cluster_index + 1}.xes"
-            cluster = pm4py.read_xes(cluster_log_location)
-            num_traces = cluster["case:concept:name"].nunique()
-            results_stochastic = metrics.get_stochastic_metrics(cluster)
-            results_graph_simplicity = metrics.get_graph_simplicity_metrics(cluster)
+            num_traces, results_stochastic, results_graph_simplicity = all_cluster_results[cluster_index]
             cluster_results = [method, cluster_index, num_traces,
                                results_stochastic['ER'], results_graph_simplicity['graph_density'], results_graph_simplicity['graph_entropy']]
             df.loc[df.shape[0]] = cluster_results
@@ -55,26 +82,26 @@ def test_all_methods(log_location, n_clus):
 
 
 for i in range(2, 10):
-    test_all_methods('Helpdesk.xes', i)
+    test_all_methods('Helpdesk.xes', i, max_clusters=9)
 
 for i in range(2, 10):
-    test_all_methods('RTFM.xes', i)
+    test_all_methods('RTFM.xes', i, max_clusters=9)
 
 for i in range(2, 10):
-    test_all_methods('BPIC13_incidents.xes', i)
+    test_all_methods('BPIC13_incidents.xes', i, max_clusters=9)
 
 for i in range(2, 10):
-    test_all_methods('BPIC13_closedproblems.xes', i)
+    test_all_methods('BPIC13_closedproblems.xes', i, max_clusters=9)
 
 
 for i in range(2, 10):
-    test_all_methods('Hospital_Billing.xes', i)
+    test_all_methods('Hospital_Billing.xes', i, max_clusters=9)
 
 for i in range(2, 10):
-    test_all_methods('BPIC15.xes', i)
+    test_all_methods('BPIC15.xes', i, max_clusters=9)
 
 for i in range(2, 10):
-    test_all_methods('BPIC12.xes', i)
+    test_all_methods('BPIC12.xes', i, max_clusters=9)
 
 for i in range(2, 10):
-    test_all_methods('Sepsis.xes', i)
+    test_all_methods('Sepsis.xes', i, max_clusters=9)
@@ -1,42 +1,28 @@
-from entroclus import utils
-import pm4py
+from entroclus import variant_cache
+from entroclus.trie import VariantTrie
 
 import os
 
 logs = ['Helpdesk.xes', 'RTFM.xes', 'BPIC13_incidents.xes', 'BPIC13_closedproblems.xes', 'Hospital_Billing.xes', 'Sepsis.xes', 'BPIC12.xes', 'BPIC15.xes']
 
-def get_vocabulary_size(variantlog):
-    acts = []
-    for variant in list(variantlog.keys()):
-        for element in list(variant):
-            acts.append(element)
-    voc = set(acts)
-    return len(voc)
-        
 table_data = []
 
 for logname in logs:
     print(logname)
-    log = pm4py.read_xes("datasets/" + logname)
-    total_number_of_cases = log["case:concept:name"].nunique()
-    variant_log = utils.get_variant_log(log)
-    num_variants = len(variant_log)
-    vocabulary_size = get_vocabulary_size(variant_log)
-    average_case_length = sum(
-        [len(variant) * variant_log[variant] for variant in list(variant_log.keys())]
-    ) / total_number_of_cases
-    minimum_case_length = min([len(variant) for variant in list(variant_log.keys())])
-    maximum_case_length = max([len(variant) for variant in list(variant_log.keys())])
+    # only the variant log is needed, so the log is streamed instead of read as a whole (and cached for later runs)
+    encoded_log, _ = variant_cache.load_variant_log("datasets/" + logname, cache_dir="cache")
+    # all statistics follow from the prefix trie of the variant log
+    stats = VariantTrie.from_encoded_log(encoded_log).get_stats()
 
     table_data.append(
         [
             logname,
-            total_number_of_cases,
-            num_variants,
-            vocabulary_size,
-            average_case_length,
-            minimum_case_length,
-            maximum_case_length,
+            stats['num_cases'],
+            stats['num_variants'],
+            stats['vocabulary_size'],
+            stats['average_case_length'],
+            stats['minimum_case_length'],
+            stats['maximum_case_length'],
         ]
     )
 
@@ -3,6 +3,8 @@ import pandas as pd
 import copy
 
 from entroclus import entropic_clustering as entropic_clustering
+from entroclus import utils as utils
+from entroclus.split_tree import SplitTree
 from alternatives import frequency_based
 from alternatives import random_clustering
 from alternatives import trace2vec_based
@@ -17,22 +19,35 @@ def test_all_methods(log_location, n_clusters):
     log = pm4py.read_xes('datasets/'+log_location)
     original_log = copy.deepcopy(log)
 
-    methods = ['entropic_clustering', 'entropic_clustering_split', 'frequency_based', 'random_clustering']
+    # the split variant is run once for all cluster sizes, see test_split_method
+    methods = ['entropic_clustering', 'frequency_based', 'random_clustering']
     
     for method in methods:
         log = copy.deepcopy(original_log)
         clusters = get_clusters(log, n_clusters, method)
+        save_clusters(clusters, log_location, method, n_clusters)
 
-        # Create a directory to store cluster logs if it doesn't exist
-        save_dir = f"experimental_results_elbow/clusters/{log_location.replace('.xes','').replace('.gz','')}/{method}/{n_clusters}"
-        os.makedirs(save_dir, exist_ok=True)
 
-        for cluster_index in range(0, n_clusters):
-            cluster = clusters[cluster_index]
-            # Save the individual cluster log to file
-            cluster_log_location = f"{save_dir}/cluster_{cluster_index + 1}.xes"
-            print("Saving logs to directory:", cluster_log_location)
-            pm4py.write.write_xes(cluster, cluster_log_location)
+def test_split_method(log_location, max_clusters, min_clusters=2):
+    # the split variant gives nested clusterings, so one split tree gives the clusters for every cluster size
+    log = pm4py.read_xes('datasets/'+log_location)
+    tree = SplitTree.from_log(log, max_clusters, initialization = '++', opt = 'trace')
+    for n_clusters in range(min_clusters, max_clusters + 1):
+        clusters = [utils.filter_log_with_vl(log, cluster_vl) for cluster_vl in tree.cut(n_clusters)]
+        save_clusters(clusters, log_location, 'entropic_clustering_split', n_clusters)
+
+
+def save_clusters(clusters, log_location, method, n_clusters):
+    # Create a directory to store cluster logs if it doesn't exist
+    save_dir = f"experimental_results_elbow/clusters/{log_location.replace('.xes','').replace('.gz','')}/{method}/{n_clusters}"
+    os.makedirs(save_dir, exist_ok=True)
+
+    for cluster_index in range(0, n_clusters):
+        cluster = clusters[cluster_index]
+        # Save the individual cluster log to file
+        cluster_log_location = f"{save_dir}/cluster_{cluster_index + 1}.xes"
+        print("Saving logs to directory:", cluster_log_location)
+        pm4py.write.write_xes(cluster, cluster_log_location)
 
 
 def get_clusters(log, n_clus, method = 'entropic_clustering'):
@@ -57,25 +72,33 @@ def get_clusters(log, n_clus, method = 'entropic_clustering'):
 
 #for i in range(2, 10):
 #    test_all_methods('Helpdesk.xes', i)
+#test_split_method('Helpdesk.xes', 9)
 
 #for i in range(2, 10):
 #    test_all_methods('RTFM.xes', i)
+#test_split_method('RTFM.xes', 9)
 
 #for i in range(2, 10):
 #    test_all_methods('BPIC13_incidents.xes', i)
+#test_split_method('BPIC13_incidents.xes', 9)
 
 #for i in range(2, 10):
 #    test_all_methods('BPIC13_closedproblems.xes', i)
+#test_split_method('BPIC13_closedproblems.xes', 9)
 
 
 #for i in range(2, 10):
 #    test_all_methods_no_alignments('Hospital_Billing.xes', i)
+#test_split_method('Hospital_Billing.xes', 9)
 
 #for i in range(2, 10):
 #    test_all_methods_no_alignments('BPIC15.xes', i)
+#test_split_method('BPIC15.xes', 9)
 
 #for i in range(2, 10):
 #    test_all_methods_no_alignments('BPIC12.xes', i)
+#test_split_method('BPIC12.xes', 9)
 
 #for i in range(2, 10):
 #    test_all_methods_no_alignments('Sepsis.xes', i)
+#test_split_method('Sepsis.xes', 9)
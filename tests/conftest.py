@@ -0,0 +1,37 @@
+import random
+
+import pytest
+
+from entroclus.model import EntropicClustering
+
+
+@pytest.fixture
+def variant_log():
+    return {('a', 'b', 'c'): 5, ('a', 'c', 'b'): 3, ('a', 'b', 'b', 'c'): 2, ('d', 'e'): 4, ('d', 'e', 'e', 'f'): 1, ('d', 'f'): 2}
+
+
+@pytest.fixture
+def model(variant_log):
+    return EntropicClustering(2, random_state=0).fit(variant_log)
+
+
+def make_variant_log(num_variants, num_activities, max_length, seed):
+    #random walks over the activities with occasional jumps, so the variants share prefixes and loops
+    rng = random.Random(seed)
+    activities = ['a' + str(i) for i in range(num_activities)]
+    variant_log = {}
+    while len(variant_log) < num_variants:
+        trace = [rng.choice(activities[:3])]
+        for _ in range(rng.randint(1, max_length) - 1):
+            if rng.random() < 0.8:
+                trace.append(activities[(activities.index(trace[-1]) + rng.choice([1, 1, 2, -1])) % num_activities])
+            else:
+                trace.append(rng.choice(activities))
+        variant_log[tuple(trace)] = variant_log.get(tuple(trace), 0) + rng.randint(1, 20)
+    return dict(sorted(variant_log.items(), key=lambda x: x[1], reverse=True))
+
+
+@pytest.fixture
+def synthetic_log():
+    #a factory, e.g. synthetic_log(40, 6, 12, seed=0)
+    return make_variant_log
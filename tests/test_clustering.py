@@ -0,0 +1,107 @@
+import copy
+import random
+
+import pandas
+import pytest
+
+from entroclus import entropic_clustering as entropic_clustering
+from entroclus import entropic_clustering_utils as entropic_clustering_utils
+from entroclus import entropic_clustering_variants as entropic_clustering_variants
+from entroclus import entropic_relevance as entropic_relevance
+from entroclus import utils as utils
+
+#Reference implementations of the original algorithms: every distance, candidate cluster and DFG is computed from scratch on copies,
+#with 'utils.get_dfg' and 'entropic_relevance.get_ER'. The optimized paths have to give the same clusters under the same random state.
+
+
+def reference_seeds(variant_log, num_clusters, rng):
+    #k-means++ over the variants that are not a seed yet, with 'random.choices' on the squared distance to the closest seed
+    remaining = list(variant_log)
+    seeds = [rng.choice(remaining)]
+    remaining.remove(seeds[0])
+    while len(seeds) < num_clusters:
+        weights = [min(entropic_clustering_utils.pairwise_ER(variant, seed) for seed in seeds)**2 for variant in remaining]
+        seed = rng.choices(remaining, weights=weights, k=1)[0]
+        seeds.append(seed)
+        remaining.remove(seed)
+    return seeds
+
+
+def reference_clustering(variant_log, num_clusters, initialization, opt, rng):
+    seeds = entropic_clustering_utils.get_seeds(variant_log, num_clusters, version=initialization, rng=rng)
+    clusters = [{seed: variant_log[seed]} for seed in seeds]
+    for variant, occurrence in variant_log.items():
+        if variant in seeds:
+            continue
+        best_ER = 99999.0
+        best_cluster_index = 0
+        for k, cluster in enumerate(clusters):
+            candidate = copy.deepcopy(cluster)
+            candidate[variant] = occurrence
+            activity_counts, edge_counts = utils.get_dfg(candidate)
+            scored_log = candidate if opt == 'full_cluster' else {variant: occurrence}
+            ER = entropic_relevance.get_ER(scored_log, activity_counts, edge_counts)
+            if ER < best_ER:
+                best_ER = ER
+                best_cluster_index = k
+        clusters[best_cluster_index][variant] = occurrence
+    return clusters
+
+
+def reference_split_clustering(variant_log, num_clusters, initialization, opt, rng):
+    clusters = reference_clustering(variant_log, 2, initialization, opt, rng)
+    while len(clusters) < num_clusters:
+        #split the first cluster with the highest ER, the new clusters go to the end
+        ERs = [entropic_relevance.get_ER(cluster, *utils.get_dfg(cluster)) for cluster in clusters]
+        worst = clusters.pop(ERs.index(max(ERs)))
+        clusters.extend(reference_clustering(worst, 2, initialization, opt, rng))
+    return clusters
+
+
+@pytest.mark.parametrize('seed', range(4))
+def test_seeds_match_reference(synthetic_log, seed):
+    variant_log = synthetic_log(40, 6, 12, seed)
+    expected = reference_seeds(variant_log, 4, random.Random(seed))
+    assert entropic_clustering_utils.get_seeds(variant_log, 4, version='++', rng=random.Random(seed)) == expected
+
+
+@pytest.mark.parametrize('backend', ['dict', 'encoded'])
+@pytest.mark.parametrize('opt', ['trace', 'full_cluster'])
+@pytest.mark.parametrize('initialization', ['++', 'random'])
+@pytest.mark.parametrize('seed', range(3))
+def test_regular_matches_reference(synthetic_log, backend, opt, initialization, seed):
+    variant_log = synthetic_log(40, 6, 12, seed)
+    expected = reference_clustering(variant_log, 3, initialization, opt, random.Random(seed))
+    clusters = entropic_clustering_variants.entropic_clustering_VL(variant_log, 3, initialization, opt, backend, random.Random(seed))
+    assert clusters == expected
+
+
+@pytest.mark.parametrize('backend', ['dict', 'encoded'])
+@pytest.mark.parametrize('opt', ['trace', 'full_cluster'])
+def test_split_matches_reference(synthetic_log, backend, opt):
+    variant_log = synthetic_log(40, 6, 12, 1)
+    expected = reference_split_clustering(variant_log, 4, '++', opt, random.Random(1))
+    clusters = entropic_clustering_variants.entropic_clustering_split_VL(variant_log, 4, '++', opt, backend, random.Random(1))
+    assert clusters == expected
+
+
+@pytest.mark.parametrize('variant', ['regular', 'split'])
+@pytest.mark.parametrize('opt', ['trace', 'full_cluster', 'full_cluster_exact'])
+@pytest.mark.parametrize('seed', range(3))
+def test_encoded_matches_dict(synthetic_log, variant, opt, seed):
+    #longer traces, so some of them are at the 1e-10 bound; with more clusters the split variant can pick a cluster of a single
+    #variant to split, which fails on both backends
+    variant_log = synthetic_log(60, 6, 30, seed)
+    results = [entropic_clustering.cluster(variant_log, 3, outputshape='variant_log', variant=variant, opt=opt, backend=backend, random_state=seed)
+               for backend in ['dict', 'encoded']]
+    assert results[0] == results[1]
+
+
+def test_labels_encoded_matches_dict(synthetic_log):
+    rows = []
+    for case_index, (variant, occurrence) in enumerate(synthetic_log(30, 5, 8, 2).items()):
+        for repetition in range(occurrence):
+            rows.extend((str(case_index) + '-' + str(repetition), activity) for activity in variant)
+    df = pandas.DataFrame(rows, columns=['case:concept:name', 'concept:name'])
+    labels = [entropic_clustering.cluster(df, 3, outputshape='labels', backend=backend, random_state=0) for backend in ['dict', 'encoded']]
+    assert labels[0].equals(labels[1])
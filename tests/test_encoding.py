@@ -0,0 +1,29 @@
+import pandas
+import pm4py
+
+from entroclus import utils as utils
+from entroclus.encoding import EncodedVariantLog
+
+
+def get_unsorted_log():
+    #the rows of cases '1' and '3' are not in timestamp order, and the cases are not in the order of their ids
+    rows = [('2', 'a', '2020-01-01'), ('2', 'b', '2020-01-02'), ('1', 'b', '2020-01-02'), ('1', 'a', '2020-01-01'), ('3', 'c', '2020-01-05'),
+            ('3', 'a', '2020-01-04'), ('3', 'c', '2020-01-03'), ('4', 'a', '2020-01-01'), ('4', 'b', '2020-01-02')]
+    df = pandas.DataFrame(rows, columns=['case:concept:name', 'concept:name', 'time:timestamp'])
+    df['time:timestamp'] = pandas.to_datetime(df['time:timestamp'])
+    return df
+
+
+def test_variant_log_matches_pm4py():
+    df = get_unsorted_log()
+    expected = pm4py.stats.get_variants_as_tuples(df)
+    assert list(utils.get_variant_log(df, order=False).items()) == list(expected.items())
+    assert list(utils.get_variant_log(df).items()) == sorted(expected.items(), key=lambda x: x[1], reverse=True)
+
+
+def test_sort_on_timestamp():
+    df = get_unsorted_log()
+    encoded_log, case_variants = EncodedVariantLog.from_dataframe(df, order=False, timestamp_key='time:timestamp')
+    assert encoded_log.to_variant_log() == {('a', 'b'): 3, ('c', 'a', 'c'): 1}
+    assert utils.get_variant_log(df) == {('a', 'b'): 2, ('b', 'a'): 1, ('c', 'a', 'c'): 1}
+    assert case_variants.to_dict() == {'1': 0, '2': 0, '3': 1, '4': 0}
@@ -0,0 +1,104 @@
+import copy
+import random
+
+import numpy as np
+import pytest
+
+from entroclus import entropic_clustering_utils as entropic_clustering_utils
+from entroclus import entropic_clustering_variants as entropic_clustering_variants
+from entroclus import entropic_relevance as entropic_relevance
+from entroclus import utils as utils
+from entroclus.encoded_dfg import EncodedDFG, StackedDFGs
+from entroclus.encoding import EncodedVariantLog
+from entroclus.pairwise_ER import PairwiseER
+from entroclus.trie import VariantTrie
+
+MIN_PROB = 1e-10
+
+
+def split_randomly(variant_log, num_clusters, seed):
+    rng = random.Random(seed)
+    clusters = [{} for _ in range(num_clusters)]
+    for k, (variant, occurrence) in enumerate(variant_log.items()):
+        #every cluster gets at least one variant
+        clusters[k if k < num_clusters else rng.randrange(num_clusters)][variant] = occurrence
+    return clusters
+
+
+def get_insertion_ERs(clusters, variant, occurrence):
+    #the ER of the variant after adding it to a copy of the dfg of every cluster, scored from scratch
+    ERs = []
+    for cluster in clusters:
+        activity_counts, edge_counts = copy.deepcopy(utils.get_dfg(cluster))
+        utils.update_dfg(activity_counts, edge_counts, variant, occurrence)
+        ERs.append(entropic_relevance.get_ER({variant: occurrence}, activity_counts, edge_counts))
+    return ERs
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_pruned_matches_full_scoring(synthetic_log, seed):
+    variant_log = synthetic_log(40, 6, 12, seed)
+    clusters = split_randomly(variant_log, 4, seed)
+    dfgs_clusters = [utils.get_dfg(cluster) for cluster in clusters]
+    outgoing_clusters = [utils.get_outgoing_counts(edge_counts) for _, edge_counts in dfgs_clusters]
+    steps, total_steps = 0, 0
+    for variant, occurrence in synthetic_log(30, 7, 12, seed + 10).items():
+        ERs = get_insertion_ERs(clusters, variant, occurrence)
+        best_cluster_index, best_ER, variant_steps, variant_total_steps = entropic_clustering_variants.get_best_cluster_pruned(dfgs_clusters, outgoing_clusters, variant, occurrence, MIN_PROB)
+        assert best_cluster_index == ERs.index(min(ERs))
+        assert best_ER == pytest.approx(min(ERs))
+        steps += variant_steps
+        total_steps += variant_total_steps
+    assert steps <= total_steps
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_assign_batch_matches_full_scoring(synthetic_log, seed):
+    variant_log = synthetic_log(40, 6, 12, seed)
+    clusters = split_randomly(variant_log, 4, seed)
+    encoded_log = EncodedVariantLog.from_variant_log(variant_log)
+    positions = {variant: i for i, variant in enumerate(variant_log)}
+    stacked = StackedDFGs.from_encoded_log(encoded_log, [[positions[variant] for variant in cluster] for cluster in clusters])
+    #variants with unseen activities and edges as well
+    new_variant_log = synthetic_log(30, 7, 12, seed + 10)
+    new_log = EncodedVariantLog.from_variant_log(new_variant_log, vocabulary=encoded_log.vocabulary, add=False)
+    labels, ERs, stats = stacked.assign_batch(new_log, MIN_PROB)
+    batch_ERs = stacked.get_batch_insertion_ERs(new_log, MIN_PROB)
+    assert np.array_equal(labels, np.argmin(batch_ERs, axis=0))
+    assert np.allclose(ERs, batch_ERs.min(axis=0))
+    assert stats['steps'] <= stats['total_steps']
+    for i, (variant, occurrence) in enumerate(new_variant_log.items()):
+        expected = get_insertion_ERs(clusters, variant, occurrence)
+        assert labels[i] == expected.index(min(expected))
+        assert np.allclose(batch_ERs[:, i], expected)
+
+
+@pytest.mark.parametrize('min_prob', [MIN_PROB, None])
+def test_batch_ER_matches_get_ER(synthetic_log, min_prob):
+    variant_log = synthetic_log(40, 6, 12, 0)
+    dfg_log = dict(list(variant_log.items())[:10])
+    encoded_log = EncodedVariantLog.from_variant_log(variant_log)
+    dfg = EncodedDFG.from_variant_log(dfg_log, vocabulary=encoded_log.vocabulary)
+    ER_variants, ER, ER_sum = entropic_relevance.get_ER_batch(encoded_log, dfg, min_prob)
+    trie_ER_variants, trie_ER, trie_ER_sum = VariantTrie.from_encoded_log(encoded_log).get_ER_batch(dfg, min_prob)
+    assert np.allclose(trie_ER_variants, ER_variants)
+    if min_prob is not None:
+        activity_counts, edge_counts = utils.get_dfg(dfg_log)
+        expected = [entropic_relevance.get_ER({variant: 1}, activity_counts, edge_counts) for variant in encoded_log.to_variant_log()]
+        assert np.allclose(ER_variants, expected)
+        assert ER == pytest.approx(entropic_relevance.get_ER(variant_log, activity_counts, edge_counts))
+        assert (trie_ER, trie_ER_sum) == pytest.approx((ER, ER_sum))
+    else:
+        #the variants the dfg can not replay
+        assert np.isinf(ER_variants).any() and np.array_equal(np.isinf(trie_ER_variants), np.isinf(ER_variants))
+
+
+@pytest.mark.parametrize('norm', [False, True])
+def test_pairwise_ER_matches_reference(synthetic_log, norm):
+    variant_log = synthetic_log(25, 6, 12, 1)
+    encoded_log = EncodedVariantLog.from_variant_log(variant_log)
+    variants = list(encoded_log.to_variant_log())
+    pairwise = PairwiseER(encoded_log, MIN_PROB)
+    expected = [[entropic_clustering_utils.pairwise_ER(a, b, norm) for b in variants] for a in variants]
+    assert np.allclose(pairwise.get_block(range(len(variants)), range(len(variants)), norm), expected)
+    assert pairwise.get_distance(3, 7, norm) == pytest.approx(expected[3][7])
@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+from entroclus import encoded_dfg as encoded_dfg
+from entroclus import serialization as serialization
+from entroclus import utils as utils
+
+
+@pytest.fixture(params=[True, False], ids=['dense', 'sparse'])
+def dense(request, monkeypatch):
+    if not request.param:
+        #store the edge counts sparsely, whatever the size of the alphabet
+        monkeypatch.setattr(encoded_dfg, 'DENSE_MAX_ACTIVITIES', 0)
+    return request.param
+
+
+@pytest.fixture
+def model(dense, model):
+    #the model of conftest, fitted after the edge storage is chosen
+    assert model.dfgs_.dense == dense
+    return model
+
+
+@pytest.mark.parametrize('mmap_mode', ['r', 'c', None])
+def test_save_load_dfgs(tmp_path, dense, model, variant_log, mmap_mode):
+    path = str(tmp_path / 'model.entroclus')
+    serialization.save_model(model, path)
+    loaded = serialization.load_model(path, mmap_mode=mmap_mode)
+    assert loaded.dfgs_.dense == dense
+    assert loaded.vocabulary_.activities == model.vocabulary_.activities
+    for k, cluster in enumerate(model.clusters_):
+        assert loaded.get_dfg(k) == utils.get_dfg(cluster)
+    traces = list(variant_log) + [('a', 'b'), ('d', 'x')]
+    labels, ERs = loaded.predict_ER(traces)
+    expected_labels, expected_ERs = model.predict_ER(traces)
+    assert np.array_equal(labels, expected_labels)
+    assert np.array_equal(ERs, expected_ERs)
+
+
+def test_load_clusters(tmp_path, model):
+    path = str(tmp_path / 'model.entroclus')
+    serialization.save_model(model, path)
+    loaded = serialization.load_model(path, mmap_mode='c')
+    assert loaded.clusters_ == model.clusters_
+    assert loaded.cluster_of_ == model.cluster_of_
+    #the loaded model can be updated and saved again
+    loaded.partial_fit({('a', 'b', 'c'): 1, ('d', 'e', 'f'): 2})
+    for k, cluster in enumerate(loaded.clusters_):
+        assert loaded.get_dfg(k) == utils.get_dfg(cluster)
+    serialization.save_model(loaded, path + '.2')
+    reloaded = serialization.load_model(path + '.2', mmap_mode=None)
+    for k, cluster in enumerate(loaded.clusters_):
+        assert reloaded.get_dfg(k) == utils.get_dfg(cluster)
+
+
+def test_read_only_model(tmp_path, model):
+    path = str(tmp_path / 'model.entroclus')
+    serialization.save_model(model, path)
+    loaded = serialization.load_model(path, mmap_mode='r')
+    with pytest.raises(ValueError, match='read-only'):
+        loaded.partial_fit({('a', 'b', 'c'): 1})
+    with pytest.raises(ValueError, match='read-only'):
+        serialization.save_model(loaded, path + '.2')
+
+
+def test_old_version(tmp_path, model):
+    path = str(tmp_path / 'model.entroclus')
+    serialization.save_model(model, path)
+    #rewrite the file as a version 1 file, which has no bound arrays
+    header = np.fromfile(path, dtype=serialization.HEADER_DTYPE, count=1)
+    header['version'] = 1
+    with open(path, 'r+b') as f:
+        f.write(header.tobytes())
+    with pytest.raises(ValueError, match='version 1'):
+        serialization.load_model(path)
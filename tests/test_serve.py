@@ -0,0 +1,96 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import numpy as np
+import pytest
+
+from entroclus import serialization as serialization
+from entroclus import serve as serve
+
+
+REQUESTS = [[('a', 'b', 'c')], [('d', 'e'), ('a', 'c')], [('d', 'x', 'f')], [('a', 'b', 'b', 'b', 'c'), ('d', 'f'), ('e',)], [()]] * 8
+
+
+def submit_concurrently(batcher, requests):
+    results = [None] * len(requests)
+    barrier = threading.Barrier(len(requests))
+
+    def submit(i):
+        barrier.wait()
+        try:
+            results[i] = batcher.submit(requests[i])
+        except Exception as error:
+            results[i] = error
+
+    threads = [threading.Thread(target=submit, args=(i,)) for i in range(len(requests))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_batcher_matches_predict_ER(model):
+    batcher = serve.MicroBatcher(model, max_batch_size=16, max_wait=0.05)
+    try:
+        results = submit_concurrently(batcher, REQUESTS)
+    finally:
+        batcher.close()
+    for traces, (labels, ERs) in zip(REQUESTS, results):
+        expected_labels, expected_ERs = model.predict_ER(traces)
+        assert np.array_equal(labels, expected_labels)
+        assert np.array_equal(ERs, expected_ERs)
+    #the requests were actually grouped
+    assert batcher.stats.batches < len(REQUESTS)
+
+
+def test_batcher_isolates_failing_request(model):
+    requests = list(REQUESTS)
+    requests[3] = [('a', ['x'])]
+    batcher = serve.MicroBatcher(model, max_batch_size=1000, max_wait=0.05)
+    try:
+        results = submit_concurrently(batcher, requests)
+    finally:
+        batcher.close()
+    assert isinstance(results[3], TypeError)
+    for i, traces in enumerate(requests):
+        if i != 3:
+            assert np.array_equal(results[i][0], model.predict_ER(traces)[0])
+
+
+@pytest.mark.parametrize('content', [[['a']], {'foo': 1}, {'traces': ['a', 'b']}, {'traces': [['a', ['x']]]}, {'trace': ['a', 1]}, {'traces': 'ab'}])
+def test_get_traces_invalid(content):
+    with pytest.raises(ValueError):
+        serve.get_traces(content)
+
+
+def test_server(tmp_path, model):
+    path = str(tmp_path / 'model.entroclus')
+    serialization.save_model(model, path)
+    server = serve.create_server(path, port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    url = 'http://127.0.0.1:' + str(server.server_address[1])
+
+    def post(content):
+        request = urllib.request.Request(url + '/predict', data=json.dumps(content).encode('utf-8'), method='POST')
+        try:
+            with urllib.request.urlopen(request) as response:
+                return response.status, json.loads(response.read())
+        except urllib.error.HTTPError as error:
+            return error.code, json.loads(error.read())
+
+    try:
+        status, result = post({'trace': ['a', 'b', 'c']})
+        labels, ERs = model.predict_ER([('a', 'b', 'c')])
+        assert status == 200 and result == {'cluster': int(labels[0]), 'ER': float(ERs[0])}
+        status, result = post({'traces': [['a', ['x']]]})
+        assert status == 400
+        status, result = post({'traces': [['d', 'e'], ['a']]})
+        assert status == 200 and [r['cluster'] for r in result] == model.predict([('d', 'e'), ('a',)]).tolist()
+    finally:
+        server.shutdown()
+        server.server_close()
+        server.batcher.close()
@@ -0,0 +1,17 @@
+import random
+
+import pytest
+
+from entroclus import entropic_clustering_variants as entropic_clustering_variants
+from entroclus.split_tree import SplitTree
+
+
+@pytest.mark.parametrize('backend', ['dict', 'encoded'])
+@pytest.mark.parametrize('opt', ['trace', 'full_cluster', 'full_cluster_exact'])
+def test_cut_matches_split(synthetic_log, backend, opt):
+    variant_log = synthetic_log(40, 6, 12, 0)
+    tree = SplitTree(variant_log, 5, opt=opt, backend=backend, rng=random.Random(0))
+    assert tree.cut(1) == [variant_log]
+    for num_clusters in range(2, 6):
+        expected = entropic_clustering_variants.entropic_clustering_split_VL(variant_log, num_clusters, '++', opt, backend, random.Random(0))
+        assert tree.cut(num_clusters) == expected
@@ -0,0 +1,49 @@
+import gzip
+import shutil
+
+import pandas
+import pm4py
+import pytest
+
+from entroclus import utils as utils
+from entroclus import xes as xes
+
+
+@pytest.fixture(params=['plain', 'gzip'])
+def xes_path(request, tmp_path, synthetic_log):
+    rows = []
+    for case_index, (variant, occurrence) in enumerate(synthetic_log(20, 5, 8, 3).items()):
+        for repetition in range(occurrence):
+            case_id = str(case_index) + '-' + str(repetition)
+            timestamps = pandas.date_range('2021-01-01', periods=len(variant), freq='h', tz='UTC') + pandas.Timedelta(days=case_index)
+            events = list(zip(variant, timestamps))
+            if repetition % 3 == 0:
+                #written out of timestamp order, which pm4py keeps
+                events.reverse()
+            rows.extend((case_id, activity, timestamp) for activity, timestamp in events)
+    df = pandas.DataFrame(rows, columns=['case:concept:name', 'concept:name', 'time:timestamp'])
+    path = str(tmp_path / 'log.xes')
+    pm4py.write_xes(df, path)
+    if request.param == 'gzip':
+        with open(path, 'rb') as source, gzip.open(path + '.gz', 'wb') as target:
+            shutil.copyfileobj(source, target)
+        path = path + '.gz'
+    return path
+
+
+def test_read_variant_log_matches_pm4py(xes_path):
+    expected = pm4py.stats.get_variants_as_tuples(pm4py.read_xes(xes_path))
+    encoded_log, case_variants = xes.read_variant_log(xes_path)
+    variant_log = encoded_log.to_variant_log()
+    assert variant_log == expected
+    #ordered by frequency
+    assert list(variant_log.values()) == sorted(expected.values(), reverse=True)
+    assert xes.read_variant_log_dict(xes_path) == variant_log
+    assert list(utils.get_variant_log(xes_path).items()) == sorted(expected.items(), key=lambda x: x[1], reverse=True)
+    assert len(case_variants) == sum(expected.values())
+    assert case_variants.value_counts().sort_index().tolist() == list(variant_log.values())
+
+
+def test_sort_on_timestamp(xes_path):
+    expected = pm4py.stats.get_variants_as_tuples(pm4py.read_xes(xes_path).sort_values(['case:concept:name', 'time:timestamp'], kind='stable'))
+    assert xes.read_variant_log_dict(xes_path, timestamp_key='time:timestamp') == expected